@@ -1,21 +1,327 @@
+# agents/analytics_agent.py
+
+import numpy as np
 import pandas as pd
-import plotly.express as px
-from sklearn.cluster import KMeans
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+
+from utils.charts import especificacion, construir_figura
+
+TAMANO_LOTE = 10_000
+
+# Línea base de la detección de anomalías: hasta VENTANA_ANOMALIAS puntos anteriores
+# y al menos MIN_BASE_ANOMALIAS; con menos la dispersión estimada es demasiado
+# ruidosa para una prueba de 3σ y el punto no se evalúa
+VENTANA_ANOMALIAS = 24
+MIN_BASE_ANOMALIAS = 12
+
+
+def estadisticas_moviles(valores, ventana: int = 3):
+    """
+    Media y desviación estándar móviles (ventana hacia atrás, mínimo 1 punto)
+    calculadas con sumas acumuladas, sin ciclos de Python.
+    Retorna tupla (media, std) de arreglos NumPy del mismo largo que 'valores'.
+    """
+    x = np.asarray(valores, dtype=float)
+    n = len(x)
+    c1 = np.concatenate(([0.0], np.cumsum(x)))
+    c2 = np.concatenate(([0.0], np.cumsum(x * x)))
+    fin = np.arange(1, n + 1)
+    inicio = np.maximum(fin - ventana, 0)
+    cuenta = fin - inicio
+    media = (c1[fin] - c1[inicio]) / cuenta
+    var = (c2[fin] - c2[inicio]) / cuenta - media ** 2
+    return media, np.sqrt(np.clip(var, 0, None))
+
+
+def detectar_anomalias(valores, ventana: int = VENTANA_ANOMALIAS, umbral: float = 3.5):
+    """
+    Marca como anomalía cada punto cuyo z-score robusto supera 'umbral' en valor
+    absoluto. La línea base son los 'ventana' puntos anteriores (al menos
+    MIN_BASE_ANOMALIAS): mediana como centro y MAD escalada como desviación, así
+    que un pico previo no infla la dispersión. Los puntos sin línea base suficiente
+    quedan con z-score 0, y una serie más corta no tiene anomalías.
+    Retorna tupla (zscore, mascara_anomalias).
+    """
+    x = np.asarray(valores, dtype=float)
+    n = len(x)
+    z = np.zeros(n)
+    ventana = max(ventana, MIN_BASE_ANOMALIAS)
+    if n <= MIN_BASE_ANOMALIAS:
+        return z, z.astype(bool)
+
+    # Fila i = los 'ventana' puntos anteriores a i (NaN antes del inicio de la serie)
+    relleno = np.concatenate((np.full(ventana, np.nan), x[:-1]))
+    bases = np.lib.stride_tricks.sliding_window_view(relleno, ventana)[MIN_BASE_ANOMALIAS:]
+    mediana = np.nanmedian(bases, axis=1)
+    desvio = np.abs(bases - mediana[:, None])
+    escala = 1.4826 * np.nanmedian(desvio, axis=1)
+    # Si más de la mitad de la base es igual (MAD = 0), desviación media absoluta
+    escala = np.where(escala > 0, escala, 1.2533 * np.nanmean(desvio, axis=1))
+
+    con_escala = escala > 0
+    z[MIN_BASE_ANOMALIAS:][con_escala] = (
+        (x[MIN_BASE_ANOMALIAS:][con_escala] - mediana[con_escala]) / escala[con_escala]
+    )
+    return z, np.abs(z) > umbral
+
+
+def detectar_cambios(valores, max_cambios: int = 3, umbral: float = 3.0, min_segmento: int = 2):
+    """
+    Detecta cambios de nivel por segmentación binaria. En cada segmento se evalúan
+    todos los cortes posibles a la vez (sumas acumuladas) y se acepta el mejor si
+    su estadístico supera 'umbral'.
+    Retorna lista ordenada de índices donde empieza un nuevo nivel.
+    """
+    x = np.asarray(valores, dtype=float)
+    n = len(x)
+    if n < 2 * min_segmento:
+        return []
+
+    # Ruido estimado con las diferencias (robusto ante los propios cambios)
+    sigma = np.median(np.abs(np.diff(x))) / (0.6745 * np.sqrt(2))
+    if sigma == 0:
+        sigma = np.std(x)
+    if sigma == 0:
+        return []
+
+    cambios = []
+    pendientes = [(0, n)]
+    while pendientes and len(cambios) < max_cambios:
+        ini, fin = pendientes.pop()
+        seg = x[ini:fin]
+        m = len(seg)
+        if m < 2 * min_segmento:
+            continue
+        acum = np.cumsum(seg)
+        t = np.arange(min_segmento, m - min_segmento + 1)
+        media_izq = acum[t - 1] / t
+        media_der = (acum[-1] - acum[t - 1]) / (m - t)
+        estadistico = np.sqrt(t * (m - t) / m) * np.abs(media_izq - media_der) / sigma
+        mejor = int(np.argmax(estadistico))
+        if estadistico[mejor] < umbral:
+            continue
+        corte = ini + int(t[mejor])
+        cambios.append(corte)
+        pendientes.extend([(ini, corte), (corte, fin)])
+
+    return sorted(cambios)
+
+
+def clusterizar_por_lotes(fabrica_lotes, columnas, n_clusters: int = 3, random_state: int = 0):
+    """
+    Agrupa filas con MiniBatchKMeans, lote por lote (StandardScaler y KMeans con
+    partial_fit). 'fabrica_lotes' es una función sin argumentos que devuelve un
+    iterador nuevo de DataFrames; se recorre tres veces: escalado, entrenamiento y
+    asignación. Cada columna se estandariza por separado.
+    Retorna tupla (etiquetas, modelo) con las etiquetas concatenadas en el orden de los lotes.
+    """
+    escalador = StandardScaler()
+    for lote in fabrica_lotes():
+        if len(lote):
+            escalador.partial_fit(lote[columnas].to_numpy(dtype=float))
+
+    modelo = MiniBatchKMeans(
+        n_clusters=n_clusters,
+        batch_size=TAMANO_LOTE,
+        random_state=random_state,
+        n_init=3
+    )
+    vistos = 0
+    for lote in fabrica_lotes():
+        if len(lote) == 0:
+            continue
+        # partial_fit necesita al menos n_clusters muestras en el primer lote
+        if vistos == 0 and len(lote) < n_clusters:
+            continue
+        modelo.partial_fit(escalador.transform(lote[columnas].to_numpy(dtype=float)))
+        vistos += len(lote)
+
+    if vistos == 0:
+        return np.array([], dtype=int), None
+
+    etiquetas = [
+        modelo.predict(escalador.transform(lote[columnas].to_numpy(dtype=float)))
+        for lote in fabrica_lotes()
+        if len(lote)
+    ]
+    return np.concatenate(etiquetas), modelo
+
+
+def _lotes_de(df: pd.DataFrame, tamano: int = TAMANO_LOTE):
+    """
+    Fábrica de lotes sobre un DataFrame ya en memoria.
+    """
+    return lambda: (df.iloc[i:i + tamano] for i in range(0, len(df), tamano))
+
+
+def _analizar_series(df: pd.DataFrame, llaves, ventana: int) -> pd.DataFrame:
+    """
+    Agrega a 'df' (ordenado por llaves y fecha) las columnas media_movil, std_movil
+    (ventana 'ventana'), zscore, anomalia (ver detectar_anomalias) y cambio_nivel,
+    serie por serie.
+    """
+    df = df.sort_values(llaves + ["fecha"]).reset_index(drop=True)
+    n = len(df)
+    media = np.empty(n)
+    std = np.empty(n)
+    z = np.empty(n)
+    anomalia = np.zeros(n, dtype=bool)
+    cambio = np.zeros(n, dtype=bool)
+
+    grupos = df.groupby(llaves, sort=False, observed=True).indices if llaves else {None: np.arange(n)}
+    valores = df["valor"].to_numpy(dtype=float)
+    for idx in grupos.values():
+        x = valores[idx]
+        media[idx], std[idx] = estadisticas_moviles(x, ventana)
+        z[idx], anomalia[idx] = detectar_anomalias(x)
+        cambio[idx[detectar_cambios(x)]] = True
+
+    df["media_movil"] = media
+    df["std_movil"] = std
+    df["zscore"] = z
+    df["anomalia"] = anomalia
+    df["cambio_nivel"] = cambio
+    return df
+
+
+def _perfiles(df: pd.DataFrame, llaves) -> pd.DataFrame:
+    """
+    Una fila por lugar con rasgos para clusterizar: por cada tipo de dato, último
+    valor, variación relativa total y volatilidad (std de las variaciones relativas).
+    Las columnas quedan como "<rasgo> | <tipo_dato>", así que cada indicador se
+    estandariza por separado y sus unidades (habitantes, °C, ...) no se mezclan.
+    Un tipo de dato que falta en un lugar se completa con la mediana de los demás.
+    """
+    g = df.groupby(llaves, sort=False, observed=True)["valor"]
+    primero = g.transform("first")
+    variacion = df["valor"].div(primero.where(primero != 0)).fillna(1.0)
+    cambio_rel = g.pct_change().replace([np.inf, -np.inf], np.nan)
+    largo = pd.DataFrame({
+        "ultimo": g.last(),
+        "variacion_total": variacion.groupby([df[k] for k in llaves], observed=True).last() - 1.0,
+        "volatilidad": cambio_rel.groupby([df[k] for k in llaves], observed=True).std().fillna(0.0)
+    })
+    if "tipo_dato" not in llaves:
+        return largo.reset_index()
+
+    ancho = largo.unstack("tipo_dato")
+    ancho.columns = [f"{rasgo} | {tipo}" for rasgo, tipo in ancho.columns]
+    ancho = ancho.fillna(ancho.median()).fillna(0.0)
+    return ancho.reset_index()
+
+
+def run_analytics(public_data_output, news_output=None, ventana: int = 3, n_clusters: int = 3):
+    """
+    Análisis cuantitativo vectorizado de las series de datos oficiales y, si se
+    proporciona, del volumen diario de noticias.
+    - Estadísticas móviles (media y desviación) por serie.
+    - Anomalías por z-score robusto (mediana/MAD de hasta VENTANA_ANOMALIAS puntos
+      anteriores) y cambios de nivel por segmentación binaria (NumPy).
+    - Si hay varias series (p. ej. salida de fetch_public_data_batch), agrupa los
+      lugares con MiniBatchKMeans según su perfil: último valor, variación y
+      volatilidad de cada tipo de dato, estandarizados por indicador.
+    Retorna:
+      - fig_principal: figura de Plotly con la serie y las anomalías marcadas, o {}.
+      - grafico: especificación de esa figura (ver utils/charts.py).
+      - df_detalle: DataFrame con las columnas calculadas por punto.
+      - df_clusters: DataFrame con un perfil y cluster por lugar (vacío si no aplica).
+      - texto_conclusiones: texto con las cifras principales, listo para el contraste:
+        primero las líneas agregadas (series con anomalías o cambios, grupos,
+        noticias) y luego una por serie, las más relevantes primero.
+    """
+    # Primero las líneas agregadas y después una por serie, de modo que recortar el
+    # texto por líneas (ver utils/tokens.recortar_lineas) conserve lo más general
+    partes = []
+    lineas_series = []
+    frames = []
+    df_clusters = pd.DataFrame()
+
+    # 1) Series de datos oficiales (una o varias)
+    df_pub = (public_data_output or {}).get("df", pd.DataFrame())
+    if df_pub is not None and not df_pub.empty and {"fecha", "valor"} <= set(df_pub.columns):
+        llaves = [c for c in ("tipo_dato", "lugar") if c in df_pub.columns]
+        det = _analizar_series(df_pub.dropna(subset=["valor"]), llaves, ventana)
+        det["serie"] = det[llaves].astype(str).agg(" | ".join, axis=1) if llaves else "Datos oficiales"
+        frames.append(det)
+
+        resumen = det.groupby("serie", sort=False, observed=True).agg(
+            promedio=("valor", "mean"),
+            ultimo=("valor", "last"),
+            anomalias=("anomalia", "sum"),
+            cambios=("cambio_nivel", "sum")
+        )
+        if len(resumen) > 1:
+            partes.append(
+                f"{len(resumen)} series: {int((resumen['anomalias'] > 0).sum())} con anomalías y "
+                f"{int((resumen['cambios'] > 0).sum())} con cambios de nivel."
+            )
+        # Las series con más anomalías y cambios de nivel van primero
+        relevancia = resumen["anomalias"] + resumen["cambios"]
+        for serie, fila in resumen.loc[relevancia.sort_values(ascending=False, kind="stable").index].iterrows():
+            lineas_series.append(
+                f"{serie}: promedio {fila['promedio']:.2f}, último valor {fila['ultimo']:.2f}, "
+                f"{int(fila['anomalias'])} anomalías y {int(fila['cambios'])} cambios de nivel."
+            )
+
+        if "lugar" in llaves and det["lugar"].nunique() > n_clusters:
+            df_clusters = _perfiles(det, llaves)
+            columnas = [c for c in df_clusters.columns if c != "lugar"]
+            etiquetas, _ = clusterizar_por_lotes(_lotes_de(df_clusters), columnas, n_clusters)
+            if len(etiquetas):
+                df_clusters["cluster"] = etiquetas
+                for cl, grupo in df_clusters.groupby("cluster", observed=True):
+                    partes.append(
+                        f"Grupo {cl}: {', '.join(grupo['lugar'].astype(str).unique()[:10])}."
+                    )
+
+    # 2) Volumen diario de noticias
+    df_news = (news_output or {}).get("df_articulos", pd.DataFrame())
+    if df_news is not None and not df_news.empty and "fecha" in df_news.columns:
+        conteo = (
+            pd.to_datetime(df_news["fecha"]).dt.floor("D")
+              .value_counts()
+              .sort_index()
+              .asfreq("D", fill_value=0)
+        )
+        det_n = _analizar_series(
+            pd.DataFrame({"fecha": conteo.index, "valor": conteo.to_numpy(dtype=float)}),
+            [],
+            ventana
+        )
+        det_n["serie"] = "Noticias por día"
+        frames.append(det_n)
+        picos = det_n.loc[det_n["anomalia"], "fecha"].dt.strftime("%Y-%m-%d").tolist()
+        partes.append(
+            f"Noticias: {int(det_n['valor'].sum())} artículos en {len(det_n)} días, "
+            f"máximo {int(det_n['valor'].max())} en un día"
+            + (f"; picos anómalos el {', '.join(picos[:5])}." if picos else ".")
+        )
 
-def run_analytics(public_data_output):
-    df = public_data_output["df"]
-    # Ejemplo: Generar gráfico de serie de tiempo
-    fig = px.line(df, x="fecha", y="valor", title="Tendencia de Indicador Público")
+    if not frames:
+        return {
+            "fig_principal": {},
+            "df_detalle": pd.DataFrame(),
+            "df_clusters": df_clusters,
+            "texto_conclusiones": "Sin series suficientes para el análisis cuantitativo."
+        }
 
-    # Calcular clustering (si tiene sentido) o anomalías
-    # ...
-    # df["cluster"] = KMeans(n_clusters=2).fit_predict(df[["valor"]])
+    df_detalle = pd.concat(frames, ignore_index=True)
 
-    conclusiones = f"El promedio del indicador en los últimos periodos es {df['valor'].mean():.2f}. "
-    # Podéis pedir al LLM un análisis más cualitativo si queréis.
+    # 3) Gráfico: serie + media móvil, con anomalías resaltadas
+    grafico = especificacion(
+        "anomalias",
+        df_detalle[["serie", "fecha", "valor", "media_movil", "anomalia"]],
+        x="fecha",
+        y="valor",
+        titulo="Tendencias, medias móviles y anomalías"
+    )
+    fig = construir_figura(grafico)
 
     return {
         "fig_principal": fig,
-        "df_detalle": df,
-        "texto_conclusiones": conclusiones
+        "grafico": grafico,
+        "df_detalle": df_detalle,
+        "df_clusters": df_clusters,
+        "texto_conclusiones": "\n".join(partes + lineas_series)
     }
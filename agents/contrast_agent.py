@@ -0,0 +1,157 @@
+# agents/contrast_agent.py
+
+import pandas as pd
+
+from agents.analytics_agent import run_analytics
+from utils.llm import analyze_text_with_llm
+from utils.retrieval import IndiceContexto
+from utils.session_store import geojson_de
+from utils.tokens import contar_tokens, recortar_lineas
+from utils.spatial import capa_riesgo, puntos_desde_df, cruzar_puntos_con_riesgo, resumen_riesgo
+
+# Plantillas del contraste (mismas claves que TEXTS en main.py, que puede pasar las suyas)
+PLANTILLAS = {
+    "contrast_news": "Noticias:\n{}",
+    "contrast_multimodal": "Información Propia:\n{}",
+    "contrast_public_num": "Datos Oficiales (numéricos):\n{}",
+    "contrast_public_geo": "Datos Oficiales (GeoJSON de inundaciones) disponibles.",
+    "contrast_analytics": "Análisis Cuantitativo:\n{}",
+    "contrast_spatial": "Cruce Espacial con Zonas de Inundación:\n{}",
+    "contrast_prompt": "Contrasta la información de las noticias, la información propia y los datos oficiales para la ubicación {}.\n\n{}\n\nResume las similitudes, diferencias y posibles conclusiones.",
+}
+
+# Parte del presupuesto de tokens que pueden ocupar el análisis cuantitativo y el
+# cruce espacial; la evidencia del índice usa lo que quede
+PROPORCION_CUANTITATIVA = 0.4
+
+
+def _con_filas(salida: dict, clave: str) -> bool:
+    df = (salida or {}).get(clave)
+    return df is not None and not df.empty
+
+
+def hechos_oficiales(df, tipo_dato: str, lugar: str) -> list:
+    """
+    Convierte una tabla de datos oficiales (simple o de comparación) en frases cortas.
+    """
+    if df is None or df.empty:
+        return []
+    lugares = df["lugar"] if "lugar" in df.columns else lugar
+    tipos = df["tipo_dato"] if "tipo_dato" in df.columns else tipo_dato
+    return (
+        pd.Series(tipos, index=df.index).astype(str) + " en "
+        + pd.Series(lugares, index=df.index).astype(str) + ", "
+        + pd.to_datetime(df["fecha"]).dt.year.astype(str) + ": "
+        + df["valor"].round(2).astype(str)
+    ).tolist()
+
+
+def indice_desde_salidas(lugar: str, news_output=None, multimodal_output=None,
+                         public_output=None, batch_output=None, tipo_dato: str = "") -> IndiceContexto:
+    """
+    Índice de evidencias armado de una vez con las salidas de los agentes
+    (la interfaz, en cambio, lo va llenando a medida que corre cada agente).
+    """
+    indice = IndiceContexto()
+    if _con_filas(news_output, "df_articulos"):
+        indice.reemplazar_fuente("noticias", news_output["df_articulos"]["resumen"])
+    if _con_filas(multimodal_output, "df_multimodal"):
+        indice.reemplazar_fuente("propios", multimodal_output["df_multimodal"]["descripcion"])
+    if _con_filas(public_output, "df"):
+        indice.reemplazar_fuente("oficiales", hechos_oficiales(public_output["df"], tipo_dato, lugar))
+    if _con_filas(batch_output, "df"):
+        indice.reemplazar_fuente("comparacion", hechos_oficiales(batch_output["df"], "", lugar))
+    return indice
+
+
+def run_contrast(lugar: str, news_output=None, multimodal_output=None, public_output=None,
+                 batch_output=None, indice: IndiceContexto = None, consulta: str = "",
+                 textos: dict = None, presupuesto_tokens: int = 1500):
+    """
+    Contraste de todas las fuentes disponibles para 'lugar':
+    - Análisis cuantitativo (run_analytics) de las series oficiales y las noticias.
+    - Cruce espacial de los puntos propios y de noticias con la capa de inundaciones.
+    - Evidencia más relevante y no redundante del índice.
+    Todo el texto de evidencia queda bajo 'presupuesto_tokens': lo cuantitativo
+    ocupa a lo más PROPORCION_CUANTITATIVA y el índice el resto.
+    - Comentario final del LLM.
+    Las salidas que no se tengan se pasan como None. 'textos' reemplaza las
+    plantillas de PLANTILLAS (p. ej. las del idioma de la interfaz).
+    Retorna diccionario con:
+      - texto_contraste: comentario del LLM.
+      - texto_evidencia: texto enviado al LLM.
+      - analytics_output: salida de run_analytics.
+      - spatial_output: {"df_puntos", "df_poligonos"} o None si no hubo cruce.
+    """
+    textos = {**PLANTILLAS, **(textos or {})}
+    noticias_ok = _con_filas(news_output, "df_articulos")
+    multimodal_ok = _con_filas(multimodal_output, "df_multimodal")
+    flood_geojson = geojson_de((public_output or {}).get("fig"))
+    if indice is None:
+        indice = indice_desde_salidas(lugar, news_output, multimodal_output, public_output, batch_output)
+
+    # Análisis cuantitativo sobre las series oficiales (comparación si existe) y noticias
+    salida_publica = batch_output if _con_filas(batch_output, "df") else public_output
+    analytics_output = run_analytics(salida_publica, news_output)
+    cuantitativas = []
+    if not analytics_output["df_detalle"].empty:
+        cuantitativas.append(("contrast_analytics", analytics_output["texto_conclusiones"]))
+
+    # Cruce espacial de puntos propios y de noticias contra la capa de inundaciones
+    spatial_output = None
+    if flood_geojson:
+        capa = capa_riesgo(flood_geojson, llave=public_output["fig"].get("capa"))
+        fuentes_puntos = []
+        if multimodal_ok:
+            df_m = multimodal_output["df_multimodal"]
+            # Los archivos de puntos se cruzan punto por punto, no por su centro
+            fuentes_puntos.append(puntos_desde_df(df_m[df_m["tipo"] != "puntos"], "propios"))
+        if _con_filas(multimodal_output, "df_puntos"):
+            fuentes_puntos.append(puntos_desde_df(multimodal_output["df_puntos"], "brigadas"))
+        if noticias_ok:
+            fuentes_puntos.append(puntos_desde_df(news_output["df_articulos"], "noticias"))
+        fuentes_puntos = [p for p in fuentes_puntos if not p.empty]
+        if fuentes_puntos:
+            puntos = pd.concat(fuentes_puntos, ignore_index=True)
+            df_riesgo, df_poligonos = cruzar_puntos_con_riesgo(puntos, capa)
+            spatial_output = {"df_puntos": df_riesgo, "df_poligonos": df_poligonos}
+            cuantitativas.append(("contrast_spatial", resumen_riesgo(df_riesgo, df_poligonos)))
+
+    # Lo cuantitativo entra en el mismo presupuesto: cada bloque se recorta a su parte
+    # por líneas completas (p. ej. una comparación de 100 lugares con una línea por
+    # serie); run_analytics pone primero las líneas agregadas y las series relevantes
+    bloques = []
+    if cuantitativas:
+        por_bloque = int(presupuesto_tokens * PROPORCION_CUANTITATIVA) // len(cuantitativas)
+        bloques = [
+            textos[plantilla].format(recortar_lineas(texto, por_bloque))
+            for plantilla, texto in cuantitativas
+        ]
+    restante = max(0, presupuesto_tokens - sum(contar_tokens(b) for b in bloques))
+
+    partes = []
+
+    # Evidencia más relevante y no redundante de todas las fuentes, con el presupuesto restante
+    seleccion = indice.seleccionar(consulta or lugar, presupuesto_tokens=restante)
+    por_fuente = {}
+    for elemento in seleccion:
+        por_fuente.setdefault(elemento["fuente"], []).append(elemento["texto"])
+    if noticias_ok and por_fuente.get("noticias"):
+        partes.append(textos["contrast_news"].format("\n".join(por_fuente["noticias"])))
+    if multimodal_ok and por_fuente.get("propios"):
+        partes.append(textos["contrast_multimodal"].format("\n".join(por_fuente["propios"])))
+    hechos = por_fuente.get("oficiales", []) + por_fuente.get("comparacion", [])
+    if hechos:
+        partes.append(textos["contrast_public_num"].format("\n".join(hechos)))
+    if flood_geojson:
+        partes.append(textos["contrast_public_geo"])
+    partes += bloques
+
+    texto_evidencia = "\n\n---\n\n".join(partes)
+    texto_contraste = analyze_text_with_llm(textos["contrast_prompt"].format(lugar, texto_evidencia))
+    return {
+        "texto_contraste": texto_contraste,
+        "texto_evidencia": texto_evidencia,
+        "analytics_output": analytics_output,
+        "spatial_output": spatial_output
+    }
@@ -1,17 +1,42 @@
 # agents/news_agent.py
 
+import io
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import Future
+
 import feedparser
 import pandas as pd
+import requests
 from datetime import datetime
-import plotly.express as px
 
+from utils import article_store, transport
+from utils.charts import especificacion, construir_figura
+from utils.geo import geocode_many, normalizar_texto
 from utils.llm import summarize_with_llm, extract_entities
 
+# Línea "Lugares: a; b; c" de la salida de extract_entities
+_RE_LUGARES = re.compile(r"^[\s*\-#]*lugar(?:es)?[\s*]*[:：]\s*(.*)$", re.IGNORECASE | re.MULTILINE)
+_SIN_VALOR = {"", "ninguno", "ninguna", "n_a", "na", "none", "no_especificado"}
+
+# Columnas que se extraen de cada <item> del RSS
+_COLUMNAS_FEED = ["titulo", "descripcion", "url", "fecha_txt", "fuente"]
+
+# Feeds descargados recientemente (p. ej. por la precarga), por URL: (momento, contenido)
+FEED_TTL_SEG = 300
+_CACHE_FEEDS = {}
+_FEEDS_EN_CURSO = {}
+_CACHE_FEEDS_LOCK = threading.Lock()
+
 def fetch_and_process_news(lugar: str, keywords: str, fecha_inicio, fecha_fin):
     """
     Obtiene noticias gratuitas de Google News RSS según 'keywords' y 'lugar',
     las procesa en un DataFrame, genera resúmenes/entidades con LLM, un insight global
     y construye un gráfico de tendencia de noticias por fecha.
+    Los artículos enriquecidos se guardan en el almacén de artículos; los que ya
+    estaban ahí (p. ej. de una vigilancia) no se vuelven a enviar al LLM.
     
     Parámetros:
       - lugar (str): Ciudad, región o término geográfico para filtrar.
@@ -21,59 +46,13 @@ def fetch_and_process_news(lugar: str, keywords: str, fecha_inicio, fecha_fin):
     
     Retorna un diccionario con:
       - texto_summary: insight global generado por LLM.
-      - df_articulos: DataFrame con información de cada noticia.
+      - df_articulos: DataFrame con información de cada noticia (incluye 'lugares',
+        'lugar_geo', 'lat' y 'lon' cuando se pudo ubicar).
       - fig_time_series: figura de Plotly con la tendencia diaria de noticias.
+      - grafico: especificación de esa figura (ver utils/charts.py), para guardarla compacta.
     """
-
-    # 1) Construir la URL del RSS de Google News
-    #    hl=es-419 (idioma español Latinoamérica), gl=MX (país México), ceid=MX:es
-    #    Buscamos "keywords" AND "lugar"
-    query = f"{keywords} {lugar}".strip().replace(" ", "+")
-    rss_url = (
-        "https://news.google.com/rss/search?"
-        f"q={query}&hl=es-419&gl=MX&ceid=MX:es"
-    )
-
-    # 2) Leer el feed RSS con feedparser
-    feed = feedparser.parse(rss_url)
-    entries = feed.get("entries", [])
-
-    # 3) Filtrar por rango de fechas si se suministraron
-    rows = []
-    for entry in entries:
-        # 'published_parsed' es una tupla struct_time, convertimos a datetime
-        try:
-            published_dt = datetime(*entry.published_parsed[:6])
-        except Exception:
-            # Si no pudiera parsear la fecha, la omitimos
-            continue
-
-        # Si se proporcionó fecha_inicio/fecha_fin, comparamos
-        if fecha_inicio:
-            dt_inicio = datetime.combine(fecha_inicio, datetime.min.time())
-            if published_dt < dt_inicio:
-                continue
-        if fecha_fin:
-            dt_fin = datetime.combine(fecha_fin, datetime.max.time())
-            if published_dt > dt_fin:
-                continue
-
-        # Extraer título, descripción (summary), link y fuente
-        titulo = entry.get("title", "")
-        descripcion = entry.get("summary", "")
-        url = entry.get("link", "")
-        fuente = entry.get("source", {}).get("title", "") if entry.get("source") else ""
-        
-        rows.append({
-            "titulo": titulo,
-            "descripcion": descripcion,
-            "url": url,
-            "fecha": published_dt,
-            "fuente": fuente or entry.get("author", "")
-        })
-
-    # 4) Crear DataFrame
-    df = pd.DataFrame(rows)
+    # 1-4) Descargar el feed y filtrar por rango de fechas
+    df = filtrar_fechas(buscar_articulos(lugar, keywords), fecha_inicio, fecha_fin)
 
     # Si no hay resultados, devolvemos estructuras vacías
     if df.empty:
@@ -86,54 +65,322 @@ def fetch_and_process_news(lugar: str, keywords: str, fecha_inicio, fecha_fin):
     # 5) Ordenar por fecha descendente
     df = df.sort_values(by="fecha", ascending=False).reset_index(drop=True)
 
-    # 6) Llamadas a LLM para resumen y extracción de entidades
-    res_summaries = []
-    entidades = []
-    for idx, row in df.iterrows():
-        # Texto largo para LLM
-        texto_largo = row["titulo"] + ". " + (row["descripcion"] or "")
-        resumen = summarize_with_llm(texto_largo)
-        ent = extract_entities(texto_largo)
-        res_summaries.append(resumen)
-        entidades.append(ent)
-
-    df["resumen"] = res_summaries
-    df["entidades"] = entidades
+    # 6) Resúmenes, entidades y ubicación, reutilizando los artículos ya enriquecidos
+    llave = article_store.llave_busqueda(lugar, keywords)
+    df = enriquecer_articulos(df, article_store.leer_articulos(llave))
+    article_store.guardar_articulos(llave, df)
 
     # 7) Generar insight global con los primeros 10 resúmenes
-    top_summaries = res_summaries[:10] if len(res_summaries) >= 10 else res_summaries
-    texto_concatenado = "\n".join(top_summaries)
-    insight_global = summarize_with_llm(
+    insight_global = insight_noticias(df["resumen"])
+
+    # 8) Construir gráfico de tendencia (conteos por hora; por defecto se muestran por día)
+    grafico = grafico_tendencia(df, lugar, keywords)
+    fig_time_series = construir_figura(grafico)
+
+    # 9) Retornar el diccionario con resultados
+    return {
+        "texto_summary": insight_global,
+        "df_articulos": df,
+        "fig_time_series": fig_time_series,
+        "grafico": grafico
+    }
+
+
+def buscar_articulos(lugar: str, keywords: str) -> pd.DataFrame:
+    """
+    Descarga el RSS de Google News para 'keywords' y 'lugar' y lo convierte en un
+    DataFrame [titulo, descripcion, url, fecha, fuente] (sin enriquecer).
+    Los artículos sin fecha legible se descartan.
+    """
+    # 1-2) Descargar y leer el feed en columnas (parseo en streaming; feedparser como respaldo)
+    columnas = leer_feed(_descargar_feed(url_feed(lugar, keywords)))
+
+    # 3) Convertir fechas
+    df = pd.DataFrame(columnas)
+    df["fecha"] = _parsear_fechas(df.pop("fecha_txt"))
+
+    # 4) DataFrame con el mismo esquema de siempre
+    return df.loc[df["fecha"].notna(), ["titulo", "descripcion", "url", "fecha", "fuente"]].reset_index(drop=True)
+
+
+def url_feed(lugar: str, keywords: str) -> str:
+    """
+    URL del RSS de Google News para "keywords" AND "lugar".
+    hl=es-419 (idioma español Latinoamérica), gl=MX (país México), ceid=MX:es
+    """
+    query = f"{keywords or ''} {lugar}".strip().replace(" ", "+")
+    return (
+        "https://news.google.com/rss/search?"
+        f"q={query}&hl=es-419&gl=MX&ceid=MX:es"
+    )
+
+
+def filtrar_fechas(df: pd.DataFrame, fecha_inicio=None, fecha_fin=None) -> pd.DataFrame:
+    """
+    Filtra por rango de fechas (datetime.date, opcionales) con una sola máscara vectorizada.
+    """
+    if df.empty:
+        return df
+    mascara = df["fecha"].notna()
+    if fecha_inicio:
+        mascara &= df["fecha"] >= datetime.combine(fecha_inicio, datetime.min.time())
+    if fecha_fin:
+        mascara &= df["fecha"] <= datetime.combine(fecha_fin, datetime.max.time())
+    return df.loc[mascara].reset_index(drop=True)
+
+
+def enriquecer_articulos(df: pd.DataFrame, previos: pd.DataFrame = None) -> pd.DataFrame:
+    """
+    Agrega 'resumen', 'entidades', 'lugares', 'lugar_geo', 'lat' y 'lon'.
+    Los artículos cuya 'url' ya está en 'previos' (artículos enriquecidos antes)
+    toman esos valores; sólo los nuevos pasan por el LLM y la geocodificación.
+    Conserva el orden de 'df'.
+    """
+    columnas = ["resumen", "entidades", "lugares", "lugar_geo", "lat", "lon"]
+    conocidos = pd.DataFrame()
+    if previos is not None and not previos.empty and set(columnas) <= set(previos.columns):
+        conocidos = previos.drop_duplicates("url").set_index("url")[columnas]
+
+    ya = df["url"].isin(conocidos.index) if not conocidos.empty else pd.Series(False, index=df.index)
+    partes = []
+    if ya.any():
+        viejos = df[ya].copy()
+        for col in columnas:
+            viejos[col] = conocidos.loc[viejos["url"], col].to_numpy()
+        partes.append(viejos)
+
+    nuevos = df[~ya].copy()
+    if not nuevos.empty:
+        # Llamadas a LLM para resumen y extracción de entidades
+        res_summaries = []
+        entidades = []
+        for idx, row in nuevos.iterrows():
+            # Texto largo para LLM
+            texto_largo = row["titulo"] + ". " + (row["descripcion"] or "")
+            res_summaries.append(summarize_with_llm(texto_largo))
+            entidades.append(extract_entities(texto_largo))
+        nuevos["resumen"] = res_summaries
+        nuevos["entidades"] = entidades
+
+        # Ubicar cada artículo con los lugares mencionados (geocodificación por lotes)
+        partes.append(geolocalizar_articulos(nuevos))
+
+    if not partes:
+        return df.assign(**{col: pd.Series(dtype=object) for col in columnas})
+    # Los lugares guardados en Parquet vuelven como arreglos; se dejan como listas
+    enriquecido = pd.concat(partes).loc[df.index]
+    enriquecido["lugares"] = enriquecido["lugares"].map(lambda v: [] if v is None else list(v))
+    return enriquecido
+
+
+def insight_noticias(resumenes) -> str:
+    """
+    Insight general a partir de los primeros 10 resúmenes.
+    """
+    texto_concatenado = "\n".join(list(resumenes)[:10])
+    return summarize_with_llm(
         f"Con base en estos resúmenes:\n{texto_concatenado}\n\n"
         "Genera un insight general sobre la situación."
     )
 
-    # 8) Construir gráfico de tendencia diaria
+
+def grafico_tendencia(df: pd.DataFrame, lugar: str, keywords: str) -> dict:
+    """
+    Especificación del gráfico de tendencia: conteos por hora, mostrados por día por defecto.
+    """
     df_count = (
-        df.groupby(df["fecha"].dt.date)
+        df.groupby(df["fecha"].dt.floor("h"))
           .size()
           .reset_index(name="conteo")
-          .rename(columns={"fecha": "fecha_dia"})
     )
-
-    fig_time_series = px.line(
+    return especificacion(
+        "line",
         df_count,
-        x="fecha_dia",
+        x="fecha",
         y="conteo",
-        title=f"Tendencia diaria de noticias sobre \"{keywords}\" en \"{lugar}\"",
-        markers=True
-    )
-    fig_time_series.update_layout(
-        xaxis_title="Fecha",
-        yaxis_title="Cantidad de artículos",
-        xaxis=dict(tickformat="%Y-%m-%d"),
-        template="plotly_white"
+        titulo=f"Tendencia de noticias sobre \"{keywords}\" en \"{lugar}\"",
+        markers=True,
+        frecuencia="D",
+        agregacion="sum",
+        layout=dict(
+            xaxis_title="Fecha",
+            yaxis_title="Cantidad de artículos"
+        )
     )
 
-    # 9) Retornar el diccionario con resultados
-    return {
-        "texto_summary": insight_global,
-        "df_articulos": df,
-        "fig_time_series": fig_time_series
+
+def extraer_lugares(entidades: str) -> list:
+    """
+    Obtiene la lista de lugares de la salida de extract_entities
+    (línea "Lugares: a; b; c"). Retorna lista vacía si no hay lugares.
+    """
+    m = _RE_LUGARES.search(entidades or "")
+    if not m:
+        return []
+    lugares = []
+    for parte in re.split(r"[;|]", m.group(1)):
+        lugar = parte.strip(" .*\t")
+        if normalizar_texto(lugar) not in _SIN_VALOR:
+            lugares.append(lugar)
+    return lugares
+
+
+def geolocalizar_articulos(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Asigna coordenadas a cada artículo a partir de los lugares de su columna 'entidades'.
+    Los lugares de todos los artículos se normalizan y deduplican antes de geocodificar,
+    así que el número de consultas depende de los lugares distintos, no de los artículos.
+    Cada artículo toma las coordenadas del primer lugar mencionado que se pudo ubicar.
+    Agrega columnas 'lugares', 'lugar_geo', 'lat' y 'lon'.
+    """
+    df = df.copy()
+    df["lugares"] = df["entidades"].map(extraer_lugares)
+
+    # Un solo nombre representativo por lugar normalizado
+    unicos = {}
+    for lugares in df["lugares"]:
+        for lugar in lugares:
+            unicos.setdefault(normalizar_texto(lugar), lugar)
+
+    resultados = geocode_many(list(unicos.values()))
+    coords = {
+        llave: resultados.get(nombre, {})
+        for llave, nombre in unicos.items()
     }
 
+    def _primer_lugar(lugares):
+        for lugar in lugares:
+            geo = coords.get(normalizar_texto(lugar), {})
+            if geo.get("lat") is not None:
+                return lugar, geo["lat"], geo["lon"]
+        return None, None, None
+
+    ubicados = df["lugares"].map(_primer_lugar)
+    df["lugar_geo"] = [u[0] for u in ubicados]
+    df["lat"] = pd.to_numeric([u[1] for u in ubicados])
+    df["lon"] = pd.to_numeric([u[2] for u in ubicados])
+    return df
+
+
+def _descargar_feed(url: str) -> bytes:
+    """
+    Descarga el XML del feed, o lo toma de la caché si se descargó hace menos
+    de FEED_TTL_SEG segundos. Si la misma URL ya se está descargando (p. ej. en la
+    precarga), espera esa descarga. Retorna b"" si hay error.
+    """
+    ahora = time.monotonic()
+    with _CACHE_FEEDS_LOCK:
+        guardado = _CACHE_FEEDS.get(url)
+        if guardado and ahora - guardado[0] < FEED_TTL_SEG:
+            return guardado[1]
+        futuro = _FEEDS_EN_CURSO.get(url)
+        propio = futuro is None
+        if propio:
+            futuro = _FEEDS_EN_CURSO[url] = Future()
+    if not propio:
+        return futuro.result()
+
+    contenido = b""
+    try:
+        resp = transport.get(url, max_bytes=10 * 1024 ** 2)
+        contenido = resp.content if resp.status_code == 200 else b""
+    except requests.RequestException:
+        pass
+    finally:
+        with _CACHE_FEEDS_LOCK:
+            if contenido:
+                # Descartar los vencidos para que la caché no crezca sin límite
+                for llave in [k for k, (t, _) in _CACHE_FEEDS.items() if ahora - t >= FEED_TTL_SEG]:
+                    del _CACHE_FEEDS[llave]
+                _CACHE_FEEDS[url] = (ahora, contenido)
+            _FEEDS_EN_CURSO.pop(url, None)
+        futuro.set_result(contenido)
+    return contenido
+
+
+def precargar_feed(lugar: str, keywords: str = "") -> bool:
+    """
+    Descarga el feed de 'lugar' y 'keywords' a la caché para que la próxima
+    búsqueda no espere la red. Retorna True si se obtuvo contenido.
+    """
+    return bool(_descargar_feed(url_feed(lugar, keywords)))
+
+
+def _local(tag: str) -> str:
+    """
+    Nombre de etiqueta sin espacio de nombres ("{ns}creator" -> "creator").
+    """
+    return tag.rsplit("}", 1)[-1]
+
+
+def leer_feed(contenido: bytes) -> dict:
+    """
+    Lee un feed RSS en columnas {titulo, descripcion, url, fecha_txt, fuente}
+    (listas paralelas, una posición por <item>).
+    Usa iterparse: cada <item> se vuelca a las columnas y se libera de inmediato,
+    así que nunca se arma el árbol completo. Si el XML está mal formado, se usa feedparser.
+    """
+    columnas = {c: [] for c in _COLUMNAS_FEED}
+    if not contenido:
+        return columnas
+
+    try:
+        actual = None
+        for evento, elem in ET.iterparse(io.BytesIO(contenido), events=("start", "end")):
+            tag = _local(elem.tag)
+            if evento == "start":
+                if tag == "item":
+                    actual = {}
+                continue
+            if actual is None:
+                continue
+            if tag == "item":
+                for c in _COLUMNAS_FEED:
+                    columnas[c].append(actual.get(c, ""))
+                actual = None
+                elem.clear()
+            elif tag == "title":
+                actual["titulo"] = elem.text or ""
+            elif tag == "description":
+                actual["descripcion"] = elem.text or ""
+            elif tag == "link":
+                actual["url"] = (elem.text or "").strip()
+            elif tag == "pubDate":
+                actual["fecha_txt"] = (elem.text or "").strip()
+            elif tag == "source":
+                actual["fuente"] = elem.text or ""
+            elif tag in ("author", "creator") and not actual.get("fuente"):
+                actual["fuente"] = elem.text or ""
+        return columnas
+    except ET.ParseError:
+        return _leer_feed_feedparser(contenido)
+
+
+def _leer_feed_feedparser(contenido: bytes) -> dict:
+    """
+    Respaldo para feeds que el parser estricto no acepta.
+    """
+    columnas = {c: [] for c in _COLUMNAS_FEED}
+    for entry in feedparser.parse(contenido).get("entries", []):
+        fuente = entry.get("source", {}).get("title", "") if entry.get("source") else ""
+        columnas["titulo"].append(entry.get("title", ""))
+        columnas["descripcion"].append(entry.get("summary", ""))
+        columnas["url"].append(entry.get("link", ""))
+        columnas["fecha_txt"].append(entry.get("published", ""))
+        columnas["fuente"].append(fuente or entry.get("author", ""))
+    return columnas
+
+
+def _parsear_fechas(fechas_txt: pd.Series) -> pd.Series:
+    """
+    Convierte las fechas RFC 822 del RSS ("Mon, 20 Oct 2025 14:05:00 GMT") a datetime
+    sin zona horaria, en UTC. Las que no tienen ese formato se intentan con el parser
+    general; las que no se pueden leer quedan como NaT.
+    """
+    fechas = pd.to_datetime(fechas_txt, format="%a, %d %b %Y %H:%M:%S %Z", errors="coerce", utc=True)
+    faltantes = fechas.isna() & fechas_txt.astype(bool)
+    if faltantes.any():
+        fechas.loc[faltantes] = pd.to_datetime(
+            fechas_txt[faltantes], format="mixed", errors="coerce", utc=True
+        )
+    return fechas.dt.tz_convert(None)
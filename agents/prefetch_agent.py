@@ -0,0 +1,64 @@
+# agents/prefetch_agent.py
+
+import logging
+import threading
+
+from agents.news_agent import precargar_feed
+from agents.public_data_agent import capa_inundacion
+from utils.geo import geocode_location
+
+logger = logging.getLogger(__name__)
+
+
+def precargar(lugar: str, keywords=(), cancelado: threading.Event = None) -> dict:
+    """
+    Calienta las cachés compartidas para 'lugar' antes de que el usuario lo pida:
+    1) geocodificación, 2) capa de inundaciones descargada y recortada alrededor
+    del lugar, 3) feeds RSS de 'lugar' (sin palabras clave y con cada una de 'keywords').
+    Entre pasos revisa 'cancelado' y se detiene si el evento está activo.
+    Retorna {paso: resultado} de los pasos completados.
+    """
+    cancelado = cancelado or threading.Event()
+    hechos = {}
+
+    geo = geocode_location(lugar)
+    hechos["geocodificacion"] = geo.get("lat") is not None
+    if cancelado.is_set():
+        return hechos
+
+    if hechos["geocodificacion"]:
+        try:
+            _, recorte = capa_inundacion(geo["lat"], geo["lon"])
+            hechos["capa_inundacion"] = recorte is not None
+        except Exception as e:
+            logger.warning("Error al precargar la capa de inundaciones para '%s': %s", lugar, e)
+            hechos["capa_inundacion"] = False
+
+    for kw in dict.fromkeys(["", *keywords]):
+        if cancelado.is_set():
+            return hechos
+        hechos[f"feed:{kw}"] = precargar_feed(lugar, kw)
+    return hechos
+
+
+def iniciar_precarga(lugar: str, keywords=()) -> threading.Event:
+    """
+    Lanza precargar() en un hilo de fondo. Retorna el evento para cancelarla
+    (evento.set()), p. ej. cuando el usuario confirma otra ubicación.
+    """
+    cancelado = threading.Event()
+    hilo = threading.Thread(
+        target=_precargar_seguro,
+        args=(lugar, tuple(keywords), cancelado),
+        name=f"precarga-{lugar}",
+        daemon=True
+    )
+    hilo.start()
+    return cancelado
+
+
+def _precargar_seguro(lugar: str, keywords, cancelado: threading.Event):
+    try:
+        precargar(lugar, keywords, cancelado)
+    except Exception:
+        logger.exception("Error en la precarga de '%s'", lugar)
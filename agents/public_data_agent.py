@@ -1,20 +1,51 @@
 # agents/public_data_agent.py
 
+from datetime import date
+
 import pandas as pd
-import requests
-import plotly.express as px
 
-from utils.geo import geocode_location
+from utils import transport
+from utils.charts import especificacion, construir_figura
+from utils.geo import geocode_location, geocode_many, normalizar_texto
+from utils.indicator_store import read_series, read_series_many
+from utils.session_store import artefacto_compartido
+from utils.spatial import capa_riesgo, recortar_capa
+
+# Indicador del almacén Parquet y presentación de cada tipo de dato numérico
+INDICADORES = {
+    "Demográficos": {"indicador": "poblacion", "titulo": "Población", "eje_y": "Población", "grafico": "line"},
+    "Meteorológicos": {"indicador": "temperatura", "titulo": "Temperatura promedio", "eje_y": "Temperatura (°C)", "grafico": "line"},
+    "Sísmicos": {"indicador": "sismos", "titulo": "Número de sismos", "eje_y": "Número de sismos", "grafico": "bar"},
+    "Económicos": {"indicador": "ingreso_per_capita", "titulo": "Ingreso per cápita", "eje_y": "Ingreso per cápita (MXN)", "grafico": "line"},
+}
+
+# Nombres de la interfaz en inglés -> tipo de dato interno
+ALIAS_TIPO_DATO = {
+    "Demographics": "Demográficos",
+    "Meteorological": "Meteorológicos",
+    "Seismic": "Sísmicos",
+    "Economic": "Económicos",
+    "Flood Risks": "Riesgos de Inundación",
+}
+
+# Capa de zonas inundables. Ejemplo genérico: GeoJSON de zonas inundables de EE.UU. (solo de demo)
+# Para producción, reemplaza con un GeoJSON oficial de CONAGUA o INEGI.
+FLOOD_GEOJSON_URL = "https://raw.githubusercontent.com/giswqs/planetscope-analyses/master/data/us-flood-zones.geojson"
+# Radio alrededor de la ubicación con el que se recorta la capa (km)
+RADIO_CAPA_KM = 50
 
 def fetch_public_data(lugar: str, tipo_dato: str, periodo: int):
     """
     Consulta datos públicos para 'lugar' y 'tipo_dato'. 
     Si tipo_dato == "Riesgos de Inundación", descarga un GeoJSON de inundaciones 
     (publicado en GitHub u otra fuente) y genera un mapa PyDeck.
-    Si es Demográficos, Meteorológicos, Sísmicos o Económicos, genera datos simulados.
+    Si es Demográficos, Meteorológicos, Sísmicos o Económicos, lee la serie oficial
+    del almacén Parquet local (utils/indicator_store.py) para los últimos 'periodo' años.
     Retorna:
       - df: DataFrame con columnas ['fecha', 'valor'] o (en inundación) DataFrame vacío.
-      - fig: Plotly Figure (línea/barra) o (en inundación) un dict con 'geojson' y 'view_state'.
+      - fig: Plotly Figure (línea/barra) o (en inundación) un dict con 'geojson',
+        'capa' (URL de la capa, también su llave como artefacto compartido) y 'view_state'.
+      - grafico: especificación de la figura numérica (ver utils/charts.py) o None.
       - geo_info: resultados de geocoding (lat, lon, display_name).
     """
 
@@ -25,96 +56,47 @@ def fetch_public_data(lugar: str, tipo_dato: str, periodo: int):
 
     df = pd.DataFrame()
     fig = {}
+    grafico = None
 
     # Si no hay coords, devolvemos ya sin error
     if lat is None or lon is None:
-        return {"df": df, "fig": fig, "geo_info": geo_info}
+        return {"df": df, "fig": fig, "grafico": grafico, "geo_info": geo_info}
 
     # 2) Según tipo_dato
-    if tipo_dato == "Demográficos":
-        # Simulación de población total por año
-        try:
-            years = list(range(2025 - periodo, 2026))
-            valores = [1_000_000 + i * 50_000 for i in range(len(years))]
-            df = pd.DataFrame({"fecha": years, "valor": valores})
-            df["fecha"] = pd.to_datetime(df["fecha"], format="%Y")
-            fig = px.line(
-                df,
-                x="fecha",
-                y="valor",
-                title=f"Población estimada en {lugar} ({2025 - periodo}–2025)"
-            )
-            fig.update_layout(xaxis_title="Año", yaxis_title="Población", template="plotly_white")
-        except Exception:
-            df = pd.DataFrame()
-            fig = {}
-
-    elif tipo_dato == "Meteorológicos":
-        # Simulación de temperatura promedio anual
-        try:
-            years = list(range(2025 - periodo, 2026))
-            temps = [20 + i * 0.2 for i in range(len(years))]
-            df = pd.DataFrame({"fecha": years, "valor": temps})
-            df["fecha"] = pd.to_datetime(df["fecha"], format="%Y")
-            fig = px.line(
-                df,
-                x="fecha",
-                y="valor",
-                title=f"Temperatura promedio anual en {lugar} ({2025 - periodo}–2025)"
-            )
-            fig.update_layout(xaxis_title="Año", yaxis_title="Temperatura (°C)", template="plotly_white")
-        except Exception:
-            df = pd.DataFrame()
-            fig = {}
-
-    elif tipo_dato == "Sísmicos":
-        # Simulación de número de sismos anuales
+    tipo_dato = ALIAS_TIPO_DATO.get(tipo_dato, tipo_dato)
+    if tipo_dato in INDICADORES:
+        # Serie oficial desde el almacén Parquet local (ver utils/indicator_store.py)
         try:
-            years = list(range(2025 - periodo, 2026))
-            sismos = [5 + i for i in range(len(years))]
-            df = pd.DataFrame({"fecha": years, "valor": sismos})
-            df["fecha"] = pd.to_datetime(df["fecha"], format="%Y")
-            fig = px.bar(
-                df,
-                x="fecha",
-                y="valor",
-                title=f"Número de sismos en {lugar} ({2025 - periodo}–2025)"
-            )
-            fig.update_layout(xaxis_title="Año", yaxis_title="Número de sismos", template="plotly_white")
-        except Exception:
-            df = pd.DataFrame()
-            fig = {}
-
-    elif tipo_dato == "Económicos":
-        # Simulación de ingreso per cápita
-        try:
-            years = list(range(2025 - periodo, 2026))
-            ingresos = [20_000 + i * 1_000 for i in range(len(years))]
-            df = pd.DataFrame({"fecha": years, "valor": ingresos})
-            df["fecha"] = pd.to_datetime(df["fecha"], format="%Y")
-            fig = px.line(
-                df,
-                x="fecha",
-                y="valor",
-                title=f"Ingreso per cápita en {lugar} ({2025 - periodo}–2025)"
-            )
-            fig.update_layout(xaxis_title="Año", yaxis_title="Ingreso per cápita (MXN)", template="plotly_white")
+            config = INDICADORES[tipo_dato]
+            anio_fin = date.today().year
+            anio_inicio = anio_fin - periodo
+            df = read_series(config["indicador"], lugar, anio_inicio, anio_fin)
+            if not df.empty:
+                grafico = especificacion(
+                    config["grafico"],
+                    df,
+                    x="fecha",
+                    y="valor",
+                    titulo=f"{config['titulo']} en {lugar} ({anio_inicio}–{anio_fin})",
+                    agregacion="mean",
+                    layout=dict(xaxis_title="Año", yaxis_title=config["eje_y"])
+                )
+                fig = construir_figura(grafico)
         except Exception:
             df = pd.DataFrame()
             fig = {}
+            grafico = None
 
     elif tipo_dato == "Riesgos de Inundación":
         # Aquí descargamos un GeoJSON público de inundaciones (ejemplo de USGS/GitHub)
-        # Para producción, reemplaza con un GeoJSON oficial de CONAGUA o INEGI.
         try:
-            # Ejemplo genérico: GeoJSON de zonas inundables de EE.UU. (solo de demo)
-            geojson_url = "https://raw.githubusercontent.com/giswqs/planetscope-analyses/master/data/us-flood-zones.geojson"
-            resp = requests.get(geojson_url, timeout=15)
-            if resp.status_code == 200 and resp.text.strip() != "":
-                flood_geojson = resp.json()
+            # Sólo los polígonos cercanos a la ubicación (la capa completa queda en caché)
+            llave, flood_geojson = capa_inundacion(lat, lon)
+            if flood_geojson:
                 # Preparar un layer de PyDeck (ver main.py más abajo)
                 fig = {
                     "geojson": flood_geojson,
+                    "capa": llave,
                     "view_state": {
                         "latitude": lat,
                         "longitude": lon,
@@ -138,5 +120,115 @@ def fetch_public_data(lugar: str, tipo_dato: str, periodo: int):
     return {
         "df": df,
         "fig": fig,
+        "grafico": grafico,
         "geo_info": geo_info
     }
+
+
+def capa_inundacion(lat: float, lon: float, radio_km: float = RADIO_CAPA_KM):
+    """
+    Capa de inundaciones recortada a 'radio_km' alrededor de (lat, lon).
+    La capa completa se descarga una vez por proceso y cada recorte se guarda como
+    artefacto compartido, así que la precarga y las sesiones reutilizan el mismo
+    (una sesión que llega durante la precarga espera esa descarga en lugar de
+    repetirla). Los recortes entran en el límite LRU de los artefactos compartidos.
+    Retorna tupla (llave del artefacto, GeoJSON) o (None, None) si no hay capa.
+    """
+    if not _capa_completa():
+        return None, None
+    llave = f"{FLOOD_GEOJSON_URL}#recorte:{lat:.3f},{lon:.3f},{radio_km}"
+
+    def _recortar():
+        # La fábrica no retiene la capa completa: la vuelve a pedir si hay que recrear
+        # el recorte después de que la caché lo descartó
+        completa = _capa_completa()
+        if not completa:
+            return None
+        return recortar_capa(capa_riesgo(completa, llave=FLOOD_GEOJSON_URL), lat, lon, radio_km)
+
+    return llave, artefacto_compartido(llave, _recortar)
+
+
+def _capa_completa():
+    return artefacto_compartido(FLOOD_GEOJSON_URL, lambda: _descargar_geojson(FLOOD_GEOJSON_URL))
+
+
+def _descargar_geojson(url: str):
+    """
+    Descarga un GeoJSON. Retorna el dict, o None si la descarga falla o viene vacía.
+    """
+    resp = transport.get(url)
+    if resp.status_code == 200 and resp.text.strip() != "":
+        return resp.json()
+    return None
+
+
+def fetch_public_data_batch(lugares, tipos_dato, periodo: int):
+    """
+    Versión por lotes de fetch_public_data para comparar varios lugares.
+    Deduplica los lugares por su forma normalizada, los geocodifica, lee todas las
+    series numéricas de 'tipos_dato' del almacén en una sola pasada y construye
+    un DataFrame largo con columnas
+    ['lugar', 'tipo_dato', 'fecha', 'valor', 'lat', 'lon'].
+    "Riesgos de Inundación" no aplica aquí y se ignora.
+    Retorna:
+      - df: DataFrame largo (vacío si no hay datos).
+      - fig: Plotly Figure multilínea (un color por lugar, una fila por tipo de dato) o {}.
+      - grafico: especificación de esa figura (ver utils/charts.py) o None.
+      - geo_info: diccionario {lugar: resultado de geocoding}.
+    """
+    # Un lugar por forma normalizada ("Guadalajara", "guadalajara", "Guadalájara"),
+    # con la primera forma escrita; así el almacén, la figura y la analítica ven uno solo
+    unicos = {}
+    for l in lugares:
+        if l and l.strip():
+            unicos.setdefault(normalizar_texto(l), l.strip())
+    lugares = list(unicos.values())
+    tipos = [ALIAS_TIPO_DATO.get(t, t) for t in tipos_dato]
+    tipos = [t for t in dict.fromkeys(tipos) if t in INDICADORES]
+
+    df = pd.DataFrame()
+    fig = {}
+    grafico = None
+    geo_info = geocode_many(lugares)
+
+    if not lugares or not tipos:
+        return {"df": df, "fig": fig, "grafico": grafico, "geo_info": geo_info}
+
+    try:
+        anio_fin = date.today().year
+        anio_inicio = anio_fin - periodo
+        indicador_a_tipo = {INDICADORES[t]["indicador"]: t for t in tipos}
+        pares = [(ind, lugar) for ind in indicador_a_tipo for lugar in lugares]
+        df = read_series_many(pares, anio_inicio, anio_fin)
+
+        if not df.empty:
+            df["tipo_dato"] = df["indicador"].map(indicador_a_tipo)
+            coords = pd.DataFrame.from_dict(
+                {l: (g.get("lat"), g.get("lon")) for l, g in geo_info.items()},
+                orient="index",
+                columns=["lat", "lon"]
+            )
+            df = df.join(coords, on="lugar")
+            df = df[["lugar", "tipo_dato", "fecha", "valor", "lat", "lon"]]
+
+            varios_tipos = df["tipo_dato"].nunique() > 1
+            grafico = especificacion(
+                "line",
+                df,
+                x="fecha",
+                y="valor",
+                titulo=f"Comparación de {len(lugares)} lugares ({anio_inicio}–{anio_fin})",
+                color="lugar",
+                facet_row="tipo_dato" if varios_tipos else None,
+                height=300 * df["tipo_dato"].nunique() + 150,
+                agregacion="mean",
+                layout=dict(xaxis_title="Año")
+            )
+            fig = construir_figura(grafico)
+    except Exception:
+        df = pd.DataFrame()
+        fig = {}
+        grafico = None
+
+    return {"df": df, "fig": fig, "grafico": grafico, "geo_info": geo_info}
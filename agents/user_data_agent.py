@@ -2,17 +2,51 @@
 
 import os
 import pandas as pd
-from utils.vision_utils import analyze_image
-from utils.llm import transcribe_audio_whisper, analyze_text_with_llm
+from utils.captioning import describir_imagenes
+from utils.vision_utils import analyze_image, analyze_image_tiles, pixeles_imagen, UMBRAL_TESELAS
+from utils.llm import transcribe_long_audio, analyze_text_with_llm, analyze_long_text
+from utils.points import leer_puntos
+from utils.tokens import recortar_a_tokens
 
-def process_user_uploads(ubicacion: str, images, audios, textos, coords_input):
+# Presupuesto máximo de tokens para las descripciones en el prompt del resumen general
+PRESUPUESTO_RESUMEN = 6000
+# Mínimo de tokens por archivo; con más archivos de los que caben, el resto se menciona aparte
+MIN_TOKENS_ARCHIVO = 50
+
+def _resumen_puntos(df_puntos: pd.DataFrame, descartados: int) -> str:
+    """
+    Descripción breve de un archivo de puntos para el resumen general.
+    """
+    if df_puntos.empty:
+        return f"Archivo de puntos sin coordenadas válidas ({descartados} filas descartadas)."
+    partes = [
+        f"{len(df_puntos)} puntos georreferenciados ({descartados} filas descartadas por coordenadas inválidas)",
+        f"extensión lat {df_puntos['lat'].min():.4f} a {df_puntos['lat'].max():.4f}, "
+        f"lon {df_puntos['lon'].min():.4f} a {df_puntos['lon'].max():.4f}"
+    ]
+    for col in df_puntos.columns.drop(["lat", "lon"]):
+        frecuentes = df_puntos[col].astype(str).value_counts().head(3)
+        partes.append(f"{col}: " + ", ".join(f"{v} ({n})" for v, n in frecuentes.items()))
+    return "; ".join(partes) + "."
+
+
+def process_user_uploads(ubicacion: str, images, audios, textos, coords_input, puntos=()):
     """
     Procesa archivos subidos por el usuario dentro del contexto de 'ubicacion'.
-    - Para imágenes: extrae metadatos y colores dominantes con PIL.
-    - Para audios: transcribe con Whisper + resume con LLM.
-    - Para textos: analiza con LLM.
+    - Para imágenes: descripción de su contenido con un modelo local (por lotes,
+      ver utils/captioning.py) más metadatos y colores dominantes con PIL; las grandes
+      (aéreas o de dron) se analizan por teselas y generan un mapa de calor de agua/lodo.
+    - Para audios: quita silencios, transcribe con Whisper por fragmentos en paralelo
+      y resume con LLM (por fragmentos si es largo).
+    - Para textos: analiza con LLM (por fragmentos si es largo).
+    - Para puntos (CSV o GeoJSON de brigadas): lectura por bloques y validación
+      vectorizada de coordenadas (ver utils/points.py); cada punto conserva su
+      propia ubicación en lugar de 'coords_input'.
     Retorna:
-      - df_multimodal: DataFrame con columnas [tipo, archivo, lat, lon, descripcion]
+      - df_multimodal: DataFrame con columnas [tipo, archivo, lat, lon, descripcion, mapa_calor]
+        ('mapa_calor' es la ruta del PNG con el mapa de calor, sólo en imágenes grandes;
+        cada archivo de puntos es una fila con su centro y un resumen)
+      - df_puntos: DataFrame [lat, lon, archivo, *atributos] con todos los puntos válidos.
       - texto_summary: resumen general de todas las descripciones.
     """
 
@@ -25,23 +59,42 @@ def process_user_uploads(ubicacion: str, images, audios, textos, coords_input):
     registros = []
 
     # 2) Procesar imágenes
+    rutas_imagenes = []
     for img_file in images:
         temp_path = os.path.join("data", img_file.name)
         os.makedirs(os.path.dirname(temp_path), exist_ok=True)
         with open(temp_path, "wb") as f:
             f.write(img_file.getbuffer())
 
-        # Descripción básica con PIL
-        descripcion_img = analyze_image(temp_path)
+        # Descripción básica con PIL, o por teselas si la imagen es grande; en ese
+        # caso el modelo de descripción recibe la miniatura y no la imagen completa
+        mapa_calor = None
+        entrada_modelo = temp_path
+        if pixeles_imagen(temp_path) > UMBRAL_TESELAS:
+            ruta_mapa = os.path.splitext(temp_path)[0] + "_calor.png"
+            analisis = analyze_image_tiles(temp_path, path_mapa=ruta_mapa)
+            descripcion_img = analisis["descripcion"]
+            if analisis["superposicion"] is not None:
+                mapa_calor = ruta_mapa
+                entrada_modelo = analisis["miniatura"]
+        else:
+            descripcion_img = analyze_image(temp_path)
 
+        rutas_imagenes.append(entrada_modelo)
         registros.append({
             "tipo": "imagen",
             "archivo": img_file.name,
             "lat": lat,
             "lon": lon,
-            "descripcion": descripcion_img
+            "descripcion": descripcion_img,
+            "mapa_calor": mapa_calor
         })
 
+    # Descripción del contenido de todas las imágenes de una vez, por lotes
+    for registro, contenido in zip(registros, describir_imagenes(rutas_imagenes)):
+        if contenido:
+            registro["descripcion"] = f"Contenido: {contenido}. {registro['descripcion']}"
+
     # 3) Procesar audios
     for audio_file in audios:
         temp_path = os.path.join("data", audio_file.name)
@@ -49,8 +102,8 @@ def process_user_uploads(ubicacion: str, images, audios, textos, coords_input):
         with open(temp_path, "wb") as f:
             f.write(audio_file.getbuffer())
 
-        transcript = transcribe_audio_whisper(temp_path)
-        summary_audio = analyze_text_with_llm(transcript)
+        transcript = transcribe_long_audio(temp_path)
+        summary_audio = analyze_long_text(transcript)
 
         registros.append({
             "tipo": "audio",
@@ -66,7 +119,7 @@ def process_user_uploads(ubicacion: str, images, audios, textos, coords_input):
             content = txt_file.read().decode("utf-8")
         except Exception:
             content = ""
-        analysis_text = analyze_text_with_llm(content)
+        analysis_text = analyze_long_text(content)
 
         registros.append({
             "tipo": "texto",
@@ -76,12 +129,54 @@ def process_user_uploads(ubicacion: str, images, audios, textos, coords_input):
             "descripcion": analysis_text
         })
 
-    # 5) Construir DataFrame
+    # 5) Procesar archivos de puntos
+    lotes_puntos = []
+    for pts_file in puntos:
+        temp_path = os.path.join("data", pts_file.name)
+        os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+        with open(temp_path, "wb") as f:
+            f.write(pts_file.getbuffer())
+
+        try:
+            df_archivo, descartados = leer_puntos(temp_path)
+            descripcion_pts = _resumen_puntos(df_archivo, descartados)
+        except Exception as e:
+            # El error queda en la descripción del archivo en lugar de "0 filas descartadas"
+            df_archivo = pd.DataFrame(columns=["lat", "lon"])
+            descripcion_pts = f"No se pudo leer el archivo de puntos: {e}"
+
+        if not df_archivo.empty:
+            lotes_puntos.append(df_archivo.assign(archivo=pts_file.name))
+        registros.append({
+            "tipo": "puntos",
+            "archivo": pts_file.name,
+            "lat": float(df_archivo["lat"].median()) if not df_archivo.empty else None,
+            "lon": float(df_archivo["lon"].median()) if not df_archivo.empty else None,
+            "descripcion": descripcion_pts
+        })
+
+    # Columnas: lat, lon, archivo y los atributos de cada archivo (vacíos en los que no los tienen)
+    df_puntos = (
+        pd.concat(lotes_puntos, ignore_index=True).astype({"archivo": "category"})
+        if lotes_puntos else pd.DataFrame(columns=["lat", "lon", "archivo"])
+    )
+    df_puntos = df_puntos[["lat", "lon", "archivo", *df_puntos.columns.drop(["lat", "lon", "archivo"])]]
+
+    # 6) Construir DataFrame
     df = pd.DataFrame(registros)
 
-    # 6) Generar resumen general (si hay registros)
+    # 7) Generar resumen general (si hay registros)
     if not df.empty:
-        todos_textos = "\n".join(df["descripcion"].tolist())
+        # Cada archivo recibe una parte igual del presupuesto, así ninguno desplaza a los demás
+        max_archivos = PRESUPUESTO_RESUMEN // MIN_TOKENS_ARCHIVO
+        descripciones = df["descripcion"].tolist()[:max_archivos]
+        por_archivo = PRESUPUESTO_RESUMEN // len(descripciones)
+        todos_textos = recortar_a_tokens(
+            "\n".join(recortar_a_tokens(str(d), por_archivo) for d in descripciones),
+            PRESUPUESTO_RESUMEN
+        )
+        if len(df) > max_archivos:
+            todos_textos += f"\n(Otros {len(df) - max_archivos} archivos no se incluyen en este resumen.)"
         resumen_general = analyze_text_with_llm(
             f"Con base en estas descripciones de archivos subidos en {ubicacion}: {todos_textos}\n"
             "Resume los hallazgos principales."
@@ -91,5 +186,6 @@ def process_user_uploads(ubicacion: str, images, audios, textos, coords_input):
 
     return {
         "df_multimodal": df,
+        "df_puntos": df_puntos,
         "texto_summary": resumen_general
     }
@@ -0,0 +1,236 @@
+# agents/watch_agent.py
+
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from utils import article_store
+from utils.charts import construir_figura
+from agents.news_agent import (
+    buscar_articulos, enriquecer_articulos, filtrar_fechas,
+    grafico_tendencia, insight_noticias
+)
+
+logger = logging.getLogger(__name__)
+
+# Vigilancias guardadas: lugares y palabras clave que se revisan periódicamente.
+# Se puede cambiar con la variable de entorno VIGILANCIAS_PATH.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VIGILANCIAS_PATH = os.getenv(
+    "VIGILANCIAS_PATH",
+    os.path.join(PROJECT_ROOT, "data", "vigilancias.json")
+)
+
+INTERVALO_DEFECTO_MIN = 60
+# Cada cuánto despierta el programador para ver qué vigilancias tocan
+REVISION_SEG = 60
+
+_LOCK = threading.Lock()
+_PROGRAMADOR = None
+
+
+def cargar_vigilancias(path: str = None) -> list:
+    """
+    Lista de vigilancias: dicts {lugar, keywords, intervalo_min, ultima_revision}.
+    """
+    try:
+        with open(path or VIGILANCIAS_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def _escribir_vigilancias(vigilancias: list, path: str = None) -> None:
+    path = path or VIGILANCIAS_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(vigilancias, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def buscar_vigilancia(lugar: str, keywords: str, path: str = None) -> dict:
+    """
+    Vigilancia guardada para 'lugar' y 'keywords', o None.
+    """
+    llave = article_store.llave_busqueda(lugar, keywords)
+    for v in cargar_vigilancias(path):
+        if article_store.llave_busqueda(v["lugar"], v["keywords"]) == llave:
+            return v
+    return None
+
+
+def guardar_vigilancia(lugar: str, keywords: str,
+                       intervalo_min: int = INTERVALO_DEFECTO_MIN, path: str = None) -> None:
+    """
+    Agrega (o actualiza el intervalo de) una vigilancia.
+    """
+    llave = article_store.llave_busqueda(lugar, keywords)
+    with _LOCK:
+        vigilancias = cargar_vigilancias(path)
+        for v in vigilancias:
+            if article_store.llave_busqueda(v["lugar"], v["keywords"]) == llave:
+                v["intervalo_min"] = intervalo_min
+                break
+        else:
+            vigilancias.append({
+                "lugar": lugar,
+                "keywords": keywords or "",
+                "intervalo_min": intervalo_min,
+                "ultima_revision": None
+            })
+        _escribir_vigilancias(vigilancias, path)
+
+
+def quitar_vigilancia(lugar: str, keywords: str, path: str = None) -> None:
+    llave = article_store.llave_busqueda(lugar, keywords)
+    with _LOCK:
+        vigilancias = [
+            v for v in cargar_vigilancias(path)
+            if article_store.llave_busqueda(v["lugar"], v["keywords"]) != llave
+        ]
+        _escribir_vigilancias(vigilancias, path)
+
+
+def actualizar_vigilancia(vigilancia: dict) -> int:
+    """
+    Descarga el feed de la vigilancia, enriquece sólo los artículos que aún no
+    están en el almacén y, si hubo nuevos (o todavía no hay insight, p. ej. porque
+    los artículos vinieron de una búsqueda manual), recalcula el insight.
+    Siempre registra la hora de la revisión.
+    Retorna el número de artículos nuevos.
+    """
+    llave = article_store.llave_busqueda(vigilancia["lugar"], vigilancia["keywords"])
+    df = buscar_articulos(vigilancia["lugar"], vigilancia["keywords"])
+    previos = article_store.leer_articulos(llave)
+    if not previos.empty:
+        df = df[~df["url"].isin(previos["url"])]
+
+    if df.empty:
+        if not previos.empty and not article_store.leer_resumen(llave).get("texto_summary"):
+            article_store.guardar_resumen(llave, insight_noticias(previos["resumen"]), len(previos))
+        else:
+            article_store.registrar_revision(llave)
+        return 0
+
+    nuevos = enriquecer_articulos(df.reset_index(drop=True))
+    todos = article_store.guardar_articulos(llave, nuevos)
+    article_store.guardar_resumen(llave, insight_noticias(todos["resumen"]), len(todos))
+    return len(nuevos)
+
+
+def revisar_vigilancias(path: str = None) -> dict:
+    """
+    Actualiza las vigilancias cuyo intervalo ya se cumplió.
+    Retorna {llave: artículos nuevos} de las que se revisaron.
+    """
+    ahora = time.time()
+    revisadas = {}
+    for v in cargar_vigilancias(path):
+        ultima = v.get("ultima_revision") or 0
+        if ahora - ultima < v.get("intervalo_min", INTERVALO_DEFECTO_MIN) * 60:
+            continue
+        llave = article_store.llave_busqueda(v["lugar"], v["keywords"])
+        try:
+            revisadas[llave] = actualizar_vigilancia(v)
+        except Exception:
+            logger.exception("Error al actualizar la vigilancia '%s'", llave)
+            revisadas[llave] = 0
+
+        # Releer antes de escribir: la lista pudo cambiar mientras se revisaba
+        with _LOCK:
+            vigilancias = cargar_vigilancias(path)
+            for w in vigilancias:
+                if article_store.llave_busqueda(w["lugar"], w["keywords"]) == llave:
+                    w["ultima_revision"] = time.time()
+            _escribir_vigilancias(vigilancias, path)
+    return revisadas
+
+
+def _ciclo(cada_seg: int, path: str = None):
+    while True:
+        try:
+            revisar_vigilancias(path)
+        except Exception:
+            logger.exception("Error en el programador de vigilancias")
+        time.sleep(cada_seg)
+
+
+def iniciar_programador(cada_seg: int = REVISION_SEG, path: str = None) -> threading.Thread:
+    """
+    Arranca (una sola vez por proceso) el hilo que revisa las vigilancias en segundo plano.
+    """
+    global _PROGRAMADOR
+    with _LOCK:
+        if _PROGRAMADOR is None or not _PROGRAMADOR.is_alive():
+            _PROGRAMADOR = threading.Thread(
+                target=_ciclo, args=(cada_seg, path), name="vigilancias", daemon=True
+            )
+            _PROGRAMADOR.start()
+    return _PROGRAMADOR
+
+
+def salida_vigilancia(lugar: str, keywords: str, fecha_inicio=None, fecha_fin=None) -> dict:
+    """
+    Resultado de noticias ya calculado en segundo plano, con la misma forma que
+    fetch_and_process_news (más 'actualizado', la hora de la última revisión).
+    Sólo se filtra por fechas y se arma el gráfico; no hay llamadas a la red ni al
+    LLM, así que si el filtro deja fuera artículos, el insight se rotula como
+    calculado sobre todos los guardados.
+    Retorna None si todavía no hay artículos guardados para esa búsqueda.
+    """
+    llave = article_store.llave_busqueda(lugar, keywords)
+    df = article_store.leer_articulos(llave)
+    if df.empty:
+        return None
+    resumen = article_store.leer_resumen(llave)
+    actualizado = resumen.get("revisado") or resumen.get("actualizado")
+    total = len(df)
+
+    df = filtrar_fechas(df, fecha_inicio, fecha_fin)
+    if df.empty:
+        return {
+            "texto_summary": "No se encontraron noticias para esos parámetros.",
+            "df_articulos": df,
+            "fig_time_series": {},
+            "actualizado": actualizado
+        }
+    texto_summary = resumen.get("texto_summary") or "El insight se generará en la próxima revisión."
+    if len(df) < total:
+        texto_summary = (
+            f"*Insight sobre los {total} artículos guardados, no sólo los "
+            f"{len(df)} del periodo elegido.*\n\n{texto_summary}"
+        )
+    df["lugares"] = df["lugares"].map(lambda v: [] if v is None else list(v))
+    grafico = grafico_tendencia(df, lugar, keywords)
+    return {
+        "texto_summary": texto_summary,
+        "df_articulos": df,
+        "fig_time_series": construir_figura(grafico),
+        "grafico": grafico,
+        "actualizado": actualizado
+    }
+
+
+def _main():
+    parser = argparse.ArgumentParser(
+        description="Revisa las vigilancias de noticias guardadas (sin la interfaz)."
+    )
+    parser.add_argument("--una-vez", action="store_true", help="Revisar una vez y salir")
+    parser.add_argument("--cada-seg", type=int, default=REVISION_SEG)
+    parser.add_argument("--path", default=None)
+    args = parser.parse_args()
+
+    if args.una_vez:
+        for llave, n in revisar_vigilancias(args.path).items():
+            print(f"{datetime.now():%Y-%m-%d %H:%M} {llave}: {n} artículos nuevos.")
+    else:
+        _ciclo(args.cada_seg, args.path)
+
+
+if __name__ == "__main__":
+    _main()
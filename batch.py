@@ -0,0 +1,260 @@
+## batch.py
+
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+
+# ─────────── Asegurar que la carpeta raíz esté en sys.path ───────────
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+if PROJECT_ROOT not in sys.path:
+    sys.path.append(PROJECT_ROOT)
+
+from agents.news_agent import fetch_and_process_news
+from agents.public_data_agent import fetch_public_data, fetch_public_data_batch
+from agents.contrast_agent import run_contrast
+from utils import transport
+from utils.geo import normalizar_texto
+from utils.session_store import compactar_salida
+from utils.workspace import guardar_seccion
+
+# Modo por lotes, sin interfaz: noticias, datos oficiales y contraste para cada fila
+# de un CSV con columnas 'lugar' y, opcionalmente, 'keywords', 'tipos_dato'
+# (separados por ";") y 'periodo'. Ejemplo:
+#   python batch.py lugares.csv --procesos 8 --salida data/lotes/2025-10-20
+
+TIPO_INUNDACION = "Riesgos de Inundación"
+TIPOS_DEFECTO = "Demográficos;Riesgos de Inundación"
+PERIODO_DEFECTO = 5
+LOTES_DIR = os.path.join(PROJECT_ROOT, "data", "lotes")
+
+
+def leer_filas(csv_path: str) -> list:
+    """
+    Filas del CSV de entrada con valores por defecto; se omiten las que no tienen lugar.
+    """
+    filas = []
+    with open(csv_path, encoding="utf-8-sig", newline="") as f:
+        for fila in csv.DictReader(f):
+            lugar = (fila.get("lugar") or "").strip()
+            if not lugar:
+                continue
+            tipos = fila.get("tipos_dato") or TIPOS_DEFECTO
+            try:
+                periodo = int(fila.get("periodo") or PERIODO_DEFECTO)
+            except ValueError:
+                periodo = PERIODO_DEFECTO
+            filas.append({
+                "lugar": lugar,
+                "keywords": (fila.get("keywords") or "").strip(),
+                "tipos_dato": [t.strip() for t in tipos.split(";") if t.strip()],
+                "periodo": periodo
+            })
+    return filas
+
+
+def _slugs(fila: dict) -> tuple:
+    """
+    (slug del lugar, slug de las palabras clave) de una fila; "_" si están vacíos.
+    """
+    return normalizar_texto(fila["lugar"]) or "_", normalizar_texto(fila["keywords"]) or "_"
+
+
+def _escribir_particion(df, salida_dir: str, tabla: str, slug: str, slug_kw: str) -> None:
+    """
+    Escribe 'df' como partición hive '<tabla>/lugar=<slug>/keywords=<slug_kw>/part-0.parquet',
+    así dos filas del mismo lugar con distintas palabras clave no se pisan.
+    """
+    if df is None or df.empty:
+        return
+    carpeta = os.path.join(salida_dir, tabla, f"lugar={slug}", f"keywords={slug_kw}")
+    os.makedirs(carpeta, exist_ok=True)
+    df = df.drop(columns=["lugar", "keywords"], errors="ignore")
+    df.to_parquet(os.path.join(carpeta, "part-0.parquet"), index=False)
+
+
+def _reporte(fila: dict, news: dict, contraste: dict) -> str:
+    """
+    Reporte en Markdown de un lugar.
+    """
+    lineas = [
+        f"# {fila['lugar']}",
+        "",
+        f"- Generado: {datetime.now():%Y-%m-%d %H:%M}",
+        f"- Palabras clave: {fila['keywords'] or '—'}",
+        f"- Tipos de dato: {', '.join(fila['tipos_dato'])} (últimos {fila['periodo']} años)",
+        f"- Noticias: {len(news['df_articulos'])} artículos",
+        "",
+        "## Noticias",
+        "",
+        news["texto_summary"],
+        "",
+        "## Análisis cuantitativo",
+        "",
+        contraste["analytics_output"]["texto_conclusiones"],
+    ]
+    if contraste["spatial_output"] is not None:
+        df_puntos = contraste["spatial_output"]["df_puntos"]
+        lineas += [
+            "",
+            "## Zonas de inundación",
+            "",
+            f"{int(df_puntos['en_zona_riesgo'].sum())} de {len(df_puntos)} puntos dentro de una zona de riesgo.",
+        ]
+    lineas += ["", "## Contraste", "", contraste["texto_contraste"], ""]
+    return "\n".join(lineas)
+
+
+def procesar_lugar(fila: dict, salida_dir: str, guardar_workspace: bool = True) -> dict:
+    """
+    Corre noticias, datos oficiales y contraste para una fila y escribe sus resultados.
+    Retorna un resumen {lugar, articulos, registros_oficiales, puntos_en_riesgo, segundos, estado}.
+    """
+    inicio = time.time()
+    lugar = fila["lugar"]
+    slug, slug_kw = _slugs(fila)
+
+    news = fetch_and_process_news(lugar, fila["keywords"], None, None)
+    tipos_num = [t for t in fila["tipos_dato"] if t != TIPO_INUNDACION]
+    batch = fetch_public_data_batch([lugar], tipos_num, fila["periodo"]) if tipos_num else None
+    public = (
+        fetch_public_data(lugar, TIPO_INUNDACION, fila["periodo"])
+        if TIPO_INUNDACION in fila["tipos_dato"] else None
+    )
+    contraste = run_contrast(
+        lugar,
+        news_output=news,
+        public_output=public,
+        batch_output=batch,
+        consulta=f"{lugar} {fila['keywords']}"
+    )
+
+    _escribir_particion(news["df_articulos"], salida_dir, "noticias", slug, slug_kw)
+    _escribir_particion((batch or {}).get("df"), salida_dir, "oficiales", slug, slug_kw)
+    _escribir_particion(contraste["analytics_output"]["df_detalle"], salida_dir, "analitica", slug, slug_kw)
+    if contraste["spatial_output"] is not None:
+        _escribir_particion(contraste["spatial_output"]["df_puntos"], salida_dir, "riesgo", slug, slug_kw)
+
+    os.makedirs(os.path.join(salida_dir, "reportes"), exist_ok=True)
+    with open(os.path.join(salida_dir, "reportes", f"{slug}__{slug_kw}.md"), "w", encoding="utf-8") as f:
+        f.write(_reporte(fila, news, contraste))
+
+    # Mismo espacio de trabajo que la interfaz: la ubicación se abre ya calculada.
+    # Hay uno por lugar, así que con varias filas del mismo lugar queda la última.
+    if guardar_workspace:
+        guardar_seccion(lugar, "noticias", compactar_salida(news), {"keywords": fila["keywords"]})
+        guardar_seccion(lugar, "oficiales", compactar_salida(public), {"tipo_dato": TIPO_INUNDACION})
+        guardar_seccion(lugar, "comparacion", compactar_salida(batch), {"tipos_dato": tipos_num})
+        guardar_seccion(
+            lugar,
+            "contraste",
+            {
+                "texto": contraste["texto_contraste"],
+                "analytics_output": compactar_salida(contraste["analytics_output"]),
+                "spatial_output": contraste["spatial_output"]
+            },
+            dependencias=[n for n, s in (("noticias", news), ("oficiales", public), ("comparacion", batch)) if s]
+        )
+
+    puntos = (contraste["spatial_output"] or {}).get("df_puntos")
+    return {
+        "lugar": lugar,
+        "keywords": fila["keywords"],
+        "articulos": len(news["df_articulos"]),
+        "registros_oficiales": len(batch["df"]) if batch else 0,
+        "puntos_en_riesgo": int(puntos["en_zona_riesgo"].sum()) if puntos is not None else 0,
+        "segundos": round(time.time() - inicio, 1),
+        "estado": "ok"
+    }
+
+
+def procesar_filas_lugar(filas: list, salida_dir: str, guardar_workspace: bool = True) -> list:
+    """
+    Procesa en serie las filas de un mismo lugar (distintas palabras clave). Como todas
+    corren en el mismo proceso, nunca hay dos procesos escribiendo el espacio de
+    trabajo de un lugar a la vez. Retorna la lista de resúmenes, uno por fila.
+    """
+    resumen = []
+    for fila in filas:
+        try:
+            resumen.append(procesar_lugar(fila, salida_dir, guardar_workspace))
+        except Exception as e:
+            resumen.append({"lugar": fila["lugar"], "keywords": fila["keywords"], "estado": f"error: {e}"})
+    return resumen
+
+
+def _iniciar_proceso(limitador: dict) -> None:
+    transport.usar_limitador_compartido(limitador)
+
+
+def correr_lote(filas: list, salida_dir: str, procesos: int = None, guardar_workspace: bool = True) -> pd.DataFrame:
+    """
+    Reparte las filas en un pool de procesos, agrupadas por lugar (las de un mismo
+    lugar van en serie a un solo proceso). Los límites por host de utils/transport.py
+    (p. ej. 1 req/s a Nominatim) se comparten entre todos los procesos.
+    Retorna un DataFrame con el resumen de cada lugar (también se guarda como resumen.csv).
+    """
+    procesos = procesos or os.cpu_count() or 1
+    os.makedirs(salida_dir, exist_ok=True)
+    resumen = []
+    por_lugar = {}
+    for fila in filas:
+        por_lugar.setdefault(_slugs(fila)[0], []).append(fila)
+
+    with multiprocessing.Manager() as manager:
+        limitador = transport.limitador_compartido(manager)
+        with ProcessPoolExecutor(
+            max_workers=procesos,
+            initializer=_iniciar_proceso,
+            initargs=(limitador,)
+        ) as pool:
+            futuros = {
+                pool.submit(procesar_filas_lugar, grupo, salida_dir, guardar_workspace): grupo
+                for grupo in por_lugar.values()
+            }
+            for futuro in as_completed(futuros):
+                grupo = futuros[futuro]
+                try:
+                    resultados = futuro.result()
+                except Exception as e:
+                    resultados = [
+                        {"lugar": f["lugar"], "keywords": f["keywords"], "estado": f"error: {e}"}
+                        for f in grupo
+                    ]
+                for resultado in resultados:
+                    resumen.append(resultado)
+                    print(
+                        f"[{len(resumen)}/{len(filas)}] {resultado['lugar']} "
+                        f"({resultado['keywords'] or '—'}): {resultado['estado']}"
+                    )
+
+    df_resumen = pd.DataFrame(resumen)
+    df_resumen.to_csv(os.path.join(salida_dir, "resumen.csv"), index=False)
+    return df_resumen
+
+
+def _main():
+    parser = argparse.ArgumentParser(
+        description="Corre noticias, datos oficiales y contraste para cada lugar de un CSV."
+    )
+    parser.add_argument("csv_path", help="CSV con columnas lugar[, keywords, tipos_dato, periodo]")
+    parser.add_argument("--salida", default=None, help="Carpeta de resultados (por defecto data/lotes/<fecha>)")
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos en paralelo (por defecto, núcleos)")
+    parser.add_argument("--sin-workspace", action="store_true", help="No guardar espacios de trabajo para la interfaz")
+    args = parser.parse_args()
+
+    salida_dir = args.salida or os.path.join(LOTES_DIR, f"{datetime.now():%Y-%m-%d_%H%M}")
+    filas = leer_filas(args.csv_path)
+    df_resumen = correr_lote(filas, salida_dir, args.procesos, not args.sin_workspace)
+    ok = (df_resumen["estado"] == "ok").sum() if not df_resumen.empty else 0
+    print(f"{ok} de {len(filas)} lugares procesados. Resultados en {salida_dir}")
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,2 @@
+# conftest.py
+# Permite importar los paquetes del proyecto (agents, utils) desde tests/
@@ -15,7 +15,33 @@ if PROJECT_ROOT not in sys.path:
 # Importar agentes
 from agents.news_agent import fetch_and_process_news
 from agents.user_data_agent import process_user_uploads
-from agents.public_data_agent import fetch_public_data
+from agents.public_data_agent import fetch_public_data, fetch_public_data_batch
+from agents.contrast_agent import run_contrast, hechos_oficiales as _hechos_oficiales
+from agents.watch_agent import (
+    buscar_vigilancia, cargar_vigilancias, guardar_vigilancia, quitar_vigilancia,
+    iniciar_programador, salida_vigilancia
+)
+from agents.prefetch_agent import iniciar_precarga
+from utils.article_store import llave_busqueda
+from utils.gazetteer import sugerir_lugares
+from utils.llm import estadisticas_llm
+from utils.retrieval import IndiceContexto
+from utils.session_store import compactar_salida, figura, geojson_de, medir_sesion
+from utils.workspace import guardar_seccion, secciones_guardadas, cargar_seccion
+
+# Máximo de tokens de evidencia que se envían al LLM en el contraste
+PRESUPUESTO_CONTRASTE = 1500
+# Máximo de puntos subidos en masa que se envían al mapa (el resto se muestrea)
+MAX_PUNTOS_MAPA = 100_000
+
+# Secciones del espacio de trabajo guardado y la clave de session_state de cada una
+SECCIONES_WORKSPACE = {
+    "noticias": "news_output",
+    "propios": "multimodal_output",
+    "oficiales": "public_output",
+    "comparacion": "public_batch_output",
+    "contraste": "contraste_output"
+}
 
 # ─────────── Configuración de traducciones ───────────
 TEXTS = {
@@ -25,6 +51,13 @@ TEXTS = {
         "spanish": "Español",
         "english": "English",
 
+        # Memoria
+        "memory_header": "Memoria de la sesión",
+        "memory_session": "Esta sesión: {:.2f} MB",
+        "memory_shared": "Compartido por el proceso: {:.2f} MB",
+        "memory_capacity": "Sesiones como ésta que caben en el nodo: ~{:,}",
+        "llm_header": "Llamadas al LLM (modelo y latencia por tarea)",
+
         # Introducción
         "intro_header": "📄 Introducción a Geo-Agent-AI",
         "intro_text": (
@@ -43,7 +76,7 @@ TEXTS = {
         "step_3": "3) Ingresa y confirma la ubicación (ciudad o coordenadas) en el cuadro de texto.",
         "step_4": "4) Navega por las pestañas:\n   • **Buscar Noticias**: busca artículos, obtén resúmenes y tendencia.\n"
                   "   • **Subir Información**: carga imágenes, audios y textos; genera descripciones y mapa.\n"
-                  "   • **Datos Oficiales**: consulta datos numéricos simulados o capas de riesgos de inundación.\n"
+                  "   • **Datos Oficiales**: consulta series oficiales (almacén local) o capas de riesgos de inundación.\n"
                   "   • **Contraste**: combina todos los inputs para un análisis comparativo.",
         "step_5": "5) Sigue las instrucciones dentro de cada pestaña para procesar la información.",
 
@@ -51,8 +84,13 @@ TEXTS = {
         "input_location_subheader": "1) Ingresa la ubicación principal",
         "input_location_placeholder": "Ejemplo: Ciudad de México, Guadalajara, Monterrey o coordenadas (lat, lon)",
         "btn_confirm_location": "Confirmar Ubicación",
+        "location_suggestions": "Sugerencias",
         "msg_empty_location": "Por favor, escribe una ubicación válida.",
         "msg_location_set": "Ubicación establecida en: {}",
+        "workspace_found": "Hay un análisis guardado para {} ({} secciones, último guardado {}).",
+        "btn_open_workspace": "Abrir análisis guardado",
+        "msg_workspace_loaded": "Análisis guardado cargado: {}.",
+        "workspace_stale": "El contraste guardado no se cargó porque alguna de sus fuentes se actualizó después.",
         "msg_no_location": "👆 Por favor, ingresa y confirma la ubicación para continuar con los agentes.",
 
         # Pestañas
@@ -67,22 +105,33 @@ TEXTS = {
         "news_start_date": "Fecha inicio (opcional)",
         "news_end_date": "Fecha fin (opcional)",
         "btn_search_news": "Ejecutar Búsqueda de Noticias",
+        "news_watch": "Vigilar esta ubicación y palabras clave (revisión automática)",
+        "news_watch_interval": "Revisar cada (minutos)",
+        "news_watch_updated": "Resultados de la vigilancia, actualizados el {}.",
+        "news_watch_pending": "Vigilancia activa: los primeros resultados aparecerán tras la próxima revisión.",
         "insight_news": "Insight general de noticias",
         "articles_found": "Artículos encontrados",
         "trend_news": "Tendencia de Publicaciones",
         "msg_no_news": "No se encontraron artículos para esos parámetros.",
+        "time_agg": "Agregación temporal del gráfico",
+        "time_agg_options": {"": "Original", "h": "Hora", "D": "Día", "W": "Semana"},
+        "map_news": "Mapa de Artículos por Lugar Mencionado",
 
         # Subir Información
         "upload_header": "📤 Agente: Subir Información Multimodal",
-        "upload_description": "Aquí puedes subir **imágenes**, **audios** y **textos** relacionados con la ubicación: **{}**",
+        "upload_description": "Aquí puedes subir **imágenes**, **audios**, **textos** y **puntos** (CSV/GeoJSON) relacionados con la ubicación: **{}**",
         "upload_images": "Imágenes (png, jpg, jpeg)",
         "upload_audios": "Audios (mp3, wav)",
         "upload_texts": "Archivos de Texto (.txt)",
+        "upload_points": "Observaciones georreferenciadas (CSV o GeoJSON con columnas lat/lon)",
+        "map_points": "Observaciones de brigadas ({} puntos)",
+        "points_sampled": "Se muestran {} de {} puntos (muestra aleatoria).",
         "upload_coords": "Coordenadas (lat, lon) donde se tomó la información (opcional)",
         "btn_process_uploads": "Procesar Archivos Subidos",
         "multimodal_analysis": "Análisis Multimodal",
         "msg_no_uploads": "No se subió información para procesar.",
         "map_resources": "Mapa de Recursos Georreferenciados",
+        "heatmap_uploads": "Agua y lodo detectados (imágenes grandes, por teselas)",
         "summary_uploads": "Resumen General de lo Subido",
 
         # Datos Oficiales
@@ -100,6 +149,11 @@ TEXTS = {
         "public_no_graph": "No se generó gráfico para estos datos oficiales.",
         "flood_header": "Mapa de Riesgos de Inundación (GeoJSON)",
         "flood_no_geojson": "No se pudo descargar o procesar el GeoJSON de inundaciones.",
+        "compare_header": "Comparar varios lugares",
+        "compare_places": "Lugares a comparar (uno por línea)",
+        "compare_types": "Tipos de dato a comparar",
+        "btn_compare": "Comparar Lugares",
+        "msg_no_compare": "No hay datos oficiales para los lugares indicados.",
 
         # Contraste
         "contrast_header": "🔄 Contraste y Análisis de Información Combinada",
@@ -117,11 +171,15 @@ TEXTS = {
         "contrast_multimodal": "Información Propia:\n{}",
         "contrast_public_num": "Datos Oficiales (numéricos):\n{}",
         "contrast_public_geo": "Datos Oficiales (GeoJSON de inundaciones) disponibles.",
+        "contrast_analytics": "Análisis Cuantitativo:\n{}",
+        "contrast_spatial": "Cruce Espacial con Zonas de Inundación:\n{}",
         "contrast_prompt": "Contrasta la información de las noticias, la información propia y los datos oficiales para la ubicación {}.\n\n{}\n\nResume las similitudes, diferencias y posibles conclusiones.",
         "result_contrast": "Resultado del Análisis de Contraste",
         "combined_viz": "Visualizaciones Combinadas (ejemplo)",
         "trend_news_viz": "**Tendencia de Noticias**",
         "trend_public_viz": "**Tendencia de Datos Oficiales (numéricos)**",
+        "analytics_viz": "**Análisis Cuantitativo (medias móviles y anomalías)**",
+        "spatial_viz": "**Puntos frente a Zonas de Inundación**",
         "flood_map_viz": "**Mapa de Riesgos de Inundación**",
         "resources_map_viz": "**Mapa de Recursos Propios (puntos)**",
         "end_info": "Puedes regresar a cada pestaña de los agentes para actualizar los datos y luego volver aquí para regenerar el contraste."
@@ -132,6 +190,13 @@ TEXTS = {
         "spanish": "Español",
         "english": "English",
 
+        # Memory
+        "memory_header": "Session memory",
+        "memory_session": "This session: {:.2f} MB",
+        "memory_shared": "Shared by the process: {:.2f} MB",
+        "memory_capacity": "Sessions like this one that fit on the node: ~{:,}",
+        "llm_header": "LLM calls (model and latency per task)",
+
         # Introduction
         "intro_header": "📄 Introduction to Geo-Agent-AI",
         "intro_text": (
@@ -149,7 +214,7 @@ TEXTS = {
         "step_3": "3) Enter and confirm your location (city or coordinates) in the text box.",
         "step_4": "4) Navigate through the tabs:\n   • **Search News**: lookup articles, get summaries and trends.\n"
                   "   • **Upload Data**: upload images, audio, and text; generate descriptions and a map.\n"
-                  "   • **Official Data**: fetch numeric simulations or flood-risk layers.\n"
+                  "   • **Official Data**: fetch official series (local store) or flood-risk layers.\n"
                   "   • **Contrast**: combine all inputs for a comparative analysis.",
         "step_5": "5) Follow the instructions in each tab to process your data.",
 
@@ -157,8 +222,13 @@ TEXTS = {
         "input_location_subheader": "1) Enter the main location",
         "input_location_placeholder": "Example: Mexico City, Guadalajara, Monterrey or coordinates (lat, lon)",
         "btn_confirm_location": "Confirm Location",
+        "location_suggestions": "Suggestions",
         "msg_empty_location": "Please enter a valid location.",
         "msg_location_set": "Location set to: {}",
+        "workspace_found": "There is a saved analysis for {} ({} sections, last saved {}).",
+        "btn_open_workspace": "Open saved analysis",
+        "msg_workspace_loaded": "Saved analysis loaded: {}.",
+        "workspace_stale": "The saved contrast was not loaded because one of its sources was updated afterwards.",
         "msg_no_location": "👆 Please enter and confirm the location to continue with the agents.",
 
         # Tabs
@@ -173,22 +243,33 @@ TEXTS = {
         "news_start_date": "Start date (optional)",
         "news_end_date": "End date (optional)",
         "btn_search_news": "Run News Search",
+        "news_watch": "Watch this location and keywords (automatic checks)",
+        "news_watch_interval": "Check every (minutes)",
+        "news_watch_updated": "Watch results, updated on {}.",
+        "news_watch_pending": "Watch active: first results will appear after the next check.",
         "insight_news": "News global insight",
         "articles_found": "Articles found",
         "trend_news": "Publication Trend",
         "msg_no_news": "No articles found for those parameters.",
+        "time_agg": "Chart time aggregation",
+        "time_agg_options": {"": "Raw", "h": "Hour", "D": "Day", "W": "Week"},
+        "map_news": "Map of Articles by Mentioned Place",
 
         # Upload Data
         "upload_header": "📤 Agent: Upload Multimodal Data",
-        "upload_description": "Here you can upload **images**, **audios**, and **texts** related to the location: **{}**",
+        "upload_description": "Here you can upload **images**, **audios**, **texts**, and **points** (CSV/GeoJSON) related to the location: **{}**",
         "upload_images": "Images (png, jpg, jpeg)",
         "upload_audios": "Audios (mp3, wav)",
         "upload_texts": "Text Files (.txt)",
+        "upload_points": "Georeferenced observations (CSV or GeoJSON with lat/lon columns)",
+        "map_points": "Field brigade observations ({} points)",
+        "points_sampled": "Showing {} of {} points (random sample).",
         "upload_coords": "Coordinates (lat, lon) where the data was collected (optional)",
         "btn_process_uploads": "Process Uploaded Files",
         "multimodal_analysis": "Multimodal Analysis",
         "msg_no_uploads": "No data was uploaded for processing.",
         "map_resources": "Georeferenced Data Map",
+        "heatmap_uploads": "Detected water and mud (large images, tiled)",
         "summary_uploads": "General Summary of Uploads",
 
         # Official Data
@@ -206,6 +287,11 @@ TEXTS = {
         "public_no_graph": "No chart generated for these official data.",
         "flood_header": "Flood Risk Map (GeoJSON)",
         "flood_no_geojson": "Could not download or process the flood GeoJSON.",
+        "compare_header": "Compare several locations",
+        "compare_places": "Locations to compare (one per line)",
+        "compare_types": "Data types to compare",
+        "btn_compare": "Compare Locations",
+        "msg_no_compare": "No official data for the given locations.",
 
         # Contrast
         "contrast_header": "🔄 Contrast and Combined Analysis",
@@ -223,11 +309,15 @@ TEXTS = {
         "contrast_multimodal": "User Data:\n{}",
         "contrast_public_num": "Official Data (numeric):\n{}",
         "contrast_public_geo": "Official data (flood GeoJSON) available.",
+        "contrast_analytics": "Quantitative Analysis:\n{}",
+        "contrast_spatial": "Spatial Join with Flood Zones:\n{}",
         "contrast_prompt": "Contrast the information from news, user data, and official data for location {}.\n\n{}\n\nSummarize similarities, differences, and possible conclusions.",
         "result_contrast": "Contrast Analysis Result",
         "combined_viz": "Combined Visualizations (example)",
         "trend_news_viz": "**News Trend**",
         "trend_public_viz": "**Official Data Trend (numeric)**",
+        "analytics_viz": "**Quantitative Analysis (rolling means and anomalies)**",
+        "spatial_viz": "**Points vs. Flood Zones**",
         "flood_map_viz": "**Flood Risk Map**",
         "resources_map_viz": "**User Resources Map (points)**",
         "end_info": "You can return to each agent tab to refresh data and then come back here to regenerate the contrast."
@@ -249,6 +339,154 @@ lang_choice = st.sidebar.selectbox(
 lang_code = "es" if lang_choice == TEXTS["es"]["spanish"] else "en"
 t = TEXTS[lang_code]
 
+
+def indice_contexto() -> IndiceContexto:
+    """
+    Índice de evidencias de la sesión; los agentes lo alimentan al terminar
+    y la pestaña de contraste selecciona de él lo más relevante.
+    """
+    if "indice_contexto" not in st.session_state:
+        st.session_state["indice_contexto"] = IndiceContexto()
+    return st.session_state["indice_contexto"]
+
+
+def hechos_oficiales(df, tipo_dato: str) -> list:
+    """
+    Convierte una tabla de datos oficiales (simple o de comparación) en frases cortas.
+    """
+    return _hechos_oficiales(df, tipo_dato, st.session_state["ubicacion"])
+
+
+def guardar_en_workspace(nombre: str, parametros: dict = None, dependencias=()):
+    """
+    Guarda en disco la salida de la sesión correspondiente a la sección 'nombre'
+    del espacio de trabajo de la ubicación actual (sólo esa sección se reescribe).
+    """
+    guardar_seccion(
+        st.session_state["ubicacion"],
+        nombre,
+        st.session_state.get(SECCIONES_WORKSPACE[nombre]),
+        parametros,
+        dependencias
+    )
+
+
+def abrir_workspace(secciones: dict) -> list:
+    """
+    Marca como pendientes las secciones guardadas vigentes de la ubicación actual;
+    sus datos no se leen aquí sino cuando una pestaña las usa (ver cargar_pendientes).
+    Retorna la lista de secciones pendientes.
+    """
+    pendientes = {
+        nombre: info for nombre, info in secciones.items()
+        if nombre in SECCIONES_WORKSPACE and info["vigente"]
+    }
+    st.session_state["workspace_pendiente"] = {
+        "ubicacion": st.session_state["ubicacion"],
+        "secciones": pendientes
+    }
+    return list(pendientes)
+
+
+def cargar_pendientes(*nombres):
+    """
+    Carga en la sesión las secciones 'nombres' del análisis guardado que sigan
+    pendientes, la primera vez que una pestaña las usa, y alimenta con ellas el
+    índice de evidencias. Una sección que ya se volvió a generar en la sesión se omite.
+    """
+    pendiente = st.session_state.get("workspace_pendiente")
+    if not pendiente:
+        return
+    for nombre in nombres:
+        info = pendiente["secciones"].pop(nombre, None)
+        if info is None or SECCIONES_WORKSPACE[nombre] in st.session_state:
+            continue
+        salida = cargar_seccion(pendiente["ubicacion"], nombre)
+        if salida is None:
+            continue
+        st.session_state[SECCIONES_WORKSPACE[nombre]] = salida
+
+        if nombre == "noticias" and not salida["df_articulos"].empty:
+            indice_contexto().reemplazar_fuente("noticias", salida["df_articulos"]["resumen"])
+        elif nombre == "propios" and not salida["df_multimodal"].empty:
+            indice_contexto().reemplazar_fuente("propios", salida["df_multimodal"]["descripcion"])
+        elif nombre in ("oficiales", "comparacion"):
+            indice_contexto().reemplazar_fuente(
+                nombre, hechos_oficiales(salida.get("df"), info["parametros"].get("tipo_dato", ""))
+            )
+        elif nombre == "contraste":
+            if salida.get("analytics_output"):
+                st.session_state["analytics_output"] = salida["analytics_output"]
+            if salida.get("spatial_output"):
+                st.session_state["spatial_output"] = salida["spatial_output"]
+
+
+def mapa_puntos(df_puntos, key: str):
+    """
+    Puntos subidos en masa como ScatterplotLayer de PyDeck. Sólo se envían las
+    columnas de coordenadas (redondeadas a ~1 m) y hasta MAX_PUNTOS_MAPA puntos.
+    """
+    df_xy = df_puntos[["lon", "lat"]].astype("float64").round(5)
+    if len(df_xy) > MAX_PUNTOS_MAPA:
+        df_xy = df_xy.sample(MAX_PUNTOS_MAPA, random_state=0)
+        st.caption(t["points_sampled"].format(MAX_PUNTOS_MAPA, len(df_puntos)))
+    capa = pdk.Layer(
+        "ScatterplotLayer",
+        data=df_xy,
+        get_position=["lon", "lat"],
+        get_fill_color=[0, 90, 200, 160],
+        get_radius=20,
+        radius_min_pixels=2,
+        radius_max_pixels=6,
+        pickable=False
+    )
+    # Vista a partir de una muestra aleatoria: el archivo puede venir ordenado por zona
+    muestra_vista = df_xy.sample(min(len(df_xy), 1000), random_state=0)
+    vista = pdk.data_utils.compute_view(muestra_vista.values.tolist())
+    st.pydeck_chart(
+        pdk.Deck(layers=[capa], initial_view_state=vista, map_style="mapbox://styles/mapbox/light-v10"),
+        key=key
+    )
+
+
+def mostrar_noticias(news_output: dict):
+    """
+    Insight, tabla, mapa y tendencia de una salida de noticias (recién calculada o de una vigilancia).
+    """
+    st.subheader(t["insight_news"])
+    st.markdown(news_output["texto_summary"])
+
+    st.subheader(t["articles_found"])
+    df_n = news_output["df_articulos"]
+    if df_n.empty:
+        st.write(t["msg_no_news"])
+    else:
+        st.dataframe(
+            df_n[["fecha", "fuente", "titulo", "resumen", "url"]],
+            use_container_width=True
+        )
+
+        # ──── MAPA de artículos ubicados por sus lugares mencionados ────
+        if {"lat", "lon"} <= set(df_n.columns):
+            df_mapa_n = df_n.dropna(subset=["lat", "lon"])[["lat", "lon"]]
+            if not df_mapa_n.empty:
+                st.subheader(t["map_news"])
+                st.map(df_mapa_n)
+
+    st.subheader(t["trend_news"])
+    fig_n = figura(
+        news_output.get("grafico") or news_output["fig_time_series"],
+        st.session_state.get("agg_news")
+    )
+    if fig_n and hasattr(fig_n, "to_plotly_json"):
+        st.plotly_chart(fig_n, use_container_width=True, key="plot_news_trend")
+    else:
+        st.write(t["msg_no_news"])
+
+
+# Revisión periódica de las vigilancias en segundo plano (un solo hilo por proceso)
+iniciar_programador()
+
 # ─────────── Título principal ───────────
 # Mostrar imagen de cabecera si existe
 if os.path.exists(os.path.join(PROJECT_ROOT, "mapa.jpg")):
@@ -270,6 +508,27 @@ if os.path.exists(os.path.join(PROJECT_ROOT, "Mapacomunidad.png")):
 else:
     st.sidebar.warning("⚠️ No se encontró `Mapacomunidad.png` en la carpeta principal.")
 
+# ─────────── Medidor de memoria de la sesión ───────────
+medicion = medir_sesion(st.session_state)
+with st.sidebar.expander(t["memory_header"]):
+    st.write(t["memory_session"].format(medicion["total_sesion"] / 1024 ** 2))
+    st.write(t["memory_shared"].format(medicion["compartido"] / 1024 ** 2))
+    if medicion["sesiones_estimadas"] is not None:
+        st.write(t["memory_capacity"].format(medicion["sesiones_estimadas"]))
+    st.dataframe(
+        pd.DataFrame(
+            [(k, v / 1024) for k, v in medicion["por_clave"].items()],
+            columns=["clave", "KB"]
+        ),
+        use_container_width=True
+    )
+
+# Decisiones de enrutamiento del LLM en este proceso
+estadisticas = estadisticas_llm()
+if estadisticas:
+    with st.sidebar.expander(t["llm_header"]):
+        st.dataframe(pd.DataFrame(estadisticas).round({"latencia_media": 2}), use_container_width=True)
+
 # ─────────── Paso a paso ───────────
 st.subheader(t["step_header"])
 st.markdown(t["step_1"])
@@ -290,6 +549,18 @@ ubicacion_input = st.text_input(
     value=st.session_state["ubicacion"]
 )
 
+# Autocompletado con el gazetteer local (sin llamadas externas)
+sugerencias = []
+if len(ubicacion_input.strip()) >= 3 and ubicacion_input.strip() != st.session_state["ubicacion"]:
+    sugerencias = sugerir_lugares(ubicacion_input)
+if sugerencias:
+    sugerencia = st.selectbox(
+        t["location_suggestions"],
+        [ubicacion_input.strip()] + [s for s in sugerencias if s != ubicacion_input.strip()],
+        key="sel_sugerencia_ubicacion"
+    )
+    ubicacion_input = sugerencia
+
 if st.button(t["btn_confirm_location"]):
     if ubicacion_input.strip() == "":
         st.error(t["msg_empty_location"])
@@ -297,10 +568,38 @@ if st.button(t["btn_confirm_location"]):
         st.session_state["ubicacion"] = ubicacion_input.strip()
         st.success(t["msg_location_set"].format(st.session_state["ubicacion"]))
 
+        # Precarga en segundo plano (geocodificación, capa de inundaciones y feeds);
+        # la de la ubicación anterior se cancela
+        if st.session_state.get("precarga") is not None:
+            st.session_state["precarga"].set()
+        keywords_precarga = [st.session_state.get("keywords_news", "")] + [
+            v["keywords"] for v in cargar_vigilancias()
+            if llave_busqueda(v["lugar"], "") == llave_busqueda(st.session_state["ubicacion"], "")
+        ]
+        st.session_state["precarga"] = iniciar_precarga(
+            st.session_state["ubicacion"], [k for k in keywords_precarga if k]
+        )
+
 if not st.session_state["ubicacion"]:
     st.info(t["msg_no_location"])
     st.stop()
 
+# Análisis guardado para esta ubicación: sólo se lee el manifiesto hasta que se abre
+if st.session_state.get("workspace_abierto") != st.session_state["ubicacion"]:
+    secciones = secciones_guardadas(st.session_state["ubicacion"])
+    if secciones:
+        st.info(t["workspace_found"].format(
+            st.session_state["ubicacion"],
+            len(secciones),
+            max(info["guardado"] for info in secciones.values())
+        ))
+        if st.button(t["btn_open_workspace"], key="btn_abrir_workspace"):
+            cargadas = abrir_workspace(secciones)
+            st.session_state["workspace_abierto"] = st.session_state["ubicacion"]
+            st.success(t["msg_workspace_loaded"].format(", ".join(cargadas)))
+            if "contraste" in secciones and "contraste" not in cargadas:
+                st.warning(t["workspace_stale"])
+
 # ─────────── PASO 2: PESTAÑAS DE AGENTES ───────────
 tab1, tab2, tab3, tab4 = st.tabs([
     t["tab_news"],
@@ -311,10 +610,40 @@ tab1, tab2, tab3, tab4 = st.tabs([
 
 # --- 2.1 Pestaña 1: Buscar Noticias ---
 with tab1:
+    cargar_pendientes("noticias")
     st.header(t["news_header"])
     keywords = st.text_input(t["news_keywords"], key="keywords_news")
     fecha_inicio = st.date_input(t["news_start_date"], key="fi_news")
     fecha_fin = st.date_input(t["news_end_date"], key="ff_news")
+    st.radio(
+        t["time_agg"],
+        list(t["time_agg_options"]),
+        format_func=lambda f: t["time_agg_options"][f],
+        index=2,
+        horizontal=True,
+        key="agg_news"
+    )
+    vigilancia = buscar_vigilancia(st.session_state["ubicacion"], keywords)
+    llave_noticias = llave_busqueda(st.session_state["ubicacion"], keywords)
+    vigilar = st.checkbox(
+        t["news_watch"],
+        value=vigilancia is not None,
+        key=f"chk_vigilar_{llave_noticias}"
+    )
+    if vigilar:
+        intervalo = st.number_input(
+            t["news_watch_interval"],
+            min_value=5,
+            max_value=24 * 60,
+            value=(vigilancia or {}).get("intervalo_min", 60),
+            step=5,
+            key=f"num_intervalo_{llave_noticias}"
+        )
+        if vigilancia is None or vigilancia.get("intervalo_min") != intervalo:
+            guardar_vigilancia(st.session_state["ubicacion"], keywords, int(intervalo))
+    elif vigilancia is not None:
+        quitar_vigilancia(st.session_state["ubicacion"], keywords)
+
     if st.button(t["btn_search_news"], key="btn_buscar_noticias"):
         with st.spinner(f"{t['news_header']}..."):
             news_output = fetch_and_process_news(
@@ -323,30 +652,37 @@ with tab1:
                 fecha_inicio,
                 fecha_fin
             )
-            st.session_state["news_output"] = news_output
-
-        st.subheader(t["insight_news"])
-        st.markdown(news_output["texto_summary"])
-
-        st.subheader(t["articles_found"])
-        df_n = news_output["df_articulos"]
-        if df_n.empty:
-            st.write(t["msg_no_news"])
+            st.session_state["news_output"] = compactar_salida(news_output)
+            if not news_output["df_articulos"].empty:
+                indice_contexto().reemplazar_fuente("noticias", news_output["df_articulos"]["resumen"])
+            guardar_en_workspace("noticias", {
+                "keywords": keywords,
+                "fecha_inicio": str(fecha_inicio),
+                "fecha_fin": str(fecha_fin)
+            })
+    elif vigilar:
+        # Ubicación vigilada: resultados ya calculados en segundo plano, sin esperar
+        news_output = salida_vigilancia(st.session_state["ubicacion"], keywords, fecha_inicio, fecha_fin)
+        if news_output is None:
+            st.info(t["news_watch_pending"])
         else:
-            st.dataframe(
-                df_n[["fecha", "fuente", "titulo", "resumen", "url"]],
-                use_container_width=True
-            )
+            st.caption(t["news_watch_updated"].format(news_output.get("actualizado") or "—"))
+            # Sólo se actualiza la sesión si cambió la revisión o el rango de fechas
+            version = (llave_noticias, news_output.get("actualizado"), str(fecha_inicio), str(fecha_fin))
+            if st.session_state.get("news_vigilancia_version") != version:
+                st.session_state["news_vigilancia_version"] = version
+                st.session_state["news_output"] = compactar_salida(news_output)
+                if not news_output["df_articulos"].empty:
+                    indice_contexto().reemplazar_fuente("noticias", news_output["df_articulos"]["resumen"])
 
-        st.subheader(t["trend_news"])
-        fig_n = news_output["fig_time_series"]
-        if fig_n and hasattr(fig_n, "to_plotly_json"):
-            st.plotly_chart(fig_n, use_container_width=True, key="plot_news_trend")
-        else:
-            st.write(t["msg_no_news"])
+    # Se muestra lo guardado en la sesión, así cambiar la agregación vuelve a dibujar
+    # el resultado en lugar de borrarlo
+    if st.session_state.get("news_output"):
+        mostrar_noticias(st.session_state["news_output"])
 
 # --- 2.2 Pestaña 2: Subir Información ---
 with tab2:
+    cargar_pendientes("propios")
     st.header(t["upload_header"])
     st.markdown(t["upload_description"].format(st.session_state["ubicacion"]))
     images = st.file_uploader(
@@ -367,6 +703,12 @@ with tab2:
         accept_multiple_files=True,
         key="up_textos"
     )
+    puntos = st.file_uploader(
+        t["upload_points"],
+        type=["csv", "geojson", "json"],
+        accept_multiple_files=True,
+        key="up_puntos"
+    )
     coords_input = st.text_input(
         t["upload_coords"],
         key="up_coords"
@@ -379,9 +721,15 @@ with tab2:
                 images,
                 audios,
                 textos,
-                coords_input
+                coords_input,
+                puntos
             )
-            st.session_state["multimodal_output"] = multimodal_output
+            st.session_state["multimodal_output"] = compactar_salida(multimodal_output)
+            if not multimodal_output["df_multimodal"].empty:
+                indice_contexto().reemplazar_fuente(
+                    "propios", multimodal_output["df_multimodal"]["descripcion"]
+                )
+            guardar_en_workspace("propios", {"coords": coords_input})
 
         st.subheader(t["multimodal_analysis"])
 
@@ -400,11 +748,30 @@ with tab2:
                 st.subheader(t["map_resources"])
                 st.map(df_mapa)
 
+            # ──── Observaciones subidas en masa (CSV/GeoJSON) ────
+            df_pts = multimodal_output.get("df_puntos")
+            if df_pts is not None and not df_pts.empty:
+                st.subheader(t["map_points"].format(len(df_pts)))
+                mapa_puntos(df_pts, key="deck_puntos")
+
+            # ──── Mapas de calor de agua/lodo de las imágenes grandes ────
+            if "mapa_calor" in df_m.columns:
+                df_calor = df_m.dropna(subset=["mapa_calor"])
+                df_calor = df_calor[df_calor["mapa_calor"].map(os.path.isfile)]
+                if not df_calor.empty:
+                    st.subheader(t["heatmap_uploads"])
+                    st.image(
+                        df_calor["mapa_calor"].tolist(),
+                        caption=df_calor["archivo"].tolist(),
+                        width=256
+                    )
+
         st.subheader(t["summary_uploads"])
         st.markdown(multimodal_output["texto_summary"])
 
 # --- 2.3 Pestaña 3: Datos Oficiales ---
 with tab3:
+    cargar_pendientes("oficiales", "comparacion")
     st.header(t["public_header"])
     st.markdown(t["public_description"].format(st.session_state["ubicacion"]))
     tipo_dato = st.selectbox(
@@ -419,6 +786,14 @@ with tab3:
         value=5,
         key="slider_periodo"
     )
+    st.radio(
+        t["time_agg"],
+        list(t["time_agg_options"]),
+        format_func=lambda f: t["time_agg_options"][f],
+        index=0,
+        horizontal=True,
+        key="agg_public"
+    )
 
     if st.button(t["btn_get_public"], key="btn_datos_oficiales"):
         with st.spinner(f"{t['public_header']}..."):
@@ -427,11 +802,18 @@ with tab3:
                 tipo_dato,
                 periodo
             )
-            st.session_state["public_output"] = public_output
+            st.session_state["public_output"] = compactar_salida(public_output)
+            indice_contexto().reemplazar_fuente(
+                "oficiales", hechos_oficiales(public_output["df"], tipo_dato)
+            )
+            guardar_en_workspace("oficiales", {"tipo_dato": tipo_dato, "periodo": periodo})
 
+    if st.session_state.get("public_output"):
+        public_output = st.session_state["public_output"]
         df_p = public_output["df"]
         fig_p = public_output["fig"]
         geo_info = public_output["geo_info"]
+        flood_geojson = geojson_de(fig_p)
 
         # Mostrar info de geocodificación
         if geo_info:
@@ -445,48 +827,92 @@ with tab3:
             if geo_info.get("display_name"):
                 st.markdown(t["geo_display_name"].format(geo_info["display_name"]))
 
-        if tipo_dato != t["public_types"][-1]:  # Si no es "Riesgos de Inundación"
+        if not flood_geojson:  # Si no es "Riesgos de Inundación"
             if df_p.empty:
-                st.write(t["msg_no_public"])
+                st.write(t["flood_no_geojson"] if tipo_dato == t["public_types"][-1] else t["msg_no_public"])
             else:
                 st.subheader(t["public_table"])
                 st.dataframe(df_p, use_container_width=True)
 
                 st.subheader(t["public_trend"])
+                fig_p = figura(public_output.get("grafico") or fig_p, st.session_state.get("agg_public"))
                 if fig_p and hasattr(fig_p, "to_plotly_json"):
                     st.plotly_chart(fig_p, use_container_width=True, key="plot_public_trend")
                 else:
                     st.write(t["public_no_graph"])
         else:
             # Caso "Riesgos de Inundación" → GeoJSON + PyDeck
-            if fig_p and isinstance(fig_p, dict) and fig_p.get("geojson"):
-                st.subheader(t["flood_header"])
-                layer = pdk.Layer(
-                    "GeoJsonLayer",
-                    data=fig_p["geojson"],
-                    pickable=True,
-                    stroked=False,
-                    filled=True,
-                    extruded=False,
-                    get_fill_color=[255, 0, 0, 100]
-                )
-                view_state = pdk.ViewState(
-                    latitude=fig_p["view_state"]["latitude"],
-                    longitude=fig_p["view_state"]["longitude"],
-                    zoom=fig_p["view_state"]["zoom"],
-                    pitch=0
-                )
-                deck = pdk.Deck(
-                    layers=[layer],
-                    initial_view_state=view_state,
-                    map_style="mapbox://styles/mapbox/light-v10"
-                )
-                st.pydeck_chart(deck, key="deck_flood")
-            else:
-                st.write(t["flood_no_geojson"])
+            st.subheader(t["flood_header"])
+            layer = pdk.Layer(
+                "GeoJsonLayer",
+                data=flood_geojson,
+                pickable=True,
+                stroked=False,
+                filled=True,
+                extruded=False,
+                get_fill_color=[255, 0, 0, 100]
+            )
+            view_state = pdk.ViewState(
+                latitude=fig_p["view_state"]["latitude"],
+                longitude=fig_p["view_state"]["longitude"],
+                zoom=fig_p["view_state"]["zoom"],
+                pitch=0
+            )
+            deck = pdk.Deck(
+                layers=[layer],
+                initial_view_state=view_state,
+                map_style="mapbox://styles/mapbox/light-v10"
+            )
+            st.pydeck_chart(deck, key="deck_flood")
+
+    # ──── Comparación de varios lugares ────
+    st.subheader(t["compare_header"])
+    lugares_txt = st.text_area(
+        t["compare_places"],
+        value=st.session_state["ubicacion"],
+        key="txt_lugares_comparar"
+    )
+    tipos_comparar = st.multiselect(
+        t["compare_types"],
+        t["public_types"][:-1],  # sin "Riesgos de Inundación"
+        default=t["public_types"][:1],
+        key="sel_tipos_comparar"
+    )
+    if st.button(t["btn_compare"], key="btn_comparar_lugares"):
+        with st.spinner(f"{t['compare_header']}..."):
+            batch_output = fetch_public_data_batch(
+                lugares_txt.splitlines(),
+                tipos_comparar,
+                periodo
+            )
+            st.session_state["public_batch_output"] = compactar_salida(batch_output)
+            indice_contexto().reemplazar_fuente(
+                "comparacion", hechos_oficiales(batch_output["df"], "")
+            )
+            guardar_en_workspace("comparacion", {
+                "lugares": lugares_txt.splitlines(),
+                "tipos_dato": tipos_comparar,
+                "periodo": periodo
+            })
+
+    if st.session_state.get("public_batch_output"):
+        batch_output = st.session_state["public_batch_output"]
+        df_b = batch_output["df"]
+        fig_b = figura(
+            batch_output.get("grafico") or batch_output["fig"],
+            st.session_state.get("agg_public")
+        )
+        if df_b.empty:
+            st.write(t["msg_no_compare"])
+        else:
+            st.dataframe(df_b, use_container_width=True)
+            if fig_b and hasattr(fig_b, "to_plotly_json"):
+                st.plotly_chart(fig_b, use_container_width=True, key="plot_public_batch")
 
 # --- 2.4 Pestaña 4: Contraste y Análisis ---
 with tab4:
+    # El contraste usa todas las fuentes; las que sigan pendientes se cargan aquí
+    cargar_pendientes("noticias", "propios", "oficiales", "comparacion", "contraste")
     st.header(t["contrast_header"])
     noticias_ok = (
         "news_output" in st.session_state
@@ -501,9 +927,7 @@ with tab4:
         and (
             ("df" in st.session_state["public_output"]
              and st.session_state["public_output"]["df"].shape[0] > 0)
-            or ("fig" in st.session_state["public_output"]
-                and isinstance(st.session_state["public_output"]["fig"], dict)
-                and st.session_state["public_output"]["fig"].get("geojson"))
+            or geojson_de(st.session_state["public_output"].get("fig"))
         )
     )
 
@@ -529,7 +953,7 @@ with tab4:
         if "df" in po and not po["df"].empty:
             cnt_p = po["df"].shape[0]
             st.write(t["public_num_available"].format(cnt_p))
-        elif "fig" in po and isinstance(po["fig"], dict) and po["fig"].get("geojson"):
+        elif geojson_de(po.get("fig")):
             st.write(t["public_geo_available"])
         else:
             st.write(t["public_no_data2"])
@@ -538,46 +962,66 @@ with tab4:
 
     # ──── Generar comentario de contraste con LLM ────
     if st.button(t["btn_contrast"], key="btn_contraste_llm"):
-        partes = []
-        if noticias_ok:
-            news_res = "\n".join(
-                st.session_state["news_output"]["df_articulos"]["resumen"].tolist()[:5]
-            )
-            partes.append(t["contrast_news"].format(news_res))
-        if multimodal_ok:
-            user_res = "\n".join(
-                st.session_state["multimodal_output"]["df_multimodal"]["descripcion"].tolist()[:5]
-            )
-            partes.append(t["contrast_multimodal"].format(user_res))
-        if public_ok:
-            po = st.session_state["public_output"]
-            if "df" in po and not po["df"].empty:
-                last_rows = "\n".join(
-                    f"{row['fecha'].year}: {row['valor']}"
-                    for _, row in po["df"].tail(5).iterrows()
-                )
-                partes.append(t["contrast_public_num"].format(last_rows))
-            elif "fig" in po and isinstance(po["fig"], dict) and po["fig"].get("geojson"):
-                partes.append(t["contrast_public_geo"])
-            else:
-                partes.append(t["public_no_data2"])
-
-        texto_contra = "\n\n---\n\n".join(partes)
-        from utils.llm import analyze_text_with_llm
-        resultado_contraste = analyze_text_with_llm(
-            t["contrast_prompt"].format(
-                st.session_state["ubicacion"],
-                texto_contra
-            )
+        # Evidencia más relevante de todas las fuentes, análisis cuantitativo y cruce espacial
+        consulta = " ".join([
+            st.session_state["ubicacion"],
+            st.session_state.get("keywords_news", ""),
+            str(st.session_state.get("sel_tipo_dato", ""))
+        ])
+        contraste = run_contrast(
+            st.session_state["ubicacion"],
+            news_output=st.session_state["news_output"] if noticias_ok else None,
+            multimodal_output=st.session_state["multimodal_output"] if multimodal_ok else None,
+            public_output=st.session_state["public_output"] if public_ok else None,
+            batch_output=st.session_state.get("public_batch_output"),
+            indice=indice_contexto(),
+            consulta=consulta,
+            textos=t,
+            presupuesto_tokens=PRESUPUESTO_CONTRASTE
         )
+        st.session_state["analytics_output"] = compactar_salida(contraste["analytics_output"])
+        if contraste["spatial_output"] is not None:
+            st.session_state["spatial_output"] = contraste["spatial_output"]
+        resultado_contraste = contraste["texto_contraste"]
+
         st.subheader(t["result_contrast"])
         st.markdown(resultado_contraste, unsafe_allow_html=True)
 
+        st.session_state["contraste_output"] = {
+            "texto": resultado_contraste,
+            "analytics_output": st.session_state["analytics_output"],
+            "spatial_output": st.session_state.get("spatial_output")
+        }
+        guardar_en_workspace(
+            "contraste",
+            dependencias=[
+                n for n in ("noticias", "propios", "oficiales", "comparacion")
+                if SECCIONES_WORKSPACE[n] in st.session_state
+            ]
+        )
+    elif "contraste_output" in st.session_state:
+        # Último contraste generado (o cargado del análisis guardado)
+        st.subheader(t["result_contrast"])
+        st.markdown(st.session_state["contraste_output"]["texto"], unsafe_allow_html=True)
+
     st.subheader(t["combined_viz"])
 
+    if "analytics_output" in st.session_state:
+        fig_a = figura(st.session_state["analytics_output"]["fig_principal"])
+        if fig_a and hasattr(fig_a, "to_plotly_json"):
+            st.markdown(t["analytics_viz"])
+            st.plotly_chart(fig_a, use_container_width=True, key="plot_analytics")
+
+    if "spatial_output" in st.session_state and not st.session_state["spatial_output"]["df_puntos"].empty:
+        st.markdown(t["spatial_viz"])
+        st.dataframe(st.session_state["spatial_output"]["df_puntos"], use_container_width=True)
+
     if noticias_ok:
         st.markdown(t["trend_news_viz"])
-        fig_n2 = st.session_state["news_output"]["fig_time_series"]
+        fig_n2 = figura(
+            st.session_state["news_output"]["fig_time_series"],
+            st.session_state.get("agg_news")
+        )
         if fig_n2 and hasattr(fig_n2, "to_plotly_json"):
             st.plotly_chart(fig_n2, use_container_width=True, key="plot_news_combined")
 
@@ -586,15 +1030,15 @@ with tab4:
         # Datos numéricos
         if "df" in po and not po["df"].empty:
             st.markdown(t["trend_public_viz"])
-            fig_p2 = po["fig"]
+            fig_p2 = figura(po["fig"], st.session_state.get("agg_public"))
             if fig_p2 and hasattr(fig_p2, "to_plotly_json"):
                 st.plotly_chart(fig_p2, use_container_width=True, key="plot_public_combined")
         # GeoJSON inundaciones
-        if "fig" in po and isinstance(po["fig"], dict) and po["fig"].get("geojson"):
+        if geojson_de(po.get("fig")):
             st.markdown(t["flood_map_viz"])
             layer2 = pdk.Layer(
                 "GeoJsonLayer",
-                data=po["fig"]["geojson"],
+                data=geojson_de(po["fig"]),
                 pickable=True,
                 stroked=False,
                 filled=True,
@@ -620,6 +1064,10 @@ with tab4:
         df_map = df_m.dropna(subset=["lat", "lon"])[["lat", "lon", "descripcion"]]
         if not df_map.empty:
             st.map(df_map)
+        df_pts = st.session_state["multimodal_output"].get("df_puntos")
+        if df_pts is not None and not df_pts.empty:
+            st.markdown(t["map_points"].format(len(df_pts)))
+            mapa_puntos(df_pts, key="deck_puntos_combined")
 
     st.write("---")
     st.info(t["end_info"])
@@ -0,0 +1,31 @@
+# tests/test_analytics_agent.py
+
+import numpy as np
+
+from agents.analytics_agent import MIN_BASE_ANOMALIAS, detectar_anomalias
+
+
+def test_ruido_gaussiano_casi_sin_anomalias():
+    rng = np.random.default_rng(0)
+    _, anomalias = detectar_anomalias(rng.normal(size=365))
+    assert anomalias.mean() < 0.02
+
+
+def test_series_cortas_sin_anomalias():
+    rng = np.random.default_rng(1)
+    for _ in range(200):
+        _, anomalias = detectar_anomalias(rng.normal(size=6))
+        assert not anomalias.any()
+    _, anomalias = detectar_anomalias(rng.normal(size=MIN_BASE_ANOMALIAS))
+    assert not anomalias.any()
+
+
+def test_pico_inyectado_se_detecta():
+    rng = np.random.default_rng(2)
+    x = rng.normal(size=60)
+    x[40] += 8
+    z, anomalias = detectar_anomalias(x)
+    assert anomalias[40]
+    assert z[40] > 0
+    # El pico no vuelve anómalos a los puntos que lo siguen
+    assert not anomalias[41:].any()
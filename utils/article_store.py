@@ -0,0 +1,122 @@
+# utils/article_store.py
+
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from utils.geo import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+# Artículos ya enriquecidos (resumen, entidades, coordenadas) por búsqueda.
+# Se puede cambiar con la variable de entorno ARTICULOS_DIR.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARTICULOS_DIR = os.getenv(
+    "ARTICULOS_DIR",
+    os.path.join(PROJECT_ROOT, "data", "articulos")
+)
+
+_LOCK = threading.Lock()
+
+
+def llave_busqueda(lugar: str, keywords: str) -> str:
+    """
+    Llave de una búsqueda de noticias: lugar y palabras clave normalizados.
+    """
+    return normalizar_texto(f"{lugar} {keywords or ''}") or "_"
+
+
+def _rutas(llave: str, base_dir: str = None):
+    base_dir = base_dir or ARTICULOS_DIR
+    return (
+        os.path.join(base_dir, f"{llave}.parquet"),
+        os.path.join(base_dir, f"{llave}.json")
+    )
+
+
+def leer_articulos(llave: str, base_dir: str = None) -> pd.DataFrame:
+    """
+    Artículos guardados para la búsqueda 'llave', del más reciente al más antiguo.
+    Retorna DataFrame vacío si no hay nada guardado.
+    """
+    ruta, _ = _rutas(llave, base_dir)
+    if not os.path.isfile(ruta):
+        return pd.DataFrame()
+    try:
+        return pd.read_parquet(ruta)
+    except Exception as e:
+        logger.warning("Error al leer artículos guardados de '%s': %s", llave, e)
+        return pd.DataFrame()
+
+
+def guardar_articulos(llave: str, df: pd.DataFrame, base_dir: str = None) -> pd.DataFrame:
+    """
+    Une 'df' con los artículos ya guardados de 'llave' (por 'url'; la versión
+    nueva reemplaza a la anterior) y reescribe el archivo de forma atómica.
+    Retorna el conjunto completo guardado.
+    """
+    ruta, _ = _rutas(llave, base_dir)
+    with _LOCK:
+        previos = leer_articulos(llave, base_dir)
+        todos = pd.concat([df, previos], ignore_index=True) if not previos.empty else df
+        todos = (
+            todos.drop_duplicates("url", keep="first")
+                 .sort_values("fecha", ascending=False)
+                 .reset_index(drop=True)
+        )
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            tmp = f"{ruta}.{os.getpid()}.tmp"
+            todos.to_parquet(tmp, index=False)
+            os.replace(tmp, ruta)
+        except Exception as e:
+            logger.error("Error al guardar artículos de '%s': %s", llave, e)
+    return todos
+
+
+def leer_resumen(llave: str, base_dir: str = None) -> dict:
+    """
+    Insight y metadatos guardados de la búsqueda ({} si no hay).
+    """
+    _, ruta = _rutas(llave, base_dir)
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _escribir_resumen(llave: str, contenido: dict, base_dir: str = None) -> None:
+    _, ruta = _rutas(llave, base_dir)
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        tmp = f"{ruta}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(contenido, f, ensure_ascii=False)
+        os.replace(tmp, ruta)
+    except OSError as e:
+        logger.error("Error al guardar el resumen de '%s': %s", llave, e)
+
+
+def guardar_resumen(llave: str, texto_summary: str, n_articulos: int, base_dir: str = None) -> None:
+    ahora = datetime.now().isoformat(timespec="seconds")
+    _escribir_resumen(llave, {
+        "texto_summary": texto_summary,
+        "n_articulos": int(n_articulos),
+        "actualizado": ahora,
+        "revisado": ahora
+    }, base_dir)
+
+
+def registrar_revision(llave: str, base_dir: str = None) -> None:
+    """
+    Anota la hora de una revisión que no cambió el insight (p. ej. sin artículos nuevos).
+    """
+    with _LOCK:
+        contenido = leer_resumen(llave, base_dir)
+        contenido["revisado"] = datetime.now().isoformat(timespec="seconds")
+        _escribir_resumen(llave, contenido, base_dir)
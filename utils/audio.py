@@ -0,0 +1,217 @@
+# utils/audio.py
+
+import io
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import wave
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Formato para voz: mono a 16 kHz (lo que usa Whisper internamente)
+FRECUENCIA = 16_000
+# Duración de cada trama del detector de voz (ms)
+MS_TRAMA = 30
+# Una trama tiene voz si su energía supera el piso de ruido en este margen (dB)
+MARGEN_DB = 10.0
+# Pausas más cortas que esto se conservan; las más largas se recortan (s)
+PAUSA_MAX_S = 0.6
+# Duración máxima de cada fragmento que se envía a transcribir (s)
+MAX_SEG_FRAGMENTO = 300
+# Un tramo con voz más largo que eso se corta en la trama más silenciosa de los
+# últimos VENTANA_CORTE_S segundos antes del límite, no a mitad de palabra
+VENTANA_CORTE_S = 20
+# Tramas que se leen de ffmpeg por bloque al decodificar (1000 × 30 ms = 30 s)
+TRAMAS_POR_BLOQUE = 1000
+# Formato comprimido de los fragmentos (se usa WAV si ffmpeg no puede codificarlo)
+FORMATO = os.getenv("AUDIO_FORMATO", "mp3")
+BITRATE = "32k"
+
+
+def ffmpeg_disponible() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def _muestras_por_trama() -> int:
+    return FRECUENCIA * MS_TRAMA // 1000
+
+
+def decodificar(audio_path: str, ruta_pcm: str) -> np.ndarray:
+    """
+    Decodifica cualquier formato que entienda ffmpeg a PCM int16 mono de 16 kHz
+    (mezcla de canales y remuestreo en el mismo paso) y lo escribe en 'ruta_pcm'.
+    La salida de ffmpeg se lee por bloques de TRAMAS_POR_BLOQUE tramas y la energía
+    de cada trama se calcula al vuelo, así que la grabación nunca está completa en memoria.
+    Retorna la energía (dB) de cada trama de MS_TRAMA ms.
+    """
+    trama = _muestras_por_trama()
+    bytes_trama = trama * 2
+    proc = subprocess.Popen(
+        [
+            "ffmpeg", "-nostdin", "-loglevel", "error", "-i", audio_path,
+            "-ac", "1", "-ar", str(FRECUENCIA), "-f", "s16le", "-"
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+    energias, resto = [], b""
+    with open(ruta_pcm, "wb") as f:
+        while True:
+            datos = proc.stdout.read(bytes_trama * TRAMAS_POR_BLOQUE)
+            if not datos:
+                break
+            f.write(datos)
+            datos = resto + datos
+            n = len(datos) // bytes_trama
+            x = np.frombuffer(datos[:n * bytes_trama], dtype=np.int16).astype(np.float32).reshape(n, trama)
+            energias.append(10 * np.log10(np.mean(x * x, axis=1) + 1e-9))
+            resto = datos[n * bytes_trama:]
+    error = proc.stderr.read()
+    if proc.wait() != 0:
+        raise subprocess.CalledProcessError(proc.returncode, "ffmpeg", stderr=error)
+    return np.concatenate(energias) if energias else np.zeros(0, dtype=np.float32)
+
+
+def tramas_con_voz(db: np.ndarray) -> np.ndarray:
+    """
+    Detector de actividad de voz por energía: una trama de MS_TRAMA ms tiene voz si
+    su energía 'db' supera en MARGEN_DB el piso de ruido (percentil 10 de la grabación).
+    Las pausas menores a PAUSA_MAX_S entre tramas con voz se conservan.
+    Retorna máscara booleana por trama.
+    """
+    if len(db) == 0:
+        return np.zeros(0, dtype=bool)
+    voz = db > np.percentile(db, 10) + MARGEN_DB
+
+    # Extender cada trama con voz media pausa hacia ambos lados
+    extension = max(1, int(PAUSA_MAX_S * 1000 / MS_TRAMA / 2))
+    return np.convolve(voz.astype(np.int32), np.ones(2 * extension + 1, dtype=np.int32), mode="same") > 0
+
+
+def segmentos_con_voz(mascara: np.ndarray) -> list:
+    """
+    Tramas consecutivas con voz como lista de (inicio, fin) en muestras.
+    """
+    trama = _muestras_por_trama()
+    bordes = np.diff(np.concatenate(([0], mascara.astype(np.int8), [0])))
+    inicios = np.flatnonzero(bordes == 1)
+    fines = np.flatnonzero(bordes == -1)
+    return [(int(i) * trama, int(f) * trama) for i, f in zip(inicios, fines)]
+
+
+def _partir(ini: int, fin: int, db: np.ndarray, max_muestras: int):
+    """
+    Corta el tramo [ini, fin) en piezas de hasta 'max_muestras', cada corte en la
+    trama de menor energía de los últimos VENTANA_CORTE_S segundos antes del límite.
+    """
+    trama = _muestras_por_trama()
+    ventana = max(1, int(VENTANA_CORTE_S * 1000 / MS_TRAMA))
+    while fin - ini > max_muestras:
+        ultima = (ini + max_muestras) // trama
+        primera = max(ini // trama + 1, ultima - ventana)
+        corte = (primera + int(np.argmin(db[primera:ultima]))) * trama if ultima > primera else ultima * trama
+        yield ini, corte
+        ini = corte
+    yield ini, fin
+
+
+def agrupar_fragmentos(muestras: np.ndarray, segmentos: list, db: np.ndarray,
+                       max_seg: float = MAX_SEG_FRAGMENTO) -> list:
+    """
+    Une los segmentos con voz en fragmentos de hasta 'max_seg' segundos, cortando
+    en los silencios; un segmento más largo que eso se corta en su momento más
+    silencioso cerca del límite (ver _partir), según la energía por trama 'db'.
+    Retorna lista de arreglos int16, en orden.
+    """
+    max_muestras = int(max_seg * FRECUENCIA)
+    fragmentos, actual, largo = [], [], 0
+    for ini, fin in segmentos:
+        for p_ini, p_fin in _partir(ini, fin, db, max_muestras):
+            pieza = np.asarray(muestras[p_ini:p_fin])
+            if largo + len(pieza) > max_muestras and actual:
+                fragmentos.append(np.concatenate(actual))
+                actual, largo = [], 0
+            actual.append(pieza)
+            largo += len(pieza)
+    if actual:
+        fragmentos.append(np.concatenate(actual))
+    return fragmentos
+
+
+def _wav(muestras: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(FRECUENCIA)
+        w.writeframes(muestras.tobytes())
+    return buffer.getvalue()
+
+
+def codificar(muestras: np.ndarray) -> tuple:
+    """
+    Comprime un fragmento PCM a FORMATO con ffmpeg. Retorna (extensión, bytes);
+    si el codificador no está disponible, usa WAV.
+    """
+    try:
+        proc = subprocess.run(
+            [
+                "ffmpeg", "-nostdin", "-loglevel", "error",
+                "-f", "s16le", "-ar", str(FRECUENCIA), "-ac", "1", "-i", "-",
+                "-b:a", BITRATE, "-f", FORMATO, "-"
+            ],
+            input=muestras.tobytes(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True
+        )
+        if proc.stdout:
+            return FORMATO, proc.stdout
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return "wav", _wav(muestras)
+
+
+def preparar_audio(audio_path: str) -> dict:
+    """
+    Prepara una grabación para transcribirla: mono 16 kHz, sin silencios largos y
+    dividida en fragmentos comprimidos de hasta MAX_SEG_FRAGMENTO segundos.
+    Retorna None si no hay ffmpeg o no se pudo decodificar; si no, diccionario con:
+      - partes: lista de (nombre de archivo, bytes), en orden.
+      - segundos_originales, segundos_voz, bytes_originales, bytes_enviados.
+    """
+    if not ffmpeg_disponible():
+        return None
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        ruta_pcm = os.path.join(carpeta, "audio.raw")
+        try:
+            db = decodificar(audio_path, ruta_pcm)
+        except (OSError, subprocess.CalledProcessError) as e:
+            logger.warning("No se pudo decodificar el audio '%s': %s", audio_path, e)
+            return None
+
+        # El PCM se lee desde disco (memmap) sólo en los tramos que se van a enviar
+        total = os.path.getsize(ruta_pcm) // 2
+        muestras = np.memmap(ruta_pcm, dtype=np.int16, mode="r") if total else np.zeros(0, dtype=np.int16)
+        segmentos = segmentos_con_voz(tramas_con_voz(db))
+        fragmentos = agrupar_fragmentos(muestras, segmentos, db)
+        del muestras
+
+    base = os.path.splitext(os.path.basename(audio_path))[0]
+    partes = []
+    for i, fragmento in enumerate(fragmentos, start=1):
+        extension, contenido = codificar(fragmento)
+        partes.append((f"{base}_{i:03d}.{extension}", contenido))
+
+    return {
+        "partes": partes,
+        "segundos_originales": total / FRECUENCIA,
+        "segundos_voz": sum(len(f) for f in fragmentos) / FRECUENCIA,
+        "bytes_originales": os.path.getsize(audio_path),
+        "bytes_enviados": sum(len(c) for _, c in partes)
+    }
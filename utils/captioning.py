@@ -0,0 +1,152 @@
+# utils/captioning.py
+
+import logging
+import os
+import threading
+
+from PIL import Image
+
+from utils.vision_utils import MAX_PIXELES
+
+logger = logging.getLogger(__name__)
+
+# Descripción local de imágenes con un modelo de transformers en CPU. Es opcional y
+# está desactivada por defecto ("off"). Para activarla:
+#   1) pip install torch (y optimum[onnxruntime] para "onnx"),
+#   2) descargar el modelo una vez, fuera de la interfaz:
+#        CAPTION_BACKEND=torch python -m utils.captioning
+#   3) arrancar la app con CAPTION_BACKEND=torch, "int8" (cuantización dinámica de
+#      las capas lineales) u "onnx" (onnxruntime vía optimum).
+# Con HF_HUB_OFFLINE=1 la app nunca sale a la red por el modelo.
+CAPTION_MODEL = os.getenv("CAPTION_MODEL", "Salesforce/blip-image-captioning-base")
+CAPTION_BACKEND = os.getenv("CAPTION_BACKEND", "off").lower()
+# Modelo exportado a ONNX, para no reexportarlo en cada arranque
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CAPTION_ONNX_DIR = os.getenv(
+    "CAPTION_ONNX_DIR",
+    os.path.join(PROJECT_ROOT, "data", "cache", "captioning", CAPTION_MODEL.replace("/", "__") + "-onnx")
+)
+TAMANO_LOTE = int(os.getenv("CAPTION_BATCH", "8"))
+# Lado máximo con el que se pasa cada imagen al modelo (el procesador la reduce igual)
+LADO_ENTRADA = 512
+MAX_TOKENS_DESCRIPCION = 40
+
+_MODELO = None
+_MODELO_LOCK = threading.Lock()
+
+
+def _cargar_modelo():
+    """
+    Carga procesador y modelo una sola vez por proceso.
+    Retorna (procesador, modelo) o False si el backend está desactivado o no disponible.
+    """
+    if CAPTION_BACKEND == "off":
+        return False
+    try:
+        from transformers import AutoProcessor
+        procesador = AutoProcessor.from_pretrained(CAPTION_MODEL)
+
+        if CAPTION_BACKEND == "onnx":
+            from optimum.onnxruntime import ORTModelForVision2Seq
+            if os.path.isdir(CAPTION_ONNX_DIR):
+                modelo = ORTModelForVision2Seq.from_pretrained(CAPTION_ONNX_DIR)
+            else:
+                modelo = ORTModelForVision2Seq.from_pretrained(CAPTION_MODEL, export=True)
+                modelo.save_pretrained(CAPTION_ONNX_DIR)
+        else:
+            import torch
+            from transformers import AutoModelForVision2Seq
+            modelo = AutoModelForVision2Seq.from_pretrained(CAPTION_MODEL)
+            modelo.eval()
+            if CAPTION_BACKEND == "int8":
+                modelo = torch.quantization.quantize_dynamic(modelo, {torch.nn.Linear}, dtype=torch.qint8)
+        return procesador, modelo
+    except Exception as e:
+        logger.warning("Descripción local de imágenes no disponible (%s): %s", CAPTION_BACKEND, e)
+        return False
+
+
+def obtener_modelo():
+    """
+    Modelo compartido por el proceso, o None si no está disponible.
+    """
+    global _MODELO
+    if _MODELO is None:
+        with _MODELO_LOCK:
+            if _MODELO is None:
+                _MODELO = _cargar_modelo()
+    return _MODELO or None
+
+
+def _abrir(imagen) -> Image.Image:
+    """
+    Imagen lista para el modelo a partir de una ruta o de una imagen PIL ya reducida
+    (p. ej. la miniatura de analyze_image_tiles). Los JPEG se decodifican ya
+    reducidos; otros formatos de más de MAX_PIXELES no se abren (ValueError).
+    """
+    if isinstance(imagen, Image.Image):
+        img = imagen.copy()
+    else:
+        img = Image.open(imagen)
+        if img.format == "JPEG":
+            img.draft("RGB", (LADO_ENTRADA, LADO_ENTRADA))
+        elif img.size[0] * img.size[1] > MAX_PIXELES:
+            raise ValueError("imagen demasiado grande para decodificarla completa")
+    img = img.convert("RGB")
+    img.thumbnail((LADO_ENTRADA, LADO_ENTRADA))
+    return img
+
+
+def describir_imagenes(paths, tamano_lote: int = None) -> list:
+    """
+    Descripción breve (en inglés, la del modelo) de cada imagen de 'paths' (rutas o
+    imágenes PIL ya reducidas), procesadas por lotes de 'tamano_lote'. Sólo un lote de imágenes está abierto
+    a la vez. Retorna lista del mismo largo con la descripción o None
+    (imagen ilegible o backend no disponible).
+    """
+    paths = list(paths)
+    descripciones = [None] * len(paths)
+    cargado = obtener_modelo() if paths else None
+    if not cargado:
+        return descripciones
+    procesador, modelo = cargado
+    tamano_lote = tamano_lote or TAMANO_LOTE
+
+    for ini in range(0, len(paths), tamano_lote):
+        indices, imagenes = [], []
+        for i in range(ini, min(ini + tamano_lote, len(paths))):
+            try:
+                imagenes.append(_abrir(paths[i]))
+                indices.append(i)
+            except Exception:
+                continue
+        if not imagenes:
+            continue
+        try:
+            entradas = procesador(images=imagenes, return_tensors="pt")
+            with _sin_gradientes():
+                salida = modelo.generate(**entradas, max_new_tokens=MAX_TOKENS_DESCRIPCION)
+            textos = procesador.batch_decode(salida, skip_special_tokens=True)
+        except Exception as e:
+            logger.warning("Error al describir imágenes: %s", e)
+            continue
+        for i, texto in zip(indices, textos):
+            descripciones[i] = texto.strip() or None
+    return descripciones
+
+
+def _sin_gradientes():
+    try:
+        import torch
+        return torch.inference_mode()
+    except ImportError:
+        from contextlib import nullcontext
+        return nullcontext()
+
+
+if __name__ == "__main__":
+    # Descarga (y, con CAPTION_BACKEND=onnx, exporta) el modelo antes de usar la app
+    if CAPTION_BACKEND == "off":
+        print("Define CAPTION_BACKEND (torch, int8 u onnx) para descargar el modelo.")
+    else:
+        print("Modelo listo." if obtener_modelo() else "No se pudo preparar el modelo.")
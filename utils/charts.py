@@ -0,0 +1,176 @@
+# utils/charts.py
+
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# A partir de cuántos puntos se usa WebGL en lugar de SVG
+UMBRAL_WEBGL = 1_000
+# Máximo de puntos por traza que se envían al navegador (LTTB por encima de esto)
+MAX_PUNTOS_TRAZA = 2_000
+
+
+def especificacion(tipo: str, datos, x: str, y: str, titulo: str, **opciones) -> dict:
+    """
+    Describe un gráfico a partir de su tabla agregada (pequeña) y sus opciones.
+    La especificación se puede guardar en la sesión en lugar de la figura completa
+    y volver a convertir en figura con construir_figura().
+    - tipo: "line", "bar" o "anomalias".
+    - opciones: color, facet_row, markers, height, layout (dict para update_layout),
+      frecuencia (agregación temporal por defecto) y agregacion ("sum" o "mean").
+    """
+    return {"tipo": tipo, "datos": datos, "x": x, "y": y, "titulo": titulo, **opciones}
+
+
+def es_especificacion(obj) -> bool:
+    return isinstance(obj, dict) and "tipo" in obj and "datos" in obj
+
+
+def lttb(x, y, n_salida: int):
+    """
+    Largest-Triangle-Three-Buckets: elige 'n_salida' puntos que conservan la forma
+    visual de la serie (picos y valles incluidos). 'x' debe ser numérico y creciente.
+    Retorna los índices elegidos, en orden.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_salida >= n or n_salida < 3:
+        return np.arange(n)
+
+    # n_salida - 2 cubetas entre el primer y el último punto (que siempre se conservan)
+    bordes = np.linspace(1, n - 1, n_salida - 1).astype(int)
+    elegidos = np.empty(n_salida, dtype=int)
+    elegidos[0], elegidos[-1] = 0, n - 1
+    a = 0
+    for i in range(n_salida - 2):
+        ini, fin = bordes[i], bordes[i + 1]
+        sig_fin = bordes[i + 2] if i + 2 < len(bordes) else n
+        mx = x[fin:sig_fin].mean()
+        my = y[fin:sig_fin].mean()
+        areas = np.abs(
+            (x[a] - mx) * (y[ini:fin] - y[a]) - (x[a] - x[ini:fin]) * (my - y[a])
+        )
+        a = ini + int(np.argmax(areas))
+        elegidos[i + 1] = a
+    return elegidos
+
+
+def agregar_temporal(datos: pd.DataFrame, x: str, y: str, frecuencia: str,
+                     agregacion: str = "sum", grupos=()) -> pd.DataFrame:
+    """
+    Agrega 'y' por periodos de 'frecuencia' ("h", "D" o "W") sobre la columna de fechas 'x',
+    respetando las columnas de 'grupos'. Sólo aparecen los periodos con datos.
+    """
+    fechas = pd.to_datetime(datos[x])
+    if frecuencia == "W":
+        periodo = fechas.dt.to_period("W").dt.start_time
+    else:
+        periodo = fechas.dt.floor(frecuencia)
+    llaves = [datos[g] for g in grupos] + [periodo.rename(x)]
+    return (
+        datos[y].groupby(llaves, observed=True, sort=True)
+                .agg(agregacion)
+                .reset_index()
+    )
+
+
+def _reducir(datos: pd.DataFrame, x: str, y: str, grupos) -> pd.DataFrame:
+    """
+    Aplica LTTB a cada traza (combinación de 'grupos') que exceda MAX_PUNTOS_TRAZA.
+    """
+    def _una(traza):
+        traza = traza.dropna(subset=[y]).sort_values(x)
+        if len(traza) <= MAX_PUNTOS_TRAZA:
+            return traza
+        xs = traza[x]
+        xs = xs.astype("int64") if np.issubdtype(xs.dtype, np.datetime64) else pd.to_numeric(xs, errors="coerce")
+        return traza.iloc[lttb(xs.to_numpy(), traza[y].to_numpy(), MAX_PUNTOS_TRAZA)]
+
+    if not grupos:
+        return _una(datos)
+    return pd.concat(
+        [_una(traza) for _, traza in datos.groupby(list(grupos), observed=True, sort=False)],
+        ignore_index=True
+    )
+
+
+def construir_figura(spec: dict, frecuencia: str = None):
+    """
+    Construye la figura de Plotly descrita por 'spec'. Retorna {} si no hay datos.
+    - 'frecuencia' ("h", "D", "W") agrega la serie por periodos; "" muestra los datos
+      sin agregar y None usa la de la especificación (o ninguna).
+    - Con más de UMBRAL_WEBGL puntos, las líneas se dibujan con WebGL y cada traza
+      se reduce con LTTB a MAX_PUNTOS_TRAZA puntos antes de enviarse al navegador.
+    """
+    datos = spec.get("datos")
+    if datos is None or len(datos) == 0:
+        return {}
+
+    if spec["tipo"] == "anomalias":
+        return _figura_anomalias(spec)
+
+    grupos = [g for g in (spec.get("color"), spec.get("facet_row")) if g]
+    if frecuencia is None:
+        frecuencia = spec.get("frecuencia")
+    if frecuencia:
+        datos = agregar_temporal(
+            datos, spec["x"], spec["y"], frecuencia, spec.get("agregacion", "sum"), grupos
+        )
+    grande = len(datos) > UMBRAL_WEBGL
+    if grande:
+        datos = _reducir(datos, spec["x"], spec["y"], grupos)
+
+    graficar = px.bar if spec["tipo"] == "bar" else px.line
+    argumentos = {
+        "x": spec["x"],
+        "y": spec["y"],
+        "title": spec["titulo"],
+        "color": spec.get("color"),
+    }
+    if spec.get("facet_row"):
+        argumentos["facet_row"] = spec["facet_row"]
+    if spec.get("height"):
+        argumentos["height"] = spec["height"]
+    if spec["tipo"] == "line" and spec.get("markers") and not grande:
+        argumentos["markers"] = True
+    if spec["tipo"] == "line" and grande:
+        argumentos["render_mode"] = "webgl"
+
+    fig = graficar(datos, **argumentos)
+    if spec.get("facet_row"):
+        # Cada faceta con su propia escala y sin el prefijo "columna=" en el título
+        fig.update_yaxes(matches=None, title_text="")
+        fig.for_each_annotation(lambda a: a.update(text=a.text.split("=")[-1]))
+    fig.update_layout(template="plotly_white", **spec.get("layout", {}))
+    return fig
+
+
+def _figura_anomalias(spec: dict):
+    """
+    Series con su media móvil punteada y las anomalías marcadas (salida de run_analytics).
+    Las anomalías se toman de los datos completos, aunque las líneas se reduzcan con LTTB.
+    """
+    datos = spec["datos"]
+    anomalias = datos[datos["anomalia"]]
+    grande = len(datos) > UMBRAL_WEBGL
+    lineas = _reducir(datos, spec["x"], spec["y"], ["serie"]) if grande else datos
+    Traza = go.Scattergl if grande else go.Scatter
+
+    fig = px.line(
+        lineas, x=spec["x"], y=spec["y"], color="serie", title=spec["titulo"],
+        render_mode="webgl" if grande else "auto"
+    )
+    for serie, grupo in lineas.groupby("serie", sort=False, observed=True):
+        fig.add_trace(Traza(
+            x=grupo[spec["x"]], y=grupo["media_movil"], mode="lines",
+            line=dict(dash="dot"), name=f"{serie} (media móvil)"
+        ))
+    if not anomalias.empty:
+        fig.add_trace(Traza(
+            x=anomalias[spec["x"]], y=anomalias[spec["y"]], mode="markers",
+            marker=dict(size=10, symbol="x", color="red"), name="Anomalía"
+        ))
+    fig.update_layout(template="plotly_white", **spec.get("layout", {}))
+    return fig
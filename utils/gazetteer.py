@@ -0,0 +1,247 @@
+# utils/gazetteer.py
+
+import bisect
+import csv
+import difflib
+import os
+import pickle
+import threading
+
+from utils.geo import normalizar_texto
+
+# Volcado de nombres de lugares. Por defecto el archivo de GeoNames para México
+# (https://download.geonames.org/export/dump/MX.zip); también acepta un CSV con
+# columnas nombre, lat, lon y opcionalmente estado y poblacion (p. ej. localidades INEGI).
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH",
+    os.path.join(PROJECT_ROOT, "data", "gazetteer", "MX.txt")
+)
+# Carpeta del índice ya construido (pickle), separada del volcado
+GAZETTEER_CACHE_DIR = os.getenv(
+    "GAZETTEER_CACHE_DIR",
+    os.path.join(PROJECT_ROOT, "data", "cache", "gazetteer")
+)
+
+# Sólo lugares poblados (P) y divisiones administrativas (A) de GeoNames
+_CLASES_GEONAMES = {"P", "A"}
+
+_INSTANCIA = None
+_INSTANCIA_LOCK = threading.Lock()
+
+
+class Gazetteer:
+    """
+    Índice local de nombres de lugares.
+    - 'llaves' es una lista ordenada de nombres normalizados (sin acentos ni
+      mayúsculas) para búsquedas por prefijo con bisect.
+    - 'por_llave' resuelve un nombre exacto al lugar más poblado con ese nombre.
+    """
+
+    def __init__(self, lugares):
+        # lugares: lista de tuplas (nombre, estado, lat, lon, poblacion, [nombres alternos])
+        self.lugares = lugares
+        por_llave = {}
+        for i, (nombre, estado, _, _, poblacion, alternos) in enumerate(lugares):
+            llaves = {normalizar_texto(nombre)} | {normalizar_texto(a) for a in alternos}
+            if estado:
+                llaves.add(normalizar_texto(f"{nombre} {estado}"))
+            for llave in llaves:
+                if not llave:
+                    continue
+                actual = por_llave.get(llave)
+                if actual is None or lugares[actual][4] < poblacion:
+                    por_llave[llave] = i
+        self.por_llave = por_llave
+        self.llaves = sorted(por_llave)
+
+        # Cubetas por las dos primeras letras para acotar la búsqueda difusa
+        self.cubetas = {}
+        for llave in self.llaves:
+            self.cubetas.setdefault(llave[:2], []).append(llave)
+
+    def _resultado(self, i: int) -> dict:
+        nombre, estado, lat, lon, _, _ = self.lugares[i]
+        partes = [nombre] + ([estado] if estado else []) + ["México"]
+        return {"lat": lat, "lon": lon, "display_name": ", ".join(partes)}
+
+    def _en_estado(self, i: int, estado: str) -> bool:
+        """
+        True si el lugar 'i' está en el estado normalizado 'estado' (acepta abreviaturas
+        por prefijo, p. ej. "coahuila" para "Coahuila de Zaragoza").
+        """
+        propio = normalizar_texto(self.lugares[i][1])
+        return bool(propio) and (propio.startswith(estado) or estado.startswith(propio))
+
+    def resolver(self, lugar: str, difuso: bool = True) -> dict:
+        """
+        Resuelve 'lugar' a {'lat', 'lon', 'display_name'} sin salir a la red.
+        Prueba, en orden: el texto completo, "nombre estado" y sólo el nombre (el
+        primer componente antes de la coma); si nada coincide y 'difuso' es True,
+        usa el nombre más parecido. Si se indica un estado ("San Pedro, Coahuila"),
+        sólo se aceptan lugares de ese estado; "México" como segundo componente puede
+        ser el país, así que si nada coincide en el Estado de México se ignora.
+        Retorna {} si no hay coincidencia.
+        """
+        partes = [p.strip() for p in str(lugar).split(",") if p.strip()]
+        if not partes:
+            return {}
+
+        nombre = normalizar_texto(partes[0])
+        estado = normalizar_texto(partes[1]) if len(partes) > 1 else ""
+        resultado = self._buscar(normalizar_texto(lugar), nombre, estado, difuso)
+        if not resultado and estado == "mexico":
+            resultado = self._buscar(nombre, nombre, "", difuso)
+        return resultado
+
+    def _buscar(self, completo: str, nombre: str, estado: str, difuso: bool) -> dict:
+        for llave in dict.fromkeys([completo, normalizar_texto(f"{nombre} {estado}") if estado else None]):
+            i = self.por_llave.get(llave) if llave else None
+            if i is not None:
+                return self._resultado(i)
+
+        # "nombre estado" como prefijo: "san pedro coahuila" -> "San Pedro, Coahuila de Zaragoza"
+        if estado:
+            prefijo = normalizar_texto(f"{nombre} {estado}")
+            ini = bisect.bisect_left(self.llaves, prefijo)
+            fin = bisect.bisect_left(self.llaves, prefijo + "\uffff")
+            indices = [self.por_llave[k] for k in self.llaves[ini:fin]]
+            indices = [i for i in indices if self._en_estado(i, estado)]
+            if indices:
+                return self._resultado(max(indices, key=lambda i: self.lugares[i][4]))
+
+        # Sólo el nombre: el más poblado con ese nombre, si está en el estado pedido
+        i = self.por_llave.get(nombre)
+        if i is not None and (not estado or self._en_estado(i, estado)):
+            return self._resultado(i)
+
+        if difuso:
+            parecidas = difflib.get_close_matches(
+                nombre, self.cubetas.get(nombre[:2], []), n=10, cutoff=0.85
+            )
+            for llave in parecidas:
+                i = self.por_llave[llave]
+                if not estado or self._en_estado(i, estado):
+                    return self._resultado(i)
+        return {}
+
+    def sugerir(self, prefijo: str, limite: int = 8) -> list:
+        """
+        Autocompletado: nombres cuyo texto normalizado empieza con 'prefijo',
+        ordenados por población. Retorna lista de 'display_name' sin repetir.
+        """
+        llave = normalizar_texto(prefijo)
+        if not llave:
+            return []
+        ini = bisect.bisect_left(self.llaves, llave)
+        fin = bisect.bisect_left(self.llaves, llave + "\uffff")
+        indices = {self.por_llave[k] for k in self.llaves[ini:fin]}
+        orden = sorted(indices, key=lambda i: self.lugares[i][4], reverse=True)
+        return [self._resultado(i)["display_name"] for i in orden[:limite]]
+
+
+def _leer_geonames(path: str):
+    """
+    Lee un volcado de GeoNames (TSV sin encabezado, 19 columnas).
+    Si existe 'admin1CodesASCII.txt' en la misma carpeta, traduce el código de estado a su nombre.
+    """
+    estados = {}
+    ruta_admin1 = os.path.join(os.path.dirname(path), "admin1CodesASCII.txt")
+    if os.path.isfile(ruta_admin1):
+        with open(ruta_admin1, encoding="utf-8") as f:
+            for linea in f:
+                cols = linea.rstrip("\n").split("\t")
+                if len(cols) >= 2:
+                    estados[cols[0]] = cols[1]
+
+    lugares = []
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            cols = linea.rstrip("\n").split("\t")
+            if len(cols) < 15 or cols[6] not in _CLASES_GEONAMES:
+                continue
+            try:
+                lat, lon = float(cols[4]), float(cols[5])
+                poblacion = int(cols[14] or 0)
+            except ValueError:
+                continue
+            estado = estados.get(f"{cols[8]}.{cols[10]}", "")
+            alternos = [cols[2]] + [a for a in cols[3].split(",") if a][:10]
+            lugares.append((cols[1], estado, lat, lon, poblacion, alternos))
+    return lugares
+
+
+def _leer_csv(path: str):
+    """
+    Lee un CSV con encabezado: nombre, lat, lon y opcionalmente estado y poblacion.
+    """
+    lugares = []
+    with open(path, encoding="utf-8", newline="") as f:
+        for fila in csv.DictReader(f):
+            try:
+                lat, lon = float(fila["lat"]), float(fila["lon"])
+                poblacion = int(float(fila.get("poblacion") or 0))
+            except (KeyError, ValueError):
+                continue
+            lugares.append((fila.get("nombre", ""), fila.get("estado", ""), lat, lon, poblacion, []))
+    return lugares
+
+
+def cargar_gazetteer(path: str = None):
+    """
+    Construye el índice desde el volcado en 'path'. El índice se guarda como
+    '.pkl' en GAZETTEER_CACHE_DIR y se reutiliza mientras el volcado no cambie.
+    Retorna un Gazetteer, o None si el volcado no existe.
+    """
+    path = path or GAZETTEER_PATH
+    if not os.path.isfile(path):
+        return None
+
+    ruta_pkl = os.path.join(GAZETTEER_CACHE_DIR, os.path.basename(path) + ".pkl")
+    mtime = os.path.getmtime(path)
+    if os.path.isfile(ruta_pkl):
+        try:
+            with open(ruta_pkl, "rb") as f:
+                guardado = pickle.load(f)
+            if guardado.get("mtime") == mtime:
+                return guardado["gazetteer"]
+        except Exception:
+            pass
+
+    lugares = _leer_csv(path) if path.lower().endswith(".csv") else _leer_geonames(path)
+    gazetteer = Gazetteer(lugares)
+    try:
+        os.makedirs(GAZETTEER_CACHE_DIR, exist_ok=True)
+        with open(ruta_pkl, "wb") as f:
+            pickle.dump({"mtime": mtime, "gazetteer": gazetteer}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+    return gazetteer
+
+
+def obtener_gazetteer():
+    """
+    Gazetteer compartido por el proceso (se carga una sola vez). None si no hay volcado.
+    """
+    global _INSTANCIA
+    if _INSTANCIA is None:
+        with _INSTANCIA_LOCK:
+            if _INSTANCIA is None:
+                _INSTANCIA = cargar_gazetteer() or False
+    return _INSTANCIA or None
+
+
+def resolver_lugar(lugar: str) -> dict:
+    """
+    Resuelve 'lugar' con el gazetteer local. Retorna {} si no hay gazetteer o no hay coincidencia.
+    """
+    gazetteer = obtener_gazetteer()
+    return gazetteer.resolver(lugar) if gazetteer else {}
+
+
+def sugerir_lugares(prefijo: str, limite: int = 8) -> list:
+    """
+    Sugerencias de autocompletado para 'prefijo'. Lista vacía si no hay gazetteer.
+    """
+    gazetteer = obtener_gazetteer()
+    return gazetteer.sugerir(prefijo, limite) if gazetteer else []
@@ -1,29 +1,107 @@
 # utils/geo.py
 
+import re
+import threading
+import unicodedata
+
 import requests
 
+from utils import transport
+
+# Caché de geocodificación por proceso: llave normalizada -> resultado
+# ({} para lugares que Nominatim no encontró, así no se vuelven a consultar)
+_CACHE_GEOCODING = {}
+_CACHE_LOCK = threading.Lock()
+
+
+def normalizar_texto(texto: str) -> str:
+    """
+    Normaliza un nombre de lugar para usarlo como llave: minúsculas, sin acentos
+    y con cualquier carácter no alfanumérico reemplazado por "_".
+    Ejemplo: "San Andrés Cholula" -> "san_andres_cholula".
+    """
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"[^a-z0-9]+", "_", texto.lower()).strip("_")
+
+
 def geocode_location(lugar: str) -> dict:
     """
-    Usa Nominatim (OpenStreetMap) para geocodificar un texto de ubicación.
+    Geocodifica un texto de ubicación. Primero se busca en el gazetteer local
+    (utils/gazetteer.py, sin red); sólo si no hay coincidencia se consulta
+    Nominatim (OpenStreetMap).
+    Las respuestas de Nominatim, también las sin resultado, se guardan en una caché
+    por proceso, de modo que un mismo lugar sólo se consulta una vez; los errores
+    de red no se guardan y se reintentan en la siguiente llamada.
     Retorna diccionario con llaves:
       - lat  (float)
       - lon  (float)
       - display_name (str)
     Si no se encuentra nada o hay error, retorna {}.
     """
+    # Import local: utils.gazetteer depende de este módulo
+    from utils.gazetteer import resolver_lugar
+
+    resultado = resolver_lugar(lugar)
+    if resultado:
+        return resultado
+
+    llave = normalizar_texto(lugar)
+    with _CACHE_LOCK:
+        if llave in _CACHE_GEOCODING:
+            return dict(_CACHE_GEOCODING[llave])
+
+    resultado = _geocode_nominatim(lugar)
+    if resultado is None:
+        return {}
+    with _CACHE_LOCK:
+        _CACHE_GEOCODING[llave] = resultado
+    return dict(resultado)
+
+
+def geocode_many(lugares) -> dict:
+    """
+    Geocodifica una lista de lugares. Los lugares se deduplican por su forma
+    normalizada antes de consultar, así que cada lugar distinto se geocodifica
+    una sola vez. Se resuelven uno tras otro: la mayoría sale del gazetteer o de
+    la caché, y Nominatim permite a lo más una petición por segundo, así que
+    consultarlo en paralelo no acelera nada y violaría su política de uso.
+    Retorna diccionario {lugar: resultado de geocode_location}.
+    """
+    unicos = {}
+    for lugar in lugares:
+        if lugar and str(lugar).strip():
+            unicos.setdefault(normalizar_texto(lugar), str(lugar).strip())
+
+    if not unicos:
+        return {}
+
+    resultados = {llave: geocode_location(lugar) for llave, lugar in unicos.items()}
+
+    return {
+        lugar: resultados.get(normalizar_texto(lugar), {})
+        for lugar in lugares
+        if lugar and str(lugar).strip()
+    }
+
+
+def _geocode_nominatim(lugar: str) -> dict:
+    """
+    Consulta directa a Nominatim, sin caché.
+    Retorna {} si el lugar no se encontró, o None si la consulta falló.
+    """
     url = "https://nominatim.openstreetmap.org/search"
     params = {
         "q": lugar,
         "format": "json",
         "limit": 1
     }
-    headers = {
-        "User-Agent": "geoagentx/1.0 (tu_email@ejemplo.com)"
-    }
 
     try:
-        resp = requests.get(url, params=params, headers=headers, timeout=10)
-        if resp.status_code != 200 or resp.text.strip() == "":
+        resp = transport.get(url, params=params, timeout=(5, 10), max_bytes=1024 ** 2)
+        if resp.status_code != 200:
+            return None
+        if resp.text.strip() == "":
             return {}
         data = resp.json()
         if not data:
@@ -34,5 +112,7 @@ def geocode_location(lugar: str) -> dict:
         lon = float(item.get("lon", 0))
         display_name = item.get("display_name", "")
         return {"lat": lat, "lon": lon, "display_name": display_name}
-    except (requests.RequestException, ValueError):
+    except requests.RequestException:
+        return None
+    except ValueError:
         return {}
@@ -0,0 +1,231 @@
+# utils/indicator_store.py
+
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+
+from utils.geo import normalizar_texto
+
+# Carpeta raíz del almacén. Se puede cambiar con la variable de entorno INDICADORES_DIR.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+INDICADORES_DIR = os.getenv(
+    "INDICADORES_DIR",
+    os.path.join(PROJECT_ROOT, "data", "indicadores")
+)
+
+# Sistema de archivos local con lectura memory-mapped (sin copiar a memoria)
+_FS = pafs.LocalFileSystem(use_mmap=True)
+
+COLUMNAS_SERIE = ["fecha", "valor"]
+
+
+def _llave_municipio(municipio: str, estado: str = None) -> str:
+    """
+    Llave de partición de un municipio: nombre y estado normalizados
+    ("Benito Juárez", "Quintana Roo" -> "benito_juarez__quintana_roo"), así los
+    municipios homónimos de distintos estados no comparten partición.
+    Sin estado, sólo el nombre.
+    """
+    municipio = normalizar_texto(municipio)
+    estado = normalizar_texto(estado) if isinstance(estado, str) else ""
+    return f"{municipio}__{estado}" if municipio and estado else municipio
+
+
+def _municipio_desde_lugar(lugar: str) -> str:
+    """
+    Llave de partición a partir de 'lugar' ("Guadalajara, Jalisco" -> "guadalajara__jalisco"):
+    primer componente como municipio y segundo, si lo hay, como estado.
+    """
+    partes = [p.strip() for p in str(lugar).split(",") if p.strip()]
+    if not partes:
+        return ""
+    return _llave_municipio(partes[0], partes[1] if len(partes) > 1 else None)
+
+
+def ruta_particion(indicador: str, lugar: str, base_dir: str = None) -> str:
+    """
+    Ruta de la partición hive 'indicador=<x>/municipio=<y>' para un lugar.
+    Si 'lugar' no trae estado y sólo hay un municipio con ese nombre, se usa el suyo;
+    si trae estado pero el indicador se ingresó sin estados, se usa la partición sin estado.
+    """
+    base_dir = base_dir or INDICADORES_DIR
+    carpeta = os.path.join(base_dir, f"indicador={normalizar_texto(indicador)}")
+    llave = _municipio_desde_lugar(lugar)
+    ruta = os.path.join(carpeta, f"municipio={llave}")
+    if os.path.isdir(ruta) or not os.path.isdir(carpeta):
+        return ruta
+
+    nombre = llave.split("__")[0]
+    if "__" in llave:
+        sin_estado = os.path.join(carpeta, f"municipio={nombre}")
+        return sin_estado if os.path.isdir(sin_estado) else ruta
+    homonimos = [d for d in os.listdir(carpeta) if d.startswith(f"municipio={nombre}__")]
+    # Con varios homónimos no se adivina: hace falta el estado
+    return os.path.join(carpeta, homonimos[0]) if len(homonimos) == 1 else ruta
+
+
+def ingest_csv(csv_path: str, indicador: str,
+               col_municipio: str = "municipio",
+               col_fecha: str = "fecha",
+               col_valor: str = "valor",
+               col_estado: str = None,
+               base_dir: str = None) -> int:
+    """
+    Ingresa un CSV local (exportación de INEGI, SMN, SSN, etc.) al almacén Parquet.
+    El CSV debe tener, al menos, una columna de municipio, una de fecha (año o fecha
+    completa) y una de valor; 'col_estado' (p. ej. NOM_ENT en INEGI) separa los
+    municipios homónimos y conviene darla siempre con volcados nacionales.
+    Los datos se escriben particionados por indicador y municipio (más estado);
+    si la partición ya existía, se reemplaza.
+    Retorna el número de filas ingresadas.
+    """
+    base_dir = base_dir or INDICADORES_DIR
+
+    columnas = [col_municipio, col_fecha, col_valor] + ([col_estado] if col_estado else [])
+    tabla = pacsv.read_csv(
+        csv_path,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=columnas,
+            column_types={
+                col_municipio: pa.string(),
+                col_fecha: pa.string(),
+                col_valor: pa.float64(),
+                **({col_estado: pa.string()} if col_estado else {})
+            }
+        )
+    )
+    df = tabla.to_pandas()
+
+    # Normalizar municipios una sola vez por combinación única de municipio y estado
+    combinados = df[col_municipio]
+    if col_estado:
+        combinados = combinados + "|" + df[col_estado].fillna("")
+    llaves = {c: _llave_municipio(*c.split("|", 1)) for c in combinados.dropna().unique()}
+
+    # Fechas: primero como año (AAAA), si no, como fecha completa
+    fechas_txt = df[col_fecha].astype(str).str.strip()
+    fechas = pd.to_datetime(fechas_txt, format="%Y", errors="coerce")
+    sin_anio = fechas.isna()
+    if sin_anio.any():
+        fechas.loc[sin_anio] = pd.to_datetime(fechas_txt[sin_anio], errors="coerce")
+
+    salida = pd.DataFrame({
+        "indicador": normalizar_texto(indicador),
+        "municipio": combinados.map(llaves),
+        "nombre": df[col_municipio],
+        "fecha": fechas.astype("datetime64[ms]"),
+        "valor": df[col_valor]
+    }).dropna(subset=["municipio", "fecha", "valor"])
+    salida = salida[salida["municipio"] != ""]
+    salida["anio"] = salida["fecha"].dt.year.astype("int16")
+    salida = salida.sort_values(["municipio", "fecha"]).reset_index(drop=True)
+
+    if salida.empty:
+        return 0
+
+    ds.write_dataset(
+        pa.Table.from_pandas(salida, preserve_index=False),
+        base_dir,
+        format="parquet",
+        partitioning=["indicador", "municipio"],
+        partitioning_flavor="hive",
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet"
+    )
+    return len(salida)
+
+
+def read_series(indicador: str, lugar: str,
+                anio_inicio: int = None, anio_fin: int = None,
+                base_dir: str = None) -> pd.DataFrame:
+    """
+    Lee la serie de un indicador para 'lugar' desde el almacén Parquet.
+    Sólo se abre la partición del municipio y el rango de años se aplica como
+    filtro sobre las estadísticas de cada row group (predicate pushdown).
+    Retorna DataFrame con columnas ['fecha', 'valor'] ordenado por fecha,
+    o un DataFrame vacío si no hay datos.
+    """
+    ruta = ruta_particion(indicador, lugar, base_dir)
+    if not os.path.isdir(ruta):
+        return pd.DataFrame(columns=COLUMNAS_SERIE)
+
+    filtro = None
+    if anio_inicio is not None:
+        filtro = ds.field("anio") >= anio_inicio
+    if anio_fin is not None:
+        cond = ds.field("anio") <= anio_fin
+        filtro = cond if filtro is None else filtro & cond
+
+    try:
+        dataset = ds.dataset(ruta, format="parquet", filesystem=_FS)
+        tabla = dataset.to_table(columns=COLUMNAS_SERIE, filter=filtro)
+    except (OSError, pa.ArrowInvalid):
+        return pd.DataFrame(columns=COLUMNAS_SERIE)
+
+    return tabla.to_pandas().sort_values("fecha").reset_index(drop=True)
+
+
+def read_series_many(pares, anio_inicio: int = None, anio_fin: int = None,
+                     base_dir: str = None, max_workers: int = 8) -> pd.DataFrame:
+    """
+    Lee varias series a la vez. 'pares' es una lista de tuplas (indicador, lugar).
+    Cada partición se lee en paralelo (Arrow libera el GIL durante la lectura) y
+    el resultado se concatena en un único DataFrame largo con columnas
+    ['indicador', 'lugar', 'fecha', 'valor'].
+    """
+    pares = list(dict.fromkeys(pares))
+    columnas = ["indicador", "lugar"] + COLUMNAS_SERIE
+    if not pares:
+        return pd.DataFrame(columns=columnas)
+
+    def _leer(par):
+        return read_series(par[0], par[1], anio_inicio, anio_fin, base_dir)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(pares)))) as pool:
+        series = list(pool.map(_leer, pares))
+
+    no_vacias = [(par, df) for par, df in zip(pares, series) if not df.empty]
+    if not no_vacias:
+        return pd.DataFrame(columns=columnas)
+
+    df = pd.concat(
+        [df for _, df in no_vacias],
+        keys=[par for par, _ in no_vacias],
+        names=["indicador", "lugar", None]
+    )
+    return df.reset_index(level=[0, 1]).reset_index(drop=True)[columnas]
+
+
+def _main():
+    parser = argparse.ArgumentParser(
+        description="Ingresa un CSV de indicadores oficiales al almacén Parquet."
+    )
+    parser.add_argument("csv_path", help="Ruta del CSV a ingresar")
+    parser.add_argument("indicador", help="Nombre del indicador (p. ej. poblacion)")
+    parser.add_argument("--col-municipio", default="municipio")
+    parser.add_argument("--col-fecha", default="fecha")
+    parser.add_argument("--col-valor", default="valor")
+    parser.add_argument("--col-estado", default=None, help="Columna de estado (recomendada en volcados nacionales)")
+    parser.add_argument("--base-dir", default=None)
+    args = parser.parse_args()
+
+    n = ingest_csv(
+        args.csv_path,
+        args.indicador,
+        col_municipio=args.col_municipio,
+        col_fecha=args.col_fecha,
+        col_valor=args.col_valor,
+        col_estado=args.col_estado,
+        base_dir=args.base_dir
+    )
+    print(f"{n} filas ingresadas en '{args.indicador}'.")
+
+
+if __name__ == "__main__":
+    _main()
@@ -1,9 +1,18 @@
 # utils/llm_utils.py
 
+import json
+import logging
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 from openai import OpenAI
 from dotenv import load_dotenv
 
+from utils.audio import preparar_audio
+from utils.tokens import contar_tokens, fragmentar
+
 load_dotenv()
 
 # 1) Leer API Key de OpenAI
@@ -13,33 +22,207 @@ api_key = os.getenv("OPENAI_API_KEY")
 # 2) Crear cliente global
 client = OpenAI(api_key=api_key)
 
+logger = logging.getLogger(__name__)
 
-def summarize_with_llm(texto: str) -> str:
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "Eres un asistente que resume textos de forma concisa."},
-            {"role": "user", "content": texto}
-        ],
-        temperature=0.3,
-        max_tokens=150
+# 3) Enrutamiento: modelo y presupuesto de salida según la tarea y el tamaño de la entrada.
+MODELO_ECONOMICO = os.getenv("LLM_MODELO_ECONOMICO", "gpt-4o-mini")
+MODELO_AMPLIO = os.getenv("LLM_MODELO_AMPLIO", "gpt-4o")
+# Latencia objetivo por llamada (s): si el modelo elegido la excedería según su latencia
+# observada, se usa el otro modelo de la ruta cuando ése sí la cumple
+LATENCIA_OBJETIVO = float(os.getenv("LLM_LATENCIA_OBJETIVO", "8"))
+
+# Por tarea:
+#   - modelo: modelo por defecto (el más barato que cumple).
+#   - modelo_amplio / umbral_amplio: modelo para entradas de más de 'umbral_amplio' tokens.
+#   - max_tokens, min_tokens, proporcion: presupuesto de salida = proporcion × tokens de
+#     entrada, acotado entre min_tokens y max_tokens (proporcion 0 = siempre max_tokens).
+RUTAS = {
+    "resumen": {"modelo": MODELO_ECONOMICO, "max_tokens": 150, "min_tokens": 60, "proporcion": 0.5},
+    "entidades": {"modelo": MODELO_ECONOMICO, "max_tokens": 120, "min_tokens": 60, "proporcion": 0.3},
+    "fragmento": {"modelo": MODELO_ECONOMICO, "max_tokens": 400, "min_tokens": 150, "proporcion": 0.15},
+    "analisis": {
+        "modelo": MODELO_ECONOMICO,
+        "modelo_amplio": MODELO_AMPLIO,
+        "umbral_amplio": 12000,
+        "max_tokens": 900,
+        "min_tokens": 250,
+        "proporcion": 0.3
+    },
+}
+# Ajustes por tarea sin tocar el código, p. ej.
+# LLM_RUTAS='{"analisis": {"modelo": "gpt-4o", "max_tokens": 1200}}'
+try:
+    for _tarea, _cambios in json.loads(os.getenv("LLM_RUTAS", "{}") or "{}").items():
+        RUTAS.setdefault(_tarea, dict(RUTAS["analisis"])).update(_cambios)
+except (ValueError, AttributeError, TypeError) as e:
+    logger.warning("LLM_RUTAS inválido, se usan las rutas por defecto: %s", e)
+
+# Latencia observada por modelo, ajustada como latencia = fijo + seg_por_token × tokens
+# de salida (regresión lineal con olvido exponencial: sumas n, x, y, xx, xy). Así el
+# costo fijo de cada llamada (entrada, primer token) no se confunde con la velocidad.
+_AJUSTE_LATENCIA = {}
+OLVIDO_LATENCIA = 0.95
+# Estadísticas por (tarea, modelo): llamadas, segundos y tokens acumulados
+_ESTADISTICAS = {}
+_ESTADISTICAS_LOCK = threading.Lock()
+
+
+def configurar_ruta(tarea: str, **cambios) -> None:
+    """
+    Cambia en tiempo de ejecución la ruta de 'tarea' (mismas claves que RUTAS).
+    """
+    RUTAS.setdefault(tarea, dict(RUTAS["analisis"])).update(cambios)
+
+
+def estimar_latencia(modelo: str, tokens_salida: int) -> float:
+    """
+    Latencia esperada (s) de una llamada a 'modelo' que genera 'tokens_salida' tokens,
+    según las llamadas anteriores. None si todavía no hay suficientes observaciones.
+    """
+    with _ESTADISTICAS_LOCK:
+        sumas = _AJUSTE_LATENCIA.get(modelo)
+        if not sumas or sumas[0] < 3:
+            return None
+        n, x, y, xx, xy = sumas
+    varianza = xx - x * x / n
+    if varianza <= 1e-9 * n:
+        # Todas las llamadas con la misma salida: sólo se conoce la media
+        return y / n
+    seg_por_token = max(0.0, (xy - x * y / n) / varianza)
+    fijo = max(0.0, (y - seg_por_token * x) / n)
+    return fijo + seg_por_token * tokens_salida
+
+
+def elegir_ruta(tarea: str, texto: str) -> dict:
+    """
+    Decide modelo y max_tokens para 'tarea' según los tokens de 'texto' (tokenizador local).
+    El presupuesto de salida no se recorta por latencia; la latencia objetivo sólo
+    decide entre los modelos de la ruta.
+    Retorna {tarea, modelo, max_tokens, tokens_entrada}.
+    """
+    conf = RUTAS.get(tarea, RUTAS["analisis"])
+    entrada = contar_tokens(texto)
+
+    max_tokens = conf["max_tokens"]
+    if conf.get("proporcion"):
+        max_tokens = int(min(conf["max_tokens"], max(conf["min_tokens"], entrada * conf["proporcion"])))
+
+    modelo = conf["modelo"]
+    alterno = conf.get("modelo_amplio")
+    if alterno and entrada > conf.get("umbral_amplio", float("inf")):
+        modelo, alterno = alterno, modelo
+
+    # Si el modelo elegido excedería la latencia objetivo y el otro no, usar el otro
+    if alterno and LATENCIA_OBJETIVO:
+        estimada = estimar_latencia(modelo, max_tokens)
+        estimada_alterno = estimar_latencia(alterno, max_tokens)
+        if (estimada and estimada > LATENCIA_OBJETIVO
+                and estimada_alterno is not None and estimada_alterno <= LATENCIA_OBJETIVO):
+            modelo = alterno
+
+    return {"tarea": tarea, "modelo": modelo, "max_tokens": max_tokens, "tokens_entrada": entrada}
+
+
+def _registrar(ruta: dict, segundos: float, tokens_salida: int, truncada: bool = False) -> None:
+    with _ESTADISTICAS_LOCK:
+        if tokens_salida:
+            sumas = _AJUSTE_LATENCIA.setdefault(ruta["modelo"], [0.0] * 5)
+            sumas[:] = [v * OLVIDO_LATENCIA for v in sumas]
+            for i, v in enumerate((1, tokens_salida, segundos, tokens_salida ** 2, tokens_salida * segundos)):
+                sumas[i] += v
+        est = _ESTADISTICAS.setdefault(
+            (ruta["tarea"], ruta["modelo"]),
+            {"llamadas": 0, "segundos": 0.0, "tokens_entrada": 0, "tokens_salida": 0, "truncadas": 0}
+        )
+        est["llamadas"] += 1
+        est["segundos"] += segundos
+        est["tokens_entrada"] += ruta["tokens_entrada"]
+        est["tokens_salida"] += tokens_salida
+        est["truncadas"] += int(truncada)
+    logger.info(
+        "llm tarea=%s modelo=%s entrada=%d max_tokens=%d salida=%d latencia=%.2fs%s",
+        ruta["tarea"], ruta["modelo"], ruta["tokens_entrada"], ruta["max_tokens"], tokens_salida, segundos,
+        " truncada" if truncada else ""
     )
+
+
+def estadisticas_llm() -> list:
+    """
+    Resumen de las llamadas hechas por el proceso: una fila por (tarea, modelo)
+    con llamadas, latencia media, tokens de entrada y salida y respuestas truncadas.
+    """
+    with _ESTADISTICAS_LOCK:
+        return [
+            {
+                "tarea": tarea,
+                "modelo": modelo,
+                "llamadas": est["llamadas"],
+                "latencia_media": est["segundos"] / est["llamadas"],
+                "tokens_entrada": est["tokens_entrada"],
+                "tokens_salida": est["tokens_salida"],
+                "truncadas": est["truncadas"]
+            }
+            for (tarea, modelo), est in _ESTADISTICAS.items()
+        ]
+
+
+def _completar(tarea: str, sistema: str, usuario: str, temperature: float = None) -> str:
+    """
+    Llamada de chat enrutada: elige modelo y presupuesto, mide la latencia y la registra.
+    """
+    ruta = elegir_ruta(tarea, sistema + "\n" + usuario)
+    argumentos = {}
+    if temperature is not None:
+        argumentos["temperature"] = temperature
+
+    # Si la respuesta se corta por max_tokens (finish_reason "length"), se repite
+    # una vez con el doble de presupuesto para no devolver un texto a medias
+    for intento in range(2):
+        inicio = time.perf_counter()
+        response = client.chat.completions.create(
+            model=ruta["modelo"],
+            messages=[
+                {"role": "system", "content": sistema},
+                {"role": "user", "content": usuario}
+            ],
+            max_tokens=ruta["max_tokens"],
+            **argumentos
+        )
+        uso = getattr(response, "usage", None)
+        truncada = response.choices[0].finish_reason == "length"
+        _registrar(ruta, time.perf_counter() - inicio, getattr(uso, "completion_tokens", 0) or 0, truncada)
+        if not truncada:
+            break
+        if intento == 0:
+            ruta = dict(ruta, max_tokens=ruta["max_tokens"] * 2)
+        else:
+            logger.warning(
+                "llm tarea=%s: respuesta truncada aun con max_tokens=%d", ruta["tarea"], ruta["max_tokens"]
+            )
     return response.choices[0].message.content.strip()
 
 
+def summarize_with_llm(texto: str) -> str:
+    return _completar(
+        "resumen",
+        "Eres un asistente que resume textos de forma concisa.",
+        texto,
+        temperature=0.3
+    )
+
+
 def extract_entities(texto: str) -> str:
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {
-                "role": "system",
-                "content": "Eres un asistente experto en extracción de entidades (lugares, fechas, organizaciones)."
-            },
-            {"role": "user", "content": f"Extrae las entidades del siguiente texto:\n\n{texto}"}
-        ],
+    return _completar(
+        "entidades",
+        (
+            "Eres un asistente experto en extracción de entidades (lugares, fechas, organizaciones). "
+            "Responde exactamente en tres líneas con este formato, separando los elementos con ';' "
+            "y escribiendo 'Ninguno' si no hay:\n"
+            "Lugares: ...\nFechas: ...\nOrganizaciones: ..."
+        ),
+        f"Extrae las entidades del siguiente texto:\n\n{texto}",
         temperature=0.0
     )
-    return response.choices[0].message.content.strip()
 
 
 def transcribe_audio_whisper(audio_path: str) -> str:
@@ -51,12 +234,77 @@ def transcribe_audio_whisper(audio_path: str) -> str:
     return resp.text
 
 
-def analyze_text_with_llm(texto: str) -> str:
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
-            {"role": "system", "content": "Eres un analista que extrae insights y resume textos."},
-            {"role": "user", "content": texto}
-        ]
+def _transcribir_parte(parte) -> str:
+    nombre, contenido = parte
+    resp = client.audio.transcriptions.create(
+        file=(nombre, contenido),
+        model="whisper-1"
+    )
+    return resp.text
+
+
+def transcribe_long_audio(audio_path: str, max_workers: int = 4) -> str:
+    """
+    Igual que transcribe_audio_whisper, pero preprocesando el audio (ver utils/audio.py):
+    mono 16 kHz, sin silencios largos y en fragmentos comprimidos que se transcriben
+    en paralelo y se unen en orden. Sin ffmpeg, se envía el archivo original.
+    """
+    preparado = preparar_audio(audio_path)
+    if preparado is None:
+        return transcribe_audio_whisper(audio_path)
+    partes = preparado["partes"]
+    if not partes:
+        return ""
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(partes)))) as pool:
+        textos = list(pool.map(_transcribir_parte, partes))
+    logger.info(
+        "audio %s: %.0fs -> %.0fs de voz, %d -> %d bytes en %d partes, %.2fs",
+        os.path.basename(audio_path),
+        preparado["segundos_originales"], preparado["segundos_voz"],
+        preparado["bytes_originales"], preparado["bytes_enviados"],
+        len(partes), time.perf_counter() - inicio
+    )
+    return " ".join(t.strip() for t in textos if t and t.strip())
+
+
+def analyze_text_with_llm(texto: str, tarea: str = "analisis") -> str:
+    return _completar(
+        tarea,
+        "Eres un analista que extrae insights y resume textos.",
+        texto
+    )
+
+
+def analyze_long_text(texto: str, max_tokens_fragmento: int = 3000, max_workers: int = 4) -> str:
+    """
+    Igual que analyze_text_with_llm, pero para textos de cualquier tamaño.
+    Si el texto excede 'max_tokens_fragmento', se divide en fragmentos que se
+    analizan en paralelo y luego se combinan en un análisis final (map-reduce);
+    si los análisis parciales tampoco caben juntos, se combinan por rondas.
+    """
+    if contar_tokens(texto) <= max_tokens_fragmento:
+        return analyze_text_with_llm(texto)
+
+    fragmentos = fragmentar(texto, max_tokens_fragmento)
+    total = len(fragmentos)
+    prompts = [
+        f"Fragmento {i} de {total} de un documento largo. "
+        f"Extrae los hechos, lugares, fechas y hallazgos clave de este fragmento:\n\n{fragmento}"
+        for i, fragmento in enumerate(fragmentos, start=1)
+    ]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as pool:
+        parciales = list(pool.map(lambda p: analyze_text_with_llm(p, tarea="fragmento"), prompts))
+
+    combinado = "\n\n".join(
+        f"[Parte {i}] {parcial}" for i, parcial in enumerate(parciales, start=1)
+    )
+    if contar_tokens(combinado) > max_tokens_fragmento:
+        combinado = analyze_long_text(combinado, max_tokens_fragmento, max_workers)
+
+    return analyze_text_with_llm(
+        "Estos son los análisis parciales, en orden, de las partes de un mismo documento:\n\n"
+        f"{combinado}\n\n"
+        "Integra un único análisis con los insights principales y un resumen del documento completo."
     )
-    return response.choices[0].message.content.strip()
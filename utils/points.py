@@ -0,0 +1,179 @@
+# utils/points.py
+
+import codecs
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+# Tamaño de cada bloque de lectura del CSV (bytes) y de cada lote de GeoJSON (features)
+TAMANO_BLOQUE = 4 * 1024 ** 2
+TAMANO_LOTE = 50_000
+# Columnas de atributos (además de las coordenadas) que se conservan por punto
+MAX_ATRIBUTOS = 5
+# Decimales de las coordenadas guardadas (5 decimales ≈ 1 m)
+DECIMALES = 5
+
+NOMBRES_LAT = {"lat", "latitud", "latitude", "y"}
+NOMBRES_LON = {"lon", "lng", "long", "longitud", "longitude", "x"}
+
+
+def _columna(nombres, candidatos):
+    for nombre in nombres:
+        if nombre.strip().lower() in candidatos:
+            return nombre
+    return None
+
+
+def validar_coordenadas(lat, lon) -> np.ndarray:
+    """
+    Máscara vectorizada de coordenadas válidas: numéricas, finitas, dentro de rango
+    y distintas de (0, 0), que suele ser un valor faltante.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    return (
+        np.isfinite(lat) & np.isfinite(lon)
+        & (np.abs(lat) <= 90) & (np.abs(lon) <= 180)
+        & ~((lat == 0) & (lon == 0))
+    )
+
+
+def _a_numero(serie: pd.Series) -> pd.Series:
+    # Acepta coma decimal ("19,43"), común en exportaciones en español
+    return pd.to_numeric(serie.astype(str).str.strip().str.replace(",", ".", regex=False), errors="coerce")
+
+
+def _lote(df: pd.DataFrame, col_lat: str, col_lon: str, atributos) -> tuple:
+    """
+    Valida un lote y lo deja con columnas [lat, lon, *atributos]. Retorna (lote, descartados).
+    """
+    lat = _a_numero(df[col_lat])
+    lon = _a_numero(df[col_lon])
+    validos = validar_coordenadas(lat, lon)
+    lote = pd.DataFrame({
+        "lat": lat[validos].round(DECIMALES).astype("float32"),
+        "lon": lon[validos].round(DECIMALES).astype("float32")
+    })
+    for col in atributos:
+        lote[col] = df.loc[validos, col].astype(str).to_numpy()
+    return lote.reset_index(drop=True), int((~validos).sum())
+
+
+def detectar_codificacion(path: str) -> str:
+    """
+    Codificación de un archivo de texto: UTF-8 si todo el archivo es UTF-8 válido;
+    si no, cp1252 (exportaciones de Excel en español) o, como último recurso,
+    latin-1, que acepta cualquier byte. Se revisa por bloques, sin cargarlo completo.
+    """
+    for codificacion in ("utf-8", "cp1252"):
+        decodificador = codecs.getincrementaldecoder(codificacion)()
+        try:
+            with open(path, "rb") as f:
+                while bloque := f.read(TAMANO_BLOQUE):
+                    decodificador.decode(bloque)
+            decodificador.decode(b"", final=True)
+            return codificacion
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+
+def leer_csv_puntos(path: str) -> tuple:
+    """
+    Lee un CSV de puntos por bloques con el lector de Arrow (todas las columnas como
+    texto, así un bloque con valores raros no rompe la inferencia de tipos).
+    La codificación se detecta antes (UTF-8, cp1252 o latin-1, ver detectar_codificacion).
+    Las columnas de coordenadas se detectan por nombre (lat/latitud, lon/lng/longitud...).
+    Retorna (DataFrame [lat, lon, *atributos], descartados), o (vacío, 0) si no hay coordenadas.
+    """
+    codificacion = detectar_codificacion(path)
+    with open(path, encoding="utf-8-sig" if codificacion == "utf-8" else codificacion, newline="") as f:
+        primera = f.readline()
+    try:
+        delimitador = csv.Sniffer().sniff(primera, delimiters=",;\t|").delimiter
+    except csv.Error:
+        delimitador = ","
+    nombres = next(csv.reader([primera], delimiter=delimitador), [])
+    col_lat, col_lon = _columna(nombres, NOMBRES_LAT), _columna(nombres, NOMBRES_LON)
+    if not col_lat or not col_lon:
+        return pd.DataFrame(columns=["lat", "lon"]), 0
+    atributos = [n for n in nombres if n not in (col_lat, col_lon)][:MAX_ATRIBUTOS]
+
+    lector = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=TAMANO_BLOQUE, encoding=codificacion),
+        parse_options=pacsv.ParseOptions(delimiter=delimitador, invalid_row_handler=lambda fila: "skip"),
+        convert_options=pacsv.ConvertOptions(
+            column_types={n: pa.string() for n in nombres},
+            include_columns=[col_lat, col_lon, *atributos]
+        )
+    )
+    lotes, descartados = [], 0
+    for bloque in lector:
+        lote, malos = _lote(bloque.to_pandas(), col_lat, col_lon, atributos)
+        lotes.append(lote)
+        descartados += malos
+    return _unir(lotes, atributos), descartados
+
+
+def leer_geojson_puntos(path: str) -> tuple:
+    """
+    Lee un GeoJSON por lotes de TAMANO_LOTE features (geopandas con pyogrio/Arrow
+    cuando está disponible). Las geometrías que no son puntos se representan por un
+    punto interior. Retorna (DataFrame [lat, lon, *atributos], descartados).
+    """
+    import geopandas as gpd
+
+    lotes, descartados, atributos = [], 0, None
+    ini = 0
+    while True:
+        try:
+            gdf = gpd.read_file(path, rows=slice(ini, ini + TAMANO_LOTE), engine="pyogrio", use_arrow=True)
+        except (ImportError, TypeError, ValueError):
+            gdf = gpd.read_file(path, rows=slice(ini, ini + TAMANO_LOTE))
+        if gdf.empty:
+            break
+        if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+            gdf = gdf.to_crs("EPSG:4326")
+        if atributos is None:
+            atributos = [c for c in gdf.columns if c != gdf.geometry.name][:MAX_ATRIBUTOS]
+
+        vacias = gdf.geometry.isna() | gdf.geometry.is_empty
+        puntos = gdf.geometry.where(gdf.geom_type == "Point", gdf.geometry.representative_point())
+        df = pd.DataFrame({
+            "lat": np.where(vacias, np.nan, puntos.y),
+            "lon": np.where(vacias, np.nan, puntos.x),
+            **{c: gdf[c].to_numpy() for c in atributos}
+        })
+        lote, malos = _lote(df, "lat", "lon", atributos)
+        lotes.append(lote)
+        descartados += malos
+        if len(gdf) < TAMANO_LOTE:
+            break
+        ini += TAMANO_LOTE
+    return _unir(lotes, atributos or []), descartados
+
+
+def _unir(lotes, atributos) -> pd.DataFrame:
+    if not lotes:
+        return pd.DataFrame(columns=["lat", "lon", *atributos])
+    df = pd.concat(lotes, ignore_index=True)
+    # Atributos repetitivos (tipo de daño, brigada...) como categorías
+    for col in atributos:
+        if df[col].nunique() <= max(1, len(df) // 2):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def leer_puntos(path: str) -> tuple:
+    """
+    Lee un archivo de puntos (.csv o .geojson/.json). Retorna (DataFrame, descartados).
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".geojson", ".json"):
+        return leer_geojson_puntos(path)
+    return leer_csv_puntos(path)
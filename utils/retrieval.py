@@ -0,0 +1,97 @@
+# utils/retrieval.py
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.metrics.pairwise import linear_kernel
+
+from utils.tokens import contar_tokens
+
+
+class IndiceContexto:
+    """
+    Índice local de evidencias (resúmenes de noticias, descripciones de archivos
+    subidos, hechos de datos oficiales) que se llena a medida que corren los agentes.
+    Cada elemento pertenece a una 'fuente'; volver a correr un agente reemplaza
+    los elementos de su fuente. La matriz TF-IDF se reconstruye sólo cuando
+    cambió el contenido desde la última consulta.
+    """
+
+    def __init__(self):
+        self.elementos = []  # lista de dicts {"fuente", "texto", "tokens"}
+        self._vectorizador = None
+        self._matriz = None
+        self._sucio = True
+
+    def __len__(self):
+        return len(self.elementos)
+
+    def reemplazar_fuente(self, fuente: str, textos):
+        """
+        Sustituye todos los elementos de 'fuente' por 'textos' (vacíos y repetidos se omiten).
+        """
+        self.elementos = [e for e in self.elementos if e["fuente"] != fuente]
+        vistos = set()
+        for texto in textos:
+            texto = str(texto or "").strip()
+            if not texto or texto in vistos:
+                continue
+            vistos.add(texto)
+            self.elementos.append({"fuente": fuente, "texto": texto, "tokens": contar_tokens(texto)})
+        self._sucio = True
+
+    def _ajustar(self):
+        if not self._sucio:
+            return
+        self._vectorizador = TfidfVectorizer(strip_accents="unicode", lowercase=True, sublinear_tf=True)
+        self._matriz = self._vectorizador.fit_transform([e["texto"] for e in self.elementos])
+        self._sucio = False
+
+    def seleccionar(self, consulta: str, presupuesto_tokens: int = 1500,
+                    diversidad: float = 0.3, min_por_fuente: int = 1):
+        """
+        Elige los elementos más relevantes para 'consulta' sin pasarse de
+        'presupuesto_tokens', penalizando los redundantes (Maximal Marginal Relevance).
+        Se garantiza al menos 'min_por_fuente' elementos de cada fuente si caben.
+        Retorna lista de elementos en el orden de selección.
+        """
+        if not self.elementos:
+            return []
+        n = len(self.elementos)
+        try:
+            self._ajustar()
+            q = self._vectorizador.transform([consulta or ""])
+            relevancia = linear_kernel(q, self._matriz).ravel()
+            matriz = self._matriz
+        except ValueError:
+            # Vocabulario vacío: sin señal de relevancia, se conserva el orden de llegada
+            relevancia = np.linspace(1, 0, n)
+            matriz = None
+
+        tokens = np.array([e["tokens"] for e in self.elementos])
+        fuentes = np.array([e["fuente"] for e in self.elementos])
+        disponibles = tokens <= presupuesto_tokens
+        max_sim = np.zeros(n)
+        elegidos = []
+        usados = 0
+        pendientes_fuente = {f: min_por_fuente for f in dict.fromkeys(fuentes)}
+
+        while disponibles.any():
+            puntaje = (1 - diversidad) * relevancia - diversidad * max_sim
+            # Primero cubrir las fuentes que aún no tienen representación
+            faltan = [f for f, k in pendientes_fuente.items() if k > 0]
+            candidatos = disponibles & np.isin(fuentes, faltan) if faltan else disponibles
+            if not candidatos.any():
+                pendientes_fuente = {f: 0 for f in pendientes_fuente}
+                candidatos = disponibles
+            i = int(np.argmax(np.where(candidatos, puntaje, -np.inf)))
+
+            elegidos.append(self.elementos[i])
+            usados += tokens[i]
+            pendientes_fuente[fuentes[i]] -= 1
+            disponibles[i] = False
+            if matriz is not None:
+                # Sólo la fila del recién elegido: nunca se arma la matriz n×n
+                max_sim = np.maximum(max_sim, linear_kernel(matriz[i], matriz).ravel())
+            disponibles &= tokens <= presupuesto_tokens - usados
+
+        return elegidos
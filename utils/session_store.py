@@ -0,0 +1,241 @@
+# utils/session_store.py
+
+import os
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import pandas as pd
+
+from utils.charts import construir_figura, es_especificacion
+
+# Artefactos grandes compartidos por todas las sesiones del proceso
+# (p. ej. capas GeoJSON de riesgo), referenciados desde la sesión por su llave.
+# Se conservan como máximo MAX_ARTEFACTOS y MAX_ARTEFACTOS_MB; al pasarse se descartan
+# los usados hace más tiempo. La fábrica de cada uno se recuerda para recrearlo si
+# una sesión lo vuelve a pedir después de descartado.
+MAX_ARTEFACTOS = int(os.getenv("MAX_ARTEFACTOS", "64"))
+MAX_BYTES_ARTEFACTOS = int(os.getenv("MAX_ARTEFACTOS_MB", "512")) * 1024 ** 2
+MAX_FABRICAS = 1000
+
+_ARTEFACTOS = OrderedDict()
+_TAMANOS = {}
+_FABRICAS = OrderedDict()
+# Fábricas en ejecución: quien pide la misma llave mientras tanto espera ese resultado
+_EN_CURSO = {}
+_ARTEFACTOS_LOCK = threading.Lock()
+
+# Columnas de texto con pocos valores distintos que conviene guardar como categorías
+_MAX_PROPORCION_CATEGORIA = 0.5
+
+
+def artefacto_compartido(llave: str, fabrica=None):
+    """
+    Devuelve el artefacto guardado bajo 'llave'. Si no existe y se da 'fabrica'
+    (función sin argumentos), lo crea una sola vez para todo el proceso; si fue
+    descartado por el límite de memoria, lo recrea con la fábrica que lo creó.
+    Si otro hilo ya está corriendo la fábrica de 'llave' (p. ej. la precarga), se
+    espera su resultado en lugar de repetir el trabajo.
+    Un resultado None de la fábrica no se guarda. Retorna None si no hay artefacto.
+    """
+    with _ARTEFACTOS_LOCK:
+        if llave in _ARTEFACTOS:
+            _ARTEFACTOS.move_to_end(llave)
+            return _ARTEFACTOS[llave]
+        fabrica = fabrica or _FABRICAS.get(llave)
+        if fabrica is None:
+            return None
+        futuro = _EN_CURSO.get(llave)
+        propio = futuro is None
+        if propio:
+            futuro = _EN_CURSO[llave] = Future()
+    if not propio:
+        return futuro.result()
+
+    try:
+        valor = fabrica()
+        if valor is not None:
+            # El tamaño se mide una sola vez, al guardarlo (ver medir_sesion)
+            tamano = _tamano(valor, set(), set())
+            with _ARTEFACTOS_LOCK:
+                _guardar_artefacto(llave, valor, tamano, fabrica)
+    except BaseException as e:
+        with _ARTEFACTOS_LOCK:
+            _EN_CURSO.pop(llave, None)
+        futuro.set_exception(e)
+        raise
+    with _ARTEFACTOS_LOCK:
+        _EN_CURSO.pop(llave, None)
+    futuro.set_result(valor)
+    return valor
+
+
+def olvidar_artefactos(prefijo: str, conservar: str = None) -> int:
+    """
+    Descarta los artefactos (y sus fábricas) cuya llave empieza con 'prefijo',
+    salvo 'conservar'; p. ej. versiones anteriores de un recorte guardado.
+    Retorna cuántos artefactos se descartaron.
+    """
+    with _ARTEFACTOS_LOCK:
+        llaves = [k for k in _ARTEFACTOS if k.startswith(prefijo) and k != conservar]
+        for llave in llaves:
+            _ARTEFACTOS.pop(llave, None)
+            _TAMANOS.pop(llave, None)
+        for llave in [k for k in _FABRICAS if k.startswith(prefijo) and k != conservar]:
+            _FABRICAS.pop(llave, None)
+    return len(llaves)
+
+
+def _guardar_artefacto(llave: str, valor, tamano: int, fabrica) -> None:
+    # Se llama con _ARTEFACTOS_LOCK tomado
+    _ARTEFACTOS[llave] = valor
+    _TAMANOS[llave] = tamano
+    _FABRICAS[llave] = fabrica
+    _FABRICAS.move_to_end(llave)
+    while len(_FABRICAS) > MAX_FABRICAS:
+        _FABRICAS.popitem(last=False)
+    while len(_ARTEFACTOS) > 1 and (
+        len(_ARTEFACTOS) > MAX_ARTEFACTOS or sum(_TAMANOS.values()) > MAX_BYTES_ARTEFACTOS
+    ):
+        viejo, _ = _ARTEFACTOS.popitem(last=False)
+        _TAMANOS.pop(viejo, None)
+
+
+def compactar_df(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce la memoria de un DataFrame: texto con pocos valores distintos a
+    'category' y el resto del texto a cadenas respaldadas por Arrow.
+    Las columnas con listas u otros objetos se dejan como están.
+    """
+    if df is None or df.empty:
+        return df
+    df = df.copy()
+    for col in df.columns:
+        serie = df[col]
+        if serie.dtype != object:
+            continue
+        no_nulos = serie.dropna()
+        if not no_nulos.map(lambda v: isinstance(v, str)).all():
+            continue
+        if no_nulos.nunique() <= max(1, len(serie) * _MAX_PROPORCION_CATEGORIA):
+            df[col] = serie.astype("category")
+        else:
+            df[col] = serie.astype("string[pyarrow]")
+    return df
+
+
+def compactar_salida(salida: dict) -> dict:
+    """
+    Versión compacta de la salida de un agente para guardarla en st.session_state:
+    - DataFrames compactados (ver compactar_df).
+    - Figuras de Plotly reemplazadas por la especificación 'grafico' del agente,
+      a partir de la cual se reconstruyen con figura().
+    - Capas GeoJSON reemplazadas por la llave del artefacto compartido ('capa').
+    """
+    if not salida:
+        return salida
+    grafico = salida.get("grafico")
+    if es_especificacion(grafico):
+        grafico = dict(grafico, datos=compactar_df(grafico["datos"]))
+
+    compacta = {}
+    for clave, valor in salida.items():
+        if clave == "grafico":
+            compacta[clave] = grafico
+        elif isinstance(valor, pd.DataFrame):
+            compacta[clave] = compactar_df(valor)
+        elif hasattr(valor, "to_plotly_json") and es_especificacion(grafico):
+            compacta[clave] = grafico
+        elif isinstance(valor, dict) and valor.get("geojson") is not None and valor.get("capa"):
+            compacta[clave] = {k: v for k, v in valor.items() if k != "geojson"}
+        else:
+            compacta[clave] = valor
+    return compacta
+
+
+def figura(valor, frecuencia: str = None):
+    """
+    Figura de Plotly a partir de lo guardado en la sesión: la figura misma o su especificación.
+    Con una especificación se puede pedir otra agregación temporal ('frecuencia': "h", "D", "W").
+    Retorna {} si no hay figura.
+    """
+    if hasattr(valor, "to_plotly_json"):
+        return valor
+    if es_especificacion(valor):
+        return construir_figura(valor, frecuencia)
+    return {}
+
+
+def geojson_de(fig) -> dict:
+    """
+    GeoJSON de una salida de inundaciones, ya sea incluido o referenciado por su llave 'capa'.
+    """
+    if not isinstance(fig, dict):
+        return None
+    if fig.get("geojson") is not None:
+        return fig["geojson"]
+    if fig.get("capa"):
+        return artefacto_compartido(fig["capa"])
+    return None
+
+
+def _tamano(obj, vistos: set, excluir: set) -> int:
+    """
+    Tamaño aproximado en bytes de 'obj' y lo que contiene.
+    Los objetos cuyo id() está en 'excluir' (artefactos compartidos) no se cuentan.
+    """
+    if id(obj) in vistos or id(obj) in excluir:
+        return 0
+    vistos.add(id(obj))
+
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(obj.memory_usage(deep=True).sum() if isinstance(obj, pd.DataFrame) else obj.memory_usage(deep=True))
+    if hasattr(obj, "to_plotly_json"):
+        return len(obj.to_json())
+    tamano = sys.getsizeof(obj, 0)
+    if isinstance(obj, dict):
+        tamano += sum(_tamano(k, vistos, excluir) + _tamano(v, vistos, excluir) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        tamano += sum(_tamano(v, vistos, excluir) for v in obj)
+    elif hasattr(obj, "__dict__"):
+        tamano += _tamano(vars(obj), vistos, excluir)
+    return tamano
+
+
+def medir_sesion(session_state) -> dict:
+    """
+    Medidor de memoria por sesión. Retorna diccionario con:
+      - por_clave: {clave de session_state: bytes}
+      - total_sesion: bytes de la sesión
+      - compartido: bytes de los artefactos compartidos del proceso
+      - sesiones_estimadas: cuántas sesiones como ésta caben en la memoria del nodo
+        (MEMORIA_NODO_MB o la RAM física), descontando lo compartido.
+    """
+    with _ARTEFACTOS_LOCK:
+        excluir = {id(a) for a in _ARTEFACTOS.values()}
+        compartido = sum(_TAMANOS.values())
+
+    por_clave = {}
+    vistos = set()
+    for clave in list(session_state.keys()):
+        try:
+            por_clave[str(clave)] = _tamano(session_state[clave], vistos, excluir)
+        except Exception:
+            por_clave[str(clave)] = 0
+    total = sum(por_clave.values())
+
+    memoria_nodo = int(os.getenv("MEMORIA_NODO_MB", "0")) * 1024 ** 2
+    if not memoria_nodo and hasattr(os, "sysconf"):
+        try:
+            memoria_nodo = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+        except (ValueError, OSError):
+            memoria_nodo = 0
+
+    sesiones = int(max(0, memoria_nodo - compartido) // total) if total and memoria_nodo else None
+    return {
+        "por_clave": dict(sorted(por_clave.items(), key=lambda kv: kv[1], reverse=True)),
+        "total_sesion": total,
+        "compartido": compartido,
+        "sesiones_estimadas": sesiones
+    }
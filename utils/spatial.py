@@ -0,0 +1,170 @@
+# utils/spatial.py
+
+import hashlib
+import json
+import math
+import threading
+from collections import OrderedDict
+
+import geopandas as gpd
+import pandas as pd
+
+# Capas de riesgo ya convertidas a GeoDataFrame, por llave (URL o artefacto) o huella
+# del GeoJSON. El índice espacial (STRtree) de cada capa se construye una sola vez y
+# se reutiliza; se conservan las MAX_CAPAS usadas más recientemente.
+MAX_CAPAS = 16
+_CAPAS = OrderedDict()
+_CAPAS_LOCK = threading.Lock()
+
+
+def _huella_geojson(geojson: dict) -> str:
+    """
+    Llave estable para un GeoJSON (hash del contenido). Es preferible que el
+    llamador pase una llave propia, como la URL de origen, para evitar serializarlo.
+    """
+    contenido = json.dumps(geojson, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha1(contenido).hexdigest()
+
+
+def capa_riesgo(geojson: dict, llave: str = None) -> gpd.GeoDataFrame:
+    """
+    Convierte un GeoJSON de polígonos de riesgo en GeoDataFrame (EPSG:4326)
+    con una columna 'id_poligono', y lo guarda en caché por proceso junto con
+    su índice espacial ya construido.
+    """
+    llave = llave or _huella_geojson(geojson)
+    with _CAPAS_LOCK:
+        if llave in _CAPAS:
+            _CAPAS.move_to_end(llave)
+            return _CAPAS[llave]
+
+    gdf = gpd.GeoDataFrame.from_features(geojson.get("features", []), crs="EPSG:4326")
+    gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty].reset_index(drop=True)
+    gdf["id_poligono"] = gdf.index
+    gdf.sindex  # construir el STRtree ahora y no en la primera consulta
+
+    with _CAPAS_LOCK:
+        _CAPAS[llave] = gdf
+        while len(_CAPAS) > MAX_CAPAS:
+            _CAPAS.popitem(last=False)
+    return gdf
+
+
+def recortar_capa(capa: gpd.GeoDataFrame, lat: float, lon: float, radio_km: float = 50) -> dict:
+    """
+    Subconjunto de la capa alrededor de (lat, lon): polígonos que tocan el cuadro
+    de 'radio_km' km por lado desde el centro (consulta sobre el índice espacial).
+    Retorna un GeoJSON (dict) con sólo esos polígonos.
+    """
+    d_lat = radio_km / 111.0
+    d_lon = radio_km / (111.0 * max(0.01, math.cos(math.radians(lat))))
+    recorte = capa.cx[lon - d_lon:lon + d_lon, lat - d_lat:lat + d_lat]
+    return json.loads(recorte.to_json(drop_id=True))
+
+
+def puntos_desde_df(df: pd.DataFrame, fuente: str) -> gpd.GeoDataFrame:
+    """
+    Crea un GeoDataFrame de puntos a partir de las columnas 'lat'/'lon' de 'df'
+    (se descartan filas sin coordenadas) y agrega la columna 'fuente'.
+    """
+    if df is None or df.empty or not {"lat", "lon"} <= set(df.columns):
+        return gpd.GeoDataFrame(columns=["fuente", "geometry"], geometry="geometry", crs="EPSG:4326")
+
+    validos = df.dropna(subset=["lat", "lon"]).copy()
+    validos["fuente"] = fuente
+    return gpd.GeoDataFrame(
+        validos,
+        geometry=gpd.points_from_xy(validos["lon"], validos["lat"]),
+        crs="EPSG:4326"
+    )
+
+
+def cruzar_puntos_con_riesgo(puntos: gpd.GeoDataFrame, capa: gpd.GeoDataFrame,
+                             distancia_max_m: float = 5_000):
+    """
+    Cruza puntos contra polígonos de riesgo usando el índice espacial de la capa.
+    - Punto en polígono (sjoin 'within') para marcar 'en_zona_riesgo'.
+    - Polígono más cercano (sjoin_nearest, hasta 'distancia_max_m') para los que
+      quedan fuera, con su distancia en metros. Las distancias se miden en la zona
+      UTM de los puntos, sobre los polígonos cercanos a ellos (Web Mercator las
+      inflaría entre 6 y 15 % en México).
+    Retorna:
+      - df_puntos: puntos con columnas en_zona_riesgo, id_poligono, distancia_m.
+      - df_poligonos: conteo de puntos dentro de cada polígono, por fuente.
+    """
+    if puntos.empty or capa.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    puntos = puntos.to_crs("EPSG:4326").reset_index(drop=True)
+    puntos["_pid"] = puntos.index
+
+    # 1) Punto en polígono; un punto puede caer en varios polígonos, nos quedamos con uno
+    dentro = gpd.sjoin(
+        puntos[["_pid", "fuente", "geometry"]],
+        capa[["id_poligono", "geometry"]],
+        how="inner",
+        predicate="within"
+    )
+    conteo = (
+        dentro.groupby(["id_poligono", "fuente"])
+              .size()
+              .unstack(fill_value=0)
+              .reset_index()
+    )
+    dentro = dentro.drop_duplicates("_pid").set_index("_pid")
+
+    puntos["en_zona_riesgo"] = puntos["_pid"].isin(dentro.index)
+    puntos["id_poligono"] = puntos["_pid"].map(dentro["id_poligono"])
+    puntos["distancia_m"] = 0.0
+    puntos.loc[~puntos["en_zona_riesgo"], "distancia_m"] = float("nan")
+
+    # 2) Polígono más cercano para los puntos fuera de zona (en CRS métrico)
+    fuera = puntos.loc[~puntos["en_zona_riesgo"], ["_pid", "geometry"]]
+    if not fuera.empty:
+        crs_metrico = fuera.estimate_utm_crs()
+        # Sólo los polígonos del cuadro de los puntos ampliado en 'distancia_max_m'
+        x0, y0, x1, y1 = fuera.total_bounds
+        margen_lat = distancia_max_m / 111_000
+        margen_lon = margen_lat / max(0.01, math.cos(math.radians(max(abs(y0), abs(y1)))))
+        cerca = capa.cx[x0 - margen_lon:x1 + margen_lon, y0 - margen_lat:y1 + margen_lat]
+        if not cerca.empty:
+            cercanos = gpd.sjoin_nearest(
+                fuera.to_crs(crs_metrico),
+                cerca[["id_poligono", "geometry"]].to_crs(crs_metrico),
+                how="inner",
+                max_distance=distancia_max_m,
+                distance_col="distancia_m"
+            ).drop_duplicates("_pid").set_index("_pid")
+            puntos.loc[cercanos.index, "id_poligono"] = cercanos["id_poligono"]
+            puntos.loc[cercanos.index, "distancia_m"] = cercanos["distancia_m"]
+
+    df_puntos = pd.DataFrame(puntos.drop(columns=["geometry", "_pid"]))
+    return df_puntos, conteo
+
+
+def resumen_riesgo(df_puntos: pd.DataFrame, df_poligonos: pd.DataFrame) -> str:
+    """
+    Texto breve con las cifras del cruce espacial, para incluirlo en el prompt de contraste.
+    """
+    if df_puntos.empty:
+        return "Sin puntos georreferenciados para cruzar con la capa de riesgo."
+
+    lineas = []
+    for fuente, grupo in df_puntos.groupby("fuente"):
+        n = len(grupo)
+        n_dentro = int(grupo["en_zona_riesgo"].sum())
+        cercanos = grupo.loc[~grupo["en_zona_riesgo"], "distancia_m"].dropna()
+        linea = f"{fuente}: {n_dentro} de {n} puntos dentro de zonas de riesgo"
+        if not cercanos.empty:
+            linea += (
+                f"; {len(cercanos)} fuera de zona, a una mediana de "
+                f"{cercanos.median():.0f} m del polígono más cercano"
+            )
+        lineas.append(linea + ".")
+
+    if not df_poligonos.empty:
+        totales = df_poligonos.set_index("id_poligono").sum(axis=1).sort_values(ascending=False)
+        top = ", ".join(f"#{pid} ({int(n)})" for pid, n in totales.head(5).items())
+        lineas.append(f"Polígonos con más puntos: {top}.")
+
+    return "\n".join(lineas)
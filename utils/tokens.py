@@ -0,0 +1,94 @@
+# utils/tokens.py
+
+import threading
+
+# Codificación de los modelos gpt-4o. Si tiktoken no está instalado (o no puede
+# cargar la codificación), se usa la aproximación de ~4 caracteres por token.
+CODIFICACION = "o200k_base"
+
+_ENCODER = None
+_ENCODER_LOCK = threading.Lock()
+
+
+def _encoder():
+    global _ENCODER
+    if _ENCODER is None:
+        with _ENCODER_LOCK:
+            if _ENCODER is None:
+                try:
+                    import tiktoken
+                    _ENCODER = tiktoken.get_encoding(CODIFICACION)
+                except Exception:
+                    _ENCODER = False
+    return _ENCODER or None
+
+
+def contar_tokens(texto: str) -> int:
+    """
+    Número de tokens de 'texto' según el tokenizador local.
+    """
+    texto = texto or ""
+    enc = _encoder()
+    if enc is None:
+        return (len(texto) + 3) // 4
+    return len(enc.encode(texto, disallowed_special=()))
+
+
+def recortar_a_tokens(texto: str, max_tokens: int) -> str:
+    """
+    Recorta 'texto' para que no exceda 'max_tokens' tokens.
+    """
+    texto = texto or ""
+    enc = _encoder()
+    if enc is None:
+        return texto[:max_tokens * 4]
+    ids = enc.encode(texto, disallowed_special=())
+    # errors="ignore": un corte a mitad de un carácter multibyte no deja "�"
+    return texto if len(ids) <= max_tokens else enc.decode(ids[:max_tokens], errors="ignore")
+
+
+def recortar_lineas(texto: str, max_tokens: int, resto: str = "… y {} líneas más.") -> str:
+    """
+    Recorta 'texto' a 'max_tokens' tokens conservando líneas completas, desde el
+    principio; si quedan líneas fuera se agrega 'resto' con cuántas son.
+    Si ni la primera línea cabe, se recorta esa línea.
+    """
+    lineas = (texto or "").splitlines()
+    if contar_tokens(texto) <= max_tokens:
+        return texto or ""
+    disponible = max_tokens - contar_tokens(resto.format(len(lineas)))
+    conservadas = []
+    for linea in lineas:
+        costo = contar_tokens(linea) + 1
+        if costo > disponible:
+            break
+        conservadas.append(linea)
+        disponible -= costo
+    if not conservadas:
+        return recortar_a_tokens(lineas[0] if lineas else "", max_tokens)
+    return "\n".join(conservadas + [resto.format(len(lineas) - len(conservadas))])
+
+
+def fragmentar(texto: str, max_tokens: int = 3000, solapamiento: int = 150) -> list:
+    """
+    Divide 'texto' en fragmentos de a lo más 'max_tokens' tokens, con
+    'solapamiento' tokens repetidos entre fragmentos consecutivos para no
+    cortar ideas a la mitad. Un último fragmento que quedaría completo dentro del
+    solapamiento del anterior no se genera. Si el texto cabe completo, retorna [texto].
+    """
+    texto = texto or ""
+    solapamiento = min(solapamiento, max_tokens // 2)
+    paso = max_tokens - solapamiento
+    enc = _encoder()
+    if enc is None:
+        if len(texto) <= max_tokens * 4:
+            return [texto]
+        return [texto[i:i + max_tokens * 4] for i in range(0, len(texto) - solapamiento * 4, paso * 4)]
+
+    ids = enc.encode(texto, disallowed_special=())
+    if len(ids) <= max_tokens:
+        return [texto]
+    return [
+        enc.decode(ids[i:i + max_tokens], errors="ignore")
+        for i in range(0, len(ids) - solapamiento, paso)
+    ]
@@ -0,0 +1,183 @@
+# utils/transport.py
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+USER_AGENT = "geoagentx/1.0 (tu_email@ejemplo.com)"
+
+# Tiempo máximo de conexión y de lectura (segundos)
+TIMEOUT = (5, 15)
+
+# Tamaño máximo de respuesta que se acepta por defecto (bytes)
+MAX_BYTES = 50 * 1024 ** 2
+
+# Peticiones simultáneas por host (los que no aparecen usan LIMITE_HOST_DEFECTO)
+LIMITE_HOST_DEFECTO = 4
+LIMITES_POR_HOST = {
+    "nominatim.openstreetmap.org": 1,
+    "news.google.com": 2,
+}
+
+# Separación mínima entre peticiones a un mismo host (segundos); Nominatim pide 1 req/s
+INTERVALO_POR_HOST = {
+    "nominatim.openstreetmap.org": 1.0,
+}
+
+
+class RespuestaDemasiadoGrande(requests.RequestException):
+    """La respuesta excede el tamaño máximo permitido."""
+
+
+class Respuesta:
+    """
+    Respuesta ya leída por get(): estado, encabezados y contenido completo.
+    'text' y json() se comportan como los de requests.Response.
+    """
+
+    def __init__(self, url: str, status_code: int, headers, content: bytes, encoding: str = None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def json(self):
+        # json.loads detecta por sí mismo UTF-8/16/32 en bytes
+        return json.loads(self.content)
+
+
+_SESION = None
+_SESION_LOCK = threading.Lock()
+
+_SEMAFOROS = {}
+_ULTIMA_PETICION = {}
+_HOSTS_LOCK = threading.Lock()
+
+# Límites compartidos entre procesos (ver limitador_compartido); None = sólo este proceso
+_COMPARTIDO = None
+
+
+def sesion() -> requests.Session:
+    """
+    Sesión HTTP compartida por el proceso: conexiones keep-alive reutilizables
+    (pool por host) y reintentos con backoff exponencial ante errores de red,
+    429 y 5xx, respetando Retry-After.
+    """
+    global _SESION
+    if _SESION is None:
+        with _SESION_LOCK:
+            if _SESION is None:
+                reintentos = Retry(
+                    total=3,
+                    backoff_factor=0.5,
+                    status_forcelist=(429, 500, 502, 503, 504),
+                    allowed_methods=("GET", "HEAD"),
+                    respect_retry_after_header=True,
+                    raise_on_status=False
+                )
+                adaptador = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=reintentos)
+                s = requests.Session()
+                s.mount("https://", adaptador)
+                s.mount("http://", adaptador)
+                s.headers["User-Agent"] = USER_AGENT
+                _SESION = s
+    return _SESION
+
+
+def limitador_compartido(manager) -> dict:
+    """
+    Semáforos e intervalos de los hosts de LIMITES_POR_HOST creados en un
+    multiprocessing.Manager, para que varios procesos respeten juntos los mismos
+    límites. Cada proceso debe activarlo con usar_limitador_compartido().
+    """
+    return {
+        "semaforos": {h: manager.BoundedSemaphore(n) for h, n in LIMITES_POR_HOST.items()},
+        "ultima": manager.dict(),
+        "lock": manager.Lock()
+    }
+
+
+def usar_limitador_compartido(limitador: dict) -> None:
+    """
+    Activa en este proceso el limitador creado con limitador_compartido()
+    (p. ej. desde el initializer de un ProcessPoolExecutor).
+    """
+    global _COMPARTIDO
+    _COMPARTIDO = limitador
+
+
+@contextmanager
+def _turno_host(host: str):
+    """
+    Limita las peticiones simultáneas a 'host' y respeta su intervalo mínimo.
+    Si hay un limitador compartido para el host, el límite vale para todos los procesos.
+    """
+    compartido = _COMPARTIDO if _COMPARTIDO and host in _COMPARTIDO["semaforos"] else None
+    if compartido:
+        semaforo, lock, ultima = compartido["semaforos"][host], compartido["lock"], compartido["ultima"]
+        # Reloj de pared: time.monotonic() no es comparable entre procesos
+        reloj = time.time
+    else:
+        with _HOSTS_LOCK:
+            semaforo = _SEMAFOROS.get(host)
+            if semaforo is None:
+                semaforo = threading.BoundedSemaphore(LIMITES_POR_HOST.get(host, LIMITE_HOST_DEFECTO))
+                _SEMAFOROS[host] = semaforo
+        lock, ultima, reloj = _HOSTS_LOCK, _ULTIMA_PETICION, time.monotonic
+
+    with semaforo:
+        intervalo = INTERVALO_POR_HOST.get(host, 0)
+        if intervalo:
+            with lock:
+                ahora = reloj()
+                turno = max(ahora, ultima.get(host, 0) + intervalo)
+                ultima[host] = turno
+            if turno > ahora:
+                time.sleep(turno - ahora)
+        yield
+
+
+def get(url: str, params=None, headers=None, timeout=None, max_bytes: int = None) -> Respuesta:
+    """
+    GET a través del transporte compartido. La respuesta se lee por partes y se
+    corta con RespuestaDemasiadoGrande si supera 'max_bytes' (MAX_BYTES por defecto).
+    Retorna una Respuesta ya leída (status_code, headers, content, text y json()).
+    Los errores de red se propagan como requests.RequestException.
+    """
+    max_bytes = max_bytes or MAX_BYTES
+    host = urlparse(url).hostname or ""
+
+    with _turno_host(host):
+        resp = sesion().get(
+            url,
+            params=params,
+            headers=headers,
+            timeout=timeout or TIMEOUT,
+            stream=True
+        )
+        try:
+            declarado = resp.headers.get("Content-Length")
+            if declarado and declarado.isdigit() and int(declarado) > max_bytes:
+                raise RespuestaDemasiadoGrande(f"{url}: {declarado} bytes (máximo {max_bytes})")
+
+            partes = []
+            leidos = 0
+            for parte in resp.iter_content(chunk_size=64 * 1024):
+                leidos += len(parte)
+                if leidos > max_bytes:
+                    raise RespuestaDemasiadoGrande(f"{url}: más de {max_bytes} bytes")
+                partes.append(parte)
+        finally:
+            resp.close()
+    return Respuesta(resp.url, resp.status_code, resp.headers, b"".join(partes), resp.encoding)
@@ -3,6 +3,17 @@
 from PIL import Image
 import os
 
+import numpy as np
+import pandas as pd
+
+# Lado de cada tesela (px) del análisis por teselas
+TAMANO_TESELA = 512
+# A partir de cuántos píxeles conviene el análisis por teselas en lugar de analyze_image
+UMBRAL_TESELAS = 4_000_000
+# Máximo de píxeles que se decodifican de una vez: los JPEG más grandes se leen a escala
+# reducida, los TIFF en tiras/teselas por franjas y el resto (p. ej. PNG) se rechaza
+MAX_PIXELES = 40_000_000
+
 def analyze_image(image_path: str) -> str:
     """
     Abre la imagen usando Pillow y devuelve:
@@ -50,3 +61,188 @@ def analyze_image(image_path: str) -> str:
         return f"⚠️ Error al analizar la imagen: {e}"
 
 
+def pixeles_imagen(image_path: str) -> int:
+    """
+    Ancho × alto leídos del encabezado, sin decodificar la imagen. 0 si no se puede abrir.
+    """
+    try:
+        with Image.open(image_path) as img:
+            return img.size[0] * img.size[1]
+    except Exception:
+        return 0
+
+
+def _hex(indice_bin: int) -> str:
+    """
+    Color central de una cubeta de 3 bits por canal (índice 0-511) en hex.
+    """
+    r, g, b = (indice_bin >> 6) & 7, (indice_bin >> 3) & 7, indice_bin & 7
+    return "#" + "".join(f"{c * 32 + 16:02x}" for c in (r, g, b))
+
+
+def _estadisticas_tesela(arr: np.ndarray):
+    """
+    Para una tesela RGB (uint8, alto×ancho×3): histograma de 512 cubetas de color
+    y fracciones de píxeles con aspecto de agua (azulados) y de lodo (pardos).
+    """
+    r = arr[..., 0].astype(np.int16)
+    g = arr[..., 1].astype(np.int16)
+    b = arr[..., 2].astype(np.int16)
+
+    cubetas = ((r >> 5) << 6) | ((g >> 5) << 3) | (b >> 5)
+    hist = np.bincount(cubetas.ravel(), minlength=512)
+
+    agua = (b > r + 15) & (b >= g - 5) & (b > 40)
+    lodo = (r >= g) & (g >= b) & (r - b > 25) & (r > 60) & (r < 210)
+    return hist, float(agua.mean()), float(lodo.mean())
+
+
+def _abrir_acotada(image_path: str):
+    """
+    Abre la imagen sin decodificarla y decide cómo leerla sin pasar de MAX_PIXELES:
+    - JPEG: siempre se pide al decodificador una escala reducida (draft, 1/2 a 1/8)
+      que quede dentro del límite.
+    - Imágenes en tiras o teselas (p. ej. TIFF de dron): se leerán por franjas.
+    - Otras (p. ej. PNG) más grandes que el límite: ValueError, no se pueden leer por partes.
+    Retorna (imagen, por_franjas).
+    """
+    img = Image.open(image_path)
+    ancho, alto = img.size
+    if ancho * alto <= MAX_PIXELES:
+        return img, False
+    if img.format == "JPEG":
+        factor = 2 ** int(np.ceil(np.log2(np.sqrt(ancho * alto / MAX_PIXELES))))
+        if factor > 8:
+            raise ValueError(f"JPEG de {ancho}×{alto}px demasiado grande incluso a escala 1/8")
+        img.draft("RGB", (ancho // factor, alto // factor))
+        return img, False
+    if len(img.tile) > 1:
+        return img, True
+    raise ValueError(
+        f"imagen {img.format} de {ancho}×{alto}px: supera {MAX_PIXELES:,} píxeles y no se puede "
+        "leer por partes; conviértela a JPEG o a TIFF en teselas"
+    )
+
+
+def _franja(image_path: str, y0: int, y1: int) -> Image.Image:
+    """
+    Decodifica sólo las filas y0..y1 de una imagen en tiras o teselas: se reabre el
+    archivo y se dejan en img.tile únicamente las piezas que tocan la franja,
+    desplazadas para que la imagen destino tenga sólo el alto de esas piezas.
+    """
+    img = Image.open(image_path)
+    piezas = [t for t in img.tile if t[1][3] > y0 and t[1][1] < y1]
+    arriba = min(t[1][1] for t in piezas)
+    abajo = max(t[1][3] for t in piezas)
+    img.tile = [
+        (nombre, (x0, t0 - arriba, x1, t1 - arriba), offset, args)
+        for nombre, (x0, t0, x1, t1), offset, args in piezas
+    ]
+    img._size = (img.size[0], abajo - arriba)
+    img.load()
+    return img.crop((0, y0 - arriba, img.size[0], y1 - arriba)).convert("RGB")
+
+
+def analyze_image_tiles(image_path: str, tamano_tesela: int = TAMANO_TESELA,
+                        lado_mapa: int = 256, path_mapa: str = None) -> dict:
+    """
+    Análisis por teselas para fotos aéreas o de dron grandes. La imagen se recorre
+    en franjas de 'tamano_tesela' filas y cada franja en teselas, que se convierten a
+    NumPy por separado; lo decodificado nunca pasa de MAX_PIXELES (ver _abrir_acotada).
+    Por tesela calcula colores dominantes y la fracción de píxeles con aspecto de
+    agua o lodo. Arma una miniatura de 'lado_mapa' px con el mapa de calor de esa
+    fracción superpuesto y, si se da 'path_mapa', la guarda como PNG.
+    Retorna diccionario con:
+      - descripcion: texto con las cifras principales (para el contraste).
+      - df_teselas: DataFrame [fila, columna, x, y, agua, lodo, agua_lodo, pixeles, colores].
+      - mapa_calor: arreglo NumPy (filas × columnas) con la fracción agua/lodo.
+      - superposicion: imagen PIL (miniatura + mapa de calor), o None si hubo error.
+      - miniatura: imagen PIL de la foto reducida a 'lado_mapa' px, o None si hubo error.
+    """
+    vacio = {
+        "df_teselas": pd.DataFrame(), "mapa_calor": np.zeros((0, 0)),
+        "superposicion": None, "miniatura": None
+    }
+    if not os.path.isfile(image_path):
+        return {"descripcion": f"⚠️ No se encontró el archivo: {image_path}", **vacio}
+    try:
+        img, por_franjas = _abrir_acotada(image_path)
+        if por_franjas and img.size[0] * tamano_tesela > MAX_PIXELES:
+            raise ValueError(f"franjas de {img.size[0]}px de ancho superan {MAX_PIXELES:,} píxeles")
+    except Exception as e:
+        return {"descripcion": f"⚠️ No se pudo abrir la imagen: {e}", **vacio}
+
+    try:
+        ancho, alto = img.size
+        escala = lado_mapa / max(ancho, alto)
+        miniatura = Image.new("RGB", (max(1, round(ancho * escala)), max(1, round(alto * escala))))
+        n_filas = -(-alto // tamano_tesela)
+        n_cols = -(-ancho // tamano_tesela)
+        mapa = np.zeros((n_filas, n_cols), dtype=np.float32)
+        hist_total = np.zeros(512, dtype=np.int64)
+        filas = []
+
+        for i in range(n_filas):
+            y0, y1 = i * tamano_tesela, min(alto, (i + 1) * tamano_tesela)
+            if por_franjas:
+                franja = _franja(image_path, y0, y1)
+            else:
+                franja = img.crop((0, y0, ancho, y1)).convert("RGB")
+            for j in range(n_cols):
+                caja = (j * tamano_tesela, y0, min(ancho, (j + 1) * tamano_tesela), y1)
+                tesela = franja.crop((caja[0], 0, caja[2], y1 - y0))
+                hist, agua, lodo = _estadisticas_tesela(np.asarray(tesela))
+                hist_total += hist
+                mapa[i, j] = agua + lodo
+                filas.append({
+                    "fila": i,
+                    "columna": j,
+                    "x": caja[0],
+                    "y": caja[1],
+                    "agua": agua,
+                    "lodo": lodo,
+                    "agua_lodo": agua + lodo,
+                    "pixeles": (caja[2] - caja[0]) * (caja[3] - caja[1]),
+                    "colores": ", ".join(_hex(k) for k in np.argsort(hist)[::-1][:3])
+                })
+
+                # Pieza de la miniatura que corresponde a esta tesela
+                destino = tuple(round(v * escala) for v in caja)
+                tamano = (destino[2] - destino[0], destino[3] - destino[1])
+                if tamano[0] > 0 and tamano[1] > 0:
+                    miniatura.paste(tesela.resize(tamano, Image.BILINEAR), destino[:2])
+
+        # Mapa de calor: rojo con opacidad proporcional a la fracción agua/lodo
+        capa = np.zeros((n_filas, n_cols, 4), dtype=np.uint8)
+        capa[..., 0] = 255
+        capa[..., 3] = (np.clip(mapa, 0, 1) * 180).astype(np.uint8)
+        capa = Image.fromarray(capa, "RGBA").resize(miniatura.size, Image.NEAREST)
+        superposicion = Image.alpha_composite(miniatura.convert("RGBA"), capa)
+        if path_mapa:
+            superposicion.save(path_mapa)
+
+        df_teselas = pd.DataFrame(filas)
+        total = float(hist_total.sum()) or 1.0
+        # Promedio ponderado por píxeles: las teselas del borde pueden ser más chicas
+        agua_lodo = float(np.average(df_teselas["agua_lodo"], weights=df_teselas["pixeles"]))
+        criticas = df_teselas[df_teselas["agua_lodo"] >= 0.5]
+        dominantes = [
+            f"{_hex(k)} ({hist_total[k] / total:.0%})"
+            for k in np.argsort(hist_total)[::-1][:3]
+        ]
+
+        descripcion = (
+            f"Resolución: {ancho}×{alto}px en {n_filas}×{n_cols} teselas de {tamano_tesela}px. "
+            f"Colores dominantes: {', '.join(dominantes)}. "
+            f"Píxeles con aspecto de agua o lodo: {agua_lodo:.0%}; "
+            f"{len(criticas)} teselas con más de la mitad de agua o lodo."
+        )
+        return {
+            "descripcion": descripcion,
+            "df_teselas": df_teselas,
+            "mapa_calor": mapa,
+            "superposicion": superposicion,
+            "miniatura": miniatura
+        }
+    except Exception as e:
+        return {"descripcion": f"⚠️ Error al analizar la imagen por teselas: {e}", **vacio}
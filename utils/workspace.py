@@ -0,0 +1,216 @@
+# utils/workspace.py
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from utils.geo import normalizar_texto
+from utils.session_store import artefacto_compartido, geojson_de, olvidar_artefactos
+
+logger = logging.getLogger(__name__)
+
+# Carpeta de espacios de trabajo guardados (uno por ubicación).
+# Se puede cambiar con la variable de entorno WORKSPACES_DIR.
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKSPACES_DIR = os.getenv(
+    "WORKSPACES_DIR",
+    os.path.join(PROJECT_ROOT, "data", "workspaces")
+)
+
+MANIFIESTO = "manifest.json"
+# Radio del recorte de la capa de inundaciones que se guarda con la sección "oficiales"
+RADIO_RECORTE_KM = 50
+
+_LOCK = threading.Lock()
+
+
+def ruta_workspace(ubicacion: str, base_dir: str = None) -> str:
+    return os.path.join(base_dir or WORKSPACES_DIR, normalizar_texto(ubicacion) or "_")
+
+
+def _leer_manifiesto(carpeta: str) -> dict:
+    try:
+        with open(os.path.join(carpeta, MANIFIESTO), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"secciones": {}}
+
+
+def _escribir_json(path: str, contenido) -> None:
+    # Escritura atómica: un lector nunca ve el archivo a medias
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(contenido, f, ensure_ascii=False, default=_a_json)
+    os.replace(tmp, path)
+
+
+def _a_json(valor):
+    if isinstance(valor, np.generic):
+        return valor.item()
+    if isinstance(valor, (pd.Timestamp, datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _empacar(valor, carpeta: str, prefijo: str):
+    """
+    Reemplaza recursivamente los DataFrames de 'valor' por referencias a archivos
+    Parquet ('<prefijo>__<clave>.parquet') y las figuras de Plotly por su JSON.
+    """
+    if isinstance(valor, pd.DataFrame):
+        nombre = f"{prefijo}.parquet"
+        df = valor.reset_index(drop=True)
+        df.columns = [str(c) for c in df.columns]
+        df.to_parquet(os.path.join(carpeta, nombre), index=False)
+        return {"__parquet__": nombre}
+    if hasattr(valor, "to_plotly_json"):
+        return {"__plotly__": valor.to_json()}
+    if isinstance(valor, dict):
+        return {
+            str(k): _empacar(v, carpeta, f"{prefijo}__{normalizar_texto(str(k))}")
+            for k, v in valor.items()
+        }
+    if isinstance(valor, (list, tuple)):
+        return [_empacar(v, carpeta, f"{prefijo}__{i}") for i, v in enumerate(valor)]
+    return valor
+
+
+def _desempacar(valor, carpeta: str):
+    if isinstance(valor, dict):
+        if "__parquet__" in valor:
+            # memory_map evita copiar el archivo completo antes de decodificarlo
+            tabla = pq.read_table(os.path.join(carpeta, valor["__parquet__"]), memory_map=True)
+            return tabla.to_pandas()
+        if "__plotly__" in valor:
+            import plotly.io as pio
+            return pio.from_json(valor["__plotly__"])
+        return {k: _desempacar(v, carpeta) for k, v in valor.items()}
+    if isinstance(valor, list):
+        return [_desempacar(v, carpeta) for v in valor]
+    return valor
+
+
+def _borrar_archivos(carpeta: str, nombre: str) -> None:
+    for archivo in os.listdir(carpeta):
+        if archivo == f"{nombre}.json" or archivo.startswith(f"{nombre}__"):
+            try:
+                os.remove(os.path.join(carpeta, archivo))
+            except OSError:
+                pass
+
+
+def _guardar_recorte(fig: dict, carpeta: str, nombre: str) -> dict:
+    """
+    Guarda sólo los polígonos de la capa de inundaciones cercanos a la ubicación
+    y apunta la figura al recorte en lugar de a la capa completa.
+    """
+    geojson = geojson_de(fig)
+    vista = fig.get("view_state") or {}
+    if not geojson or "latitude" not in vista:
+        return fig
+
+    from utils.spatial import capa_riesgo, recortar_capa
+    capa = capa_riesgo(geojson, llave=fig.get("capa"))
+    recorte = recortar_capa(capa, vista["latitude"], vista["longitude"], RADIO_RECORTE_KM)
+    archivo = f"{nombre}__recorte.geojson"
+    _escribir_json(os.path.join(carpeta, archivo), recorte)
+    return {k: v for k, v in fig.items() if k not in ("geojson", "capa")} | {"__recorte__": archivo}
+
+
+def guardar_seccion(ubicacion: str, nombre: str, salida: dict,
+                    parametros: dict = None, dependencias=(), base_dir: str = None) -> bool:
+    """
+    Guarda la salida (ya compactada) de un agente como sección 'nombre' del espacio
+    de trabajo de 'ubicacion': DataFrames en Parquet y el resto en JSON.
+    Sólo se reescriben los archivos de esa sección; las demás quedan intactas.
+    - parametros: datos de la consulta (palabras clave, tipo de dato, ...).
+    - dependencias: secciones de las que se derivó ésta (p. ej. el contraste);
+      se registra su versión para saber después si quedó desactualizada.
+    Retorna True si se guardó.
+    """
+    if not salida:
+        return False
+    carpeta = ruta_workspace(ubicacion, base_dir)
+    try:
+        os.makedirs(carpeta, exist_ok=True)
+        with _LOCK:
+            manifiesto = _leer_manifiesto(carpeta)
+            secciones = manifiesto.setdefault("secciones", {})
+            _borrar_archivos(carpeta, nombre)
+
+            salida = dict(salida)
+            fig = salida.get("fig")
+            if isinstance(fig, dict) and (fig.get("geojson") is not None or fig.get("capa")):
+                salida["fig"] = _guardar_recorte(fig, carpeta, nombre)
+            _escribir_json(os.path.join(carpeta, f"{nombre}.json"), _empacar(salida, carpeta, nombre))
+
+            secciones[nombre] = {
+                "version": time.time_ns(),
+                "guardado": datetime.now().isoformat(timespec="seconds"),
+                "parametros": parametros or {},
+                "dependencias": {
+                    d: secciones[d]["version"] for d in dependencias if d in secciones
+                }
+            }
+            manifiesto["ubicacion"] = ubicacion
+            _escribir_json(os.path.join(carpeta, MANIFIESTO), manifiesto)
+        return True
+    except Exception as e:
+        logger.error("Error al guardar la sección '%s' del espacio de trabajo: %s", nombre, e)
+        return False
+
+
+def secciones_guardadas(ubicacion: str, base_dir: str = None) -> dict:
+    """
+    Lee sólo el manifiesto del espacio de trabajo (no los datos).
+    Retorna {nombre: {version, guardado, parametros, dependencias, vigente}}, donde
+    'vigente' es False si alguna sección de la que depende se volvió a generar
+    (o se perdió) después de guardarla. Diccionario vacío si no hay espacio guardado.
+    """
+    secciones = _leer_manifiesto(ruta_workspace(ubicacion, base_dir)).get("secciones", {})
+    for info in secciones.values():
+        info["vigente"] = all(
+            secciones.get(d, {}).get("version") == v
+            for d, v in info.get("dependencias", {}).items()
+        )
+    return secciones
+
+
+def cargar_seccion(ubicacion: str, nombre: str, base_dir: str = None) -> dict:
+    """
+    Carga una sección guardada con guardar_seccion(). La capa de inundaciones
+    recortada se registra como artefacto compartido y la figura la referencia por
+    su llave, igual que una salida recién generada; los recortes de versiones
+    anteriores de la sección se descartan. Retorna None si no existe.
+    """
+    carpeta = ruta_workspace(ubicacion, base_dir)
+    try:
+        with open(os.path.join(carpeta, f"{nombre}.json"), encoding="utf-8") as f:
+            salida = _desempacar(json.load(f), carpeta)
+    except (OSError, ValueError) as e:
+        logger.warning("Error al cargar la sección '%s' del espacio de trabajo: %s", nombre, e)
+        return None
+
+    fig = salida.get("fig")
+    if isinstance(fig, dict) and fig.get("__recorte__"):
+        ruta = os.path.join(carpeta, fig.pop("__recorte__"))
+        # La versión forma parte de la llave para no reutilizar un recorte anterior
+        version = secciones_guardadas(ubicacion, base_dir).get(nombre, {}).get("version", 0)
+        llave = f"{ruta}#{version}"
+
+        def _leer():
+            with open(ruta, encoding="utf-8") as f:
+                return json.load(f)
+
+        if artefacto_compartido(llave, _leer) is not None:
+            fig["capa"] = llave
+        olvidar_artefactos(f"{ruta}#", conservar=llave)
+    return salida
+